@@ -3,6 +3,9 @@ import asyncio
 from pathlib import Path
 from database import get_tanks_collection
 from warthunder_todos_tanques import fetch_all_tanks
+from tank_enrichment import enriquecer_pendientes
+from document_diff import aplicar_diff, metricas_escrituras
+from tank_catalog import marcar_catalogo_modificado
 
 BASE_DIR = Path(__file__).resolve().parent
 TANQUES_JSON = BASE_DIR / "tanques.json"
@@ -22,6 +25,7 @@ async def actualizar_tanques_semanal():
     tanks_collection = get_tanks_collection()
     tanques_actualizados = 0
     tanques_nuevos = 0
+    tanques_sin_cambios = 0
     
     for tanque_nuevo in nuevos_tanques:
         nombre = tanque_nuevo.get("nombre")
@@ -60,15 +64,27 @@ async def actualizar_tanques_semanal():
                                             mun_nueva["masa_explosivo"] = mun_antigua.get("masa_explosivo")
                                             mun_nueva["datos_generados_por_ia"] = True
             
-            # Actualizar en base de datos
-            tanks_collection.update_one({"_id": tanque_existente["_id"]}, {"$set": tanque_nuevo})
-            tanques_actualizados += 1
+            # Actualizar en base de datos (solo los campos que cambian)
+            diff = aplicar_diff(tanks_collection, {"_id": tanque_existente["_id"]}, tanque_existente, tanque_nuevo)
+            if diff.vacio:
+                tanques_sin_cambios += 1
+            else:
+                tanques_actualizados += 1
         else:
             # Insertar como nuevo
             tanks_collection.insert_one(tanque_nuevo)
             tanques_nuevos += 1
             
-    print(f"Actualización completada: {tanques_actualizados} actualizados, {tanques_nuevos} nuevos insertados.")
+    print(f"Actualización completada: {tanques_actualizados} actualizados, {tanques_nuevos} nuevos insertados, {tanques_sin_cambios} sin cambios.")
+    if tanques_actualizados or tanques_nuevos:
+        # Una sola versión nueva para todo el lote: la API recarga su catálogo una vez
+        print(f"Versión del catálogo de tanques: {marcar_catalogo_modificado()}")
+    print(f"Volumen de escritura: {metricas_escrituras()}")
+
+    # 4. Completar con IA el slope factor y la munición de los tanques nuevos o incompletos,
+    #    para que los endpoints de simulación no tengan que esperar a Gemini
+    informe = await enriquecer_pendientes()
+    print(f"Enriquecimiento con IA: {informe}")
 
 if __name__ == "__main__":
     asyncio.run(actualizar_tanques_semanal())
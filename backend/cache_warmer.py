@@ -0,0 +1,117 @@
+"""
+Calentador de cachés del motor de combate.
+
+La API registra claves anónimas de las simulaciones pedidas (ids de tanques y
+distancia, sin datos de usuario) en una colección capped de MongoDB, que
+conserva solo la ventana más reciente. Al arrancar y cada
+CALENTADOR_INTERVALO_S, el calentador toma las top-K claves más repetidas y
+precalcula en segundo plano perfiles y resultados de duelo, con un presupuesto
+de CPU por pasada. El efecto sobre la tasa de aciertos se publica en
+metricas_cache() (GET /metricas/cache).
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import CollectionInvalid
+from pymongo.write_concern import WriteConcern
+
+from database import cargar_tanques, get_db
+from combat_simulator import calentar_duelo, obtener_perfil, parse_distancia_combate
+
+ACCESOS_COLECCION = "accesos_simulacion"
+ACCESOS_MAX_DOCS = int(os.getenv("CALENTADOR_ACCESOS_MAX_DOCS", "50000"))
+ACCESOS_MAX_BYTES = int(os.getenv("CALENTADOR_ACCESOS_MAX_BYTES", str(16 * 1024 * 1024)))
+CALENTADOR_ACTIVO = os.getenv("CALENTADOR_ACTIVO", "1") == "1"
+CALENTADOR_TOP_K = int(os.getenv("CALENTADOR_TOP_K", "50"))
+CALENTADOR_PRESUPUESTO_CPU_S = float(os.getenv("CALENTADOR_PRESUPUESTO_CPU_S", "20"))
+CALENTADOR_INTERVALO_S = float(os.getenv("CALENTADOR_INTERVALO_S", "900"))
+
+ultimo_informe: Optional[Dict[str, Any]] = None
+
+
+def asegurar_coleccion_accesos() -> None:
+    db = get_db()
+    try:
+        db.create_collection(ACCESOS_COLECCION, capped=True, size=ACCESOS_MAX_BYTES, max=ACCESOS_MAX_DOCS)
+    except CollectionInvalid:
+        pass  # ya existe
+
+
+def registrar_acceso(tipo: str, ids: List[str], situacion: str) -> None:
+    """Anota la clave de una simulación pedida. Nunca falla ni espera confirmación (w=0)."""
+    try:
+        coleccion = get_db()[ACCESOS_COLECCION].with_options(write_concern=WriteConcern(w=0))
+        coleccion.insert_one({
+            "tipo": tipo,
+            "ids": [str(i) for i in ids],
+            "distancia": parse_distancia_combate(situacion),
+            "fecha": datetime.now(timezone.utc),
+        })
+    except Exception as e:
+        print(f"Advertencia: no se pudo registrar el acceso: {e}")
+
+
+def claves_populares(k: int = CALENTADOR_TOP_K) -> List[Dict[str, Any]]:
+    """Las k claves (tipo, ids, distancia) más pedidas en la ventana de la colección capped."""
+    return list(get_db()[ACCESOS_COLECCION].aggregate([
+        {"$group": {
+            "_id": {"tipo": "$tipo", "ids": "$ids", "distancia": "$distancia"},
+            "peticiones": {"$sum": 1},
+        }},
+        {"$sort": {"peticiones": -1}},
+        {"$limit": k},
+    ]))
+
+
+def calentar(k: int = CALENTADOR_TOP_K, presupuesto_cpu_s: float = CALENTADOR_PRESUPUESTO_CPU_S) -> Dict[str, Any]:
+    """
+    Precalcula las claves populares en orden de popularidad hasta agotar el presupuesto
+    de CPU (tiempo de CPU de este hilo, no de reloj). Duelos: resultado completo en la
+    caché de duelos. Equipos: perfiles de todos los tanques a esa distancia.
+    """
+    global ultimo_informe
+    inicio_cpu = time.thread_time()
+    inicio = time.time()
+    informe = {"claves": 0, "calentadas": 0, "ya_en_cache": 0, "errores": 0, "presupuesto_agotado": False}
+
+    for entrada in claves_populares(k):
+        if time.thread_time() - inicio_cpu >= presupuesto_cpu_s:
+            informe["presupuesto_agotado"] = True
+            break
+        informe["claves"] += 1
+        clave = entrada["_id"]
+        situacion = f"{clave['distancia']}m"
+        try:
+            tanques = cargar_tanques(clave["ids"])
+            if clave["tipo"] == "duelo" and len(tanques) == 2:
+                calentada = calentar_duelo(tanques[0], tanques[1], situacion)
+            else:
+                for tanque in tanques:
+                    obtener_perfil(tanque, clave["distancia"])
+                calentada = True
+            informe["calentadas" if calentada else "ya_en_cache"] += 1
+        except Exception as e:
+            informe["errores"] += 1
+            print(f"Advertencia: no se pudo calentar {clave}: {e}")
+
+    informe["cpu_s"] = round(time.thread_time() - inicio_cpu, 2)
+    informe["segundos"] = round(time.time() - inicio, 2)
+    informe["fecha"] = datetime.now(timezone.utc).isoformat()
+    ultimo_informe = informe
+    return informe
+
+
+async def bucle_calentador() -> None:
+    """Tarea de fondo: una pasada al arrancar y otra cada CALENTADOR_INTERVALO_S."""
+    await asyncio.to_thread(asegurar_coleccion_accesos)
+    while True:
+        try:
+            informe = await asyncio.to_thread(calentar)
+            print(f"🔥 Calentador: {informe['calentadas']} claves precalculadas en {informe['cpu_s']}s de CPU")
+        except Exception as e:
+            print(f"Advertencia: fallo en el calentador de caché: {e}")
+        await asyncio.sleep(CALENTADOR_INTERVALO_S)
@@ -6,16 +6,28 @@ PyTorch que refina la efectividad de cada vehículo.
 
 from __future__ import annotations
 
+import ast
+import hashlib
+import inspect
+import itertools
+import json
+import math
 import os
 import random
 import re
-from dataclasses import dataclass
+import textwrap
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
 from pathlib import Path
 from types import SimpleNamespace
 from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 
+import model_registry
+
 try:
     import torch
     import torch.nn as nn
@@ -76,10 +88,40 @@ BASE_DIR = Path(__file__).resolve().parent
 DISTANCIAS_REF = [0, 100, 500, 1000, 1500, 2000]
 MODELO_PATH = Path(os.getenv("COMBAT_MODEL_PT_PATH", str(BASE_DIR / "combat_model.pt")))
 MODELO_ONNX_PATH = Path(os.getenv("COMBAT_MODEL_ONNX_PATH", str(BASE_DIR / "combat_model.onnx")))
+REGISTRO_POLL_S = float(os.getenv("COMBAT_MODEL_REGISTRY_POLL_S", "10"))
 SLOPE_FACTOR = 1.35
 MC_DUELO_ITERACIONES = 2000
 MC_EQUIPO_ITERACIONES = 800
 MC_PAREJA_ITERACIONES = 400
+MC_LINEUP_ITERACIONES_INICIALES = 100
+MC_SENSIBILIDAD_ITERACIONES = 1000
+SENSIBILIDAD_DELTAS = {"recarga": 0.5, "blindaje": 10.0, "penetracion": 10.0, "velocidad": 5.0}
+# Estadísticas que el motor de duelo no usa: se devuelven sin simular (gradiente nulo por construcción)
+SENSIBILIDAD_SIN_EFECTO = {
+    "velocidad": "El motor de duelo no modela la movilidad; la velocidad no altera el resultado.",
+}
+EQUIPO_MAX_TANQUES = int(os.getenv("COMBAT_EQUIPO_MAX_TANQUES", "16"))
+LINEUP_MAX_CANDIDATOS = 8
+CACHE_PERFILES_MAX = int(os.getenv("COMBAT_CACHE_PERFILES_MAX", "4096"))
+CACHE_DISPAROS_MAX = int(os.getenv("COMBAT_CACHE_DISPAROS_MAX", "8192"))
+CACHE_DUELOS_MAX = int(os.getenv("COMBAT_CACHE_DUELOS_MAX", "1024"))
+DISPAROS_RESOLUCION_HP = 100
+DISPAROS_MAX = 200
+DISPAROS_PUNTOS_ANGULO = 64
+DISPAROS_PUNTOS_VARIACION = 32
+METODOS_DUELO = ("monte_carlo", "analitico")
+DUELO_ANALITICO_PUNTOS = 8
+HISTOGRAMA_TTK_BINS = 60
+HISTOGRAMA_DISPAROS_MAX = 60.0
+HISTOGRAMA_DISPAROS_BINS = 60
+RNG_BLOQUE_INICIAL = 64
+RNG_BLOQUE_MAX = 8192
+RNG_SALTO_ITERACION = 2 ** 40  # números reservados a cada iteración con números aleatorios comunes
+FIDELIDADES_DUELO = ("auto", "completa")
+TRAZAS_MAX = 20
+ROUTER_UMBRAL_DECISIVO = float(os.getenv("COMBAT_ROUTER_UMBRAL_DECISIVO", "0.8"))
+# Versión del catálogo en memoria con la que se copió el tanque (la pone main.py; no viene de MongoDB)
+CLAVE_VERSION_CATALOGO = "_version_catalogo"
 
 
 @dataclass
@@ -113,6 +155,104 @@ class PerfilCombate:
     tiempo_apuntado_base: float
     supervivencia_base: float
     modificadores: Tuple[float, float, float] = (1.0, 1.0, 1.0)
+    version_modelo: str = ""
+
+
+class EstadisticasStreaming:
+    """
+    Media/varianza (Welford) e histograma de bins fijos con memoria constante,
+    independientemente del número de iteraciones. Los valores fuera de rango
+    se acumulan en el primer o último bin.
+    """
+
+    __slots__ = ("minimo", "ancho_bin", "conteos", "n", "media", "_m2")
+
+    def __init__(self, minimo: float, maximo: float, bins: int) -> None:
+        self.minimo = minimo
+        self.ancho_bin = (maximo - minimo) / bins
+        self.conteos = [0] * bins
+        self.n = 0
+        self.media = 0.0
+        self._m2 = 0.0
+
+    def agregar(self, valor: float) -> None:
+        self.n += 1
+        delta = valor - self.media
+        self.media += delta / self.n
+        self._m2 += delta * (valor - self.media)
+        indice = int((valor - self.minimo) / self.ancho_bin)
+        self.conteos[min(max(indice, 0), len(self.conteos) - 1)] += 1
+
+    @classmethod
+    def desde_distribucion(
+        cls,
+        minimo: float,
+        maximo: float,
+        bins: int,
+        valores: np.ndarray,
+        probabilidades: np.ndarray,
+        n: int,
+    ) -> "EstadisticasStreaming":
+        """
+        Estadísticas equivalentes a n muestras de una distribución discreta conocida (solver
+        analítico): media y desviación exactas y conteos esperados redondeados por resto mayor,
+        de modo que suman n.
+        """
+        estadisticas = cls(minimo, maximo, bins)
+        probabilidades = probabilidades / probabilidades.sum()
+        indices = np.clip(((valores - minimo) / estadisticas.ancho_bin).astype(int), 0, bins - 1)
+        esperados = np.bincount(indices, weights=probabilidades, minlength=bins) * n
+        conteos = np.floor(esperados).astype(int)
+        faltan = n - int(conteos.sum())
+        if faltan > 0:
+            conteos[np.argsort(conteos - esperados)[:faltan]] += 1
+        media = float((probabilidades * valores).sum())
+        varianza = float((probabilidades * (valores - media) ** 2).sum())
+        estadisticas.conteos = conteos.tolist()
+        estadisticas.n = n
+        estadisticas.media = media
+        estadisticas._m2 = varianza * (n - 1)
+        return estadisticas
+
+    @property
+    def desviacion(self) -> float:
+        return math.sqrt(self._m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def cuantil(self, q: float) -> float:
+        """Cuantil aproximado interpolando linealmente dentro del bin."""
+        if self.n == 0:
+            return 0.0
+        objetivo = q * self.n
+        acumulado = 0
+        for i, conteo in enumerate(self.conteos):
+            if conteo and acumulado + conteo >= objetivo:
+                fraccion = (objetivo - acumulado) / conteo
+                return self.minimo + (i + fraccion) * self.ancho_bin
+            acumulado += conteo
+        return self.minimo + len(self.conteos) * self.ancho_bin
+
+    def a_dict(self, decimales: int = 2) -> Dict[str, Any]:
+        return {
+            "n": self.n,
+            "media": round(self.media, decimales),
+            "desviacion": round(self.desviacion, decimales),
+            "p10": round(self.cuantil(0.10), decimales),
+            "p50": round(self.cuantil(0.50), decimales),
+            "p90": round(self.cuantil(0.90), decimales),
+            "histograma": {
+                "inicio": self.minimo,
+                "ancho_bin": self.ancho_bin,
+                "conteos": list(self.conteos),
+            },
+        }
+
+
+def _estadisticas_ttk(max_tiempo: float) -> EstadisticasStreaming:
+    return EstadisticasStreaming(0.0, max_tiempo, HISTOGRAMA_TTK_BINS)
+
+
+def _estadisticas_disparos(maximo: float = HISTOGRAMA_DISPAROS_MAX) -> EstadisticasStreaming:
+    return EstadisticasStreaming(0.0, maximo, HISTOGRAMA_DISPAROS_BINS)
 
 
 @dataclass
@@ -123,13 +263,61 @@ class ResultadoDuelo:
     prob_victoria_v1: float
     prob_victoria_v2: float
     distancia_m: int
-    simulaciones: int
+    simulaciones: Optional[int]  # None con el solver analítico: no hay iteraciones
     tiempo_medio_victoria_s: float
     municion_v1: MunicionOptima
     municion_v2: MunicionOptima
     detalles_v1: Dict[str, Any]
     detalles_v2: Dict[str, Any]
     resumen_tecnico: str
+    metodo: str = "monte_carlo"
+    estadisticas_ttk: Optional[EstadisticasStreaming] = None
+    estadisticas_disparos_v1: Optional[EstadisticasStreaming] = None
+    estadisticas_disparos_v2: Optional[EstadisticasStreaming] = None
+    motivo_metodo: Optional[str] = None
+    traza: Optional[List[Dict[str, Any]]] = None
+    version_modelo: str = ""
+
+
+@dataclass
+class DistribucionDisparos:
+    """Distribución discreta de disparos necesarios para destruir al defensor."""
+
+    prob_penetracion: float
+    dano_pmf: np.ndarray
+    disparos_pmf: np.ndarray
+    disparos_cdf: np.ndarray
+    _vivos: Dict[int, np.ndarray] = field(default_factory=dict, repr=False)
+
+    @property
+    def prob_muerte(self) -> float:
+        return float(self.disparos_cdf[-1]) if len(self.disparos_cdf) else 0.0
+
+    @property
+    def disparos_medios(self) -> float:
+        """Esperanza de disparos condicionada a destruir dentro de DISPAROS_MAX."""
+        masa = self.prob_muerte
+        if masa <= 0:
+            return float("inf")
+        k = np.arange(1, len(self.disparos_pmf) + 1)
+        return float((k * self.disparos_pmf).sum() / masa)
+
+    def prob_muerte_en(self, disparos: int) -> float:
+        if disparos <= 0 or not len(self.disparos_cdf):
+            return 0.0
+        return float(self.disparos_cdf[min(disparos, len(self.disparos_cdf)) - 1])
+
+    def vivos_tras(self, disparos: int) -> np.ndarray:
+        """Masa (no normalizada) del daño acumulado del defensor que sigue vivo tras N disparos."""
+        disparos = max(0, min(disparos, DISPAROS_MAX))
+        vivos = self._vivos.get(disparos)
+        if vivos is None:
+            vivos = np.zeros(DISPAROS_RESOLUCION_HP)
+            vivos[0] = 1.0
+            for _ in range(disparos):
+                vivos = np.convolve(vivos, self.dano_pmf)[:DISPAROS_RESOLUCION_HP]
+            self._vivos[disparos] = vivos
+        return vivos
 
 
 @dataclass
@@ -156,6 +344,35 @@ class ResultadoEquipos:
     resumen_batalla: str
     detalles_aliados: List[Dict[str, Any]] = None
     detalles_enemigos: List[Dict[str, Any]] = None
+    estadisticas_duracion: Optional[EstadisticasStreaming] = None
+    estadisticas_disparos: Optional[EstadisticasStreaming] = None
+    version_modelo: str = ""
+
+
+@dataclass
+class CandidatoLineup:
+    indice: int
+    nombre: str
+    nacion: str
+    victorias: int = 0
+    simulaciones: int = 0
+    rondas: int = 0
+
+    @property
+    def prob_victoria(self) -> float:
+        return self.victorias / self.simulaciones if self.simulaciones else 0.0
+
+
+@dataclass
+class GrupoTanques:
+    """Copias idénticas de un mismo documento de tanque dentro de un equipo."""
+
+    tanque: Dict[str, Any]
+    indices: List[int] = field(default_factory=list)
+
+    @property
+    def cantidad(self) -> int:
+        return len(self.indices)
 
 
 class CombatEffectivenessNet(nn.Module):
@@ -179,6 +396,19 @@ class CombatEffectivenessNet(nn.Module):
         return 0.75 + 0.5 * torch.sigmoid(self.encoder(x))
 
 
+@dataclass(frozen=True)
+class ModeloActivo:
+    """Modelo publicado por el motor; se sustituye entero, nunca se modifica."""
+
+    version: str
+    onnx_session: Any = None
+    usa_torch: bool = False
+
+
+def _huella_archivo(ruta: Path) -> str:
+    return hashlib.sha256(ruta.read_bytes()).hexdigest()[:12]
+
+
 class CombatSimulatorEngine:
     def __init__(self) -> None:
         if torch is not None:
@@ -189,8 +419,19 @@ class CombatSimulatorEngine:
             self.device = None
             self.net = CombatEffectivenessNet()
         self.net.eval()
-        self._model_ready = False
-        self.onnx_session = None
+        self._modelo: Optional[ModeloActivo] = None
+        self._lock_modelo = threading.Lock()
+        self._mtime_registro: Optional[float] = None
+        self._ultima_comprobacion = 0.0
+
+    @property
+    def onnx_session(self) -> Any:
+        return self._modelo.onnx_session if self._modelo else None
+
+    @property
+    def version_modelo(self) -> str:
+        self.ensure_model_ready()
+        return self._modelo.version
 
     @staticmethod
     def _resolve_model_path(path: Path) -> Path:
@@ -202,42 +443,79 @@ class CombatSimulatorEngine:
                 return candidate
         return candidates[0]
 
+    def _registro_cambiado(self) -> bool:
+        ahora = time.monotonic()
+        if ahora - self._ultima_comprobacion < REGISTRO_POLL_S:
+            return False
+        self._ultima_comprobacion = ahora
+        return model_registry.mtime_manifiesto() != self._mtime_registro
+
     def ensure_model_ready(self) -> None:
-        if self._model_ready:
+        if self._modelo is not None and not self._registro_cambiado():
             return
+        with self._lock_modelo:
+            if self._modelo is None or model_registry.mtime_manifiesto() != self._mtime_registro:
+                self._cargar_modelo()
+
+    def recargar_modelo(self, version: Optional[str] = None) -> str:
+        """Activa `version` en el registro (si se indica) y cambia de sesión en caliente."""
+        with self._lock_modelo:
+            if version is not None:
+                model_registry.activar(version)
+            self._cargar_modelo()
+            return self._modelo.version
+
+    def _cargar_modelo(self) -> None:
+        """
+        Construye la sesión nueva por completo y solo entonces la publica con una única
+        asignación: las peticiones en curso terminan con la sesión vieja.
+        Orden: versión activa del registro -> MODELO_ONNX_PATH -> MODELO_PATH -> heurística.
+        """
+        self._mtime_registro = model_registry.mtime_manifiesto()
+        activo = model_registry.modelo_activo()
+        if activo is not None and ort is not None:
+            version, ruta = activo
+            try:
+                sesion = ort.InferenceSession(str(ruta), providers=["CPUExecutionProvider"])
+                self._modelo = ModeloActivo(version=f"onnx:{version}", onnx_session=sesion)
+                return
+            except Exception as exc:
+                print(f"Advertencia: no se pudo cargar la versión {version} del registro ({ruta}): {exc}")
+
+        if self._modelo is not None:
+            return  # registro roto: mejor seguir con el modelo que ya funciona
 
         onnx_model_path = self._resolve_model_path(MODELO_ONNX_PATH)
         pt_model_path = self._resolve_model_path(MODELO_PATH)
 
         if onnx_model_path.exists() and ort is not None:
             try:
-                self.onnx_session = ort.InferenceSession(str(onnx_model_path), providers=["CPUExecutionProvider"])
-                self._model_ready = True
+                sesion = ort.InferenceSession(str(onnx_model_path), providers=["CPUExecutionProvider"])
+                self._modelo = ModeloActivo(version=f"onnx:{_huella_archivo(onnx_model_path)}", onnx_session=sesion)
                 return
             except Exception as exc:
-                self.onnx_session = None
                 print(f"Advertencia: no se pudo cargar el modelo ONNX {onnx_model_path}: {exc}")
 
         if pt_model_path.exists() and torch is not None:
             try:
                 self.net.load_state_dict(torch.load(pt_model_path, map_location=self.device))
-                self._model_ready = True
+                self._modelo = ModeloActivo(version=f"pt:{_huella_archivo(pt_model_path)}", usa_torch=True)
                 return
             except Exception as exc:
                 print(f"Advertencia: no se pudo cargar el modelo PyTorch {pt_model_path}: {exc}")
 
         if torch is None and ort is None:
             print("Advertencia: no hay PyTorch ni ONNX Runtime disponible; usando heurística simple.")
-            self._model_ready = True
+            self._modelo = ModeloActivo(version="heuristica")
             return
 
         if torch is None:
             print("Advertencia: PyTorch no está instalado; usando heurística simple.")
-            self._model_ready = True
+            self._modelo = ModeloActivo(version="heuristica")
             return
 
         self._bootstrap_train()
-        self._model_ready = True
+        self._modelo = ModeloActivo(version="pt:bootstrap", usa_torch=True)
 
     def _bootstrap_train(self) -> None:
         """Entrena la red con pares sintéticos calibrados contra Monte Carlo puro."""
@@ -344,18 +622,24 @@ class CombatSimulatorEngine:
                 armor * 0.8, speed * 0.5, pen * dano, recarga * cadencia]
 
     def obtener_modificadores(self, tanque: Dict[str, Any], distancia: int) -> Tuple[float, float, float]:
+        return self._modificadores_con_version(tanque, distancia)[0]
+
+    def _modificadores_con_version(
+        self, tanque: Dict[str, Any], distancia: int
+    ) -> Tuple[Tuple[float, float, float], str]:
         self.ensure_model_ready()
+        modelo = self._modelo  # una sola lectura: un swap concurrente no mezcla versiones
         feat = self._vector_caracteristicas(tanque, distancia)
-        if self.onnx_session is not None:
-            input_name = self.onnx_session.get_inputs()[0].name
-            outputs = self.onnx_session.run(None, {input_name: np.array([feat], dtype=np.float32)})
+        if modelo.onnx_session is not None:
+            input_name = modelo.onnx_session.get_inputs()[0].name
+            outputs = modelo.onnx_session.run(None, {input_name: np.array([feat], dtype=np.float32)})
             mods = outputs[0][0].tolist()
-        elif torch is not None:
+        elif modelo.usa_torch:
             with torch.no_grad():
                 mods = self.net(torch.tensor([feat], dtype=torch.float32, device=self.device))[0].tolist()
         else:
             mods = self._modificadores_monte_carlo_puro(tanque, distancia=feat[-1] * 2000)
-        return mods[0], mods[1], mods[2]
+        return (mods[0], mods[1], mods[2]), modelo.version
 
     def construir_perfil(
         self,
@@ -363,7 +647,7 @@ class CombatSimulatorEngine:
         distancia: int,
         blindaje_objetivo: Optional[float] = None,
     ) -> PerfilCombate:
-        mods = self.obtener_modificadores(tanque, distancia)
+        mods, version = self._modificadores_con_version(tanque, distancia)
         municion = obtener_penetracion_maxima(tanque, distancia, blindaje_objetivo)
         blindaje = max(
             float(tanque.get("blindaje_chasis") or 0),
@@ -395,6 +679,7 @@ class CombatSimulatorEngine:
             tiempo_apuntado_base=tiempo_apuntado_base,
             supervivencia_base=supervivencia_base,
             modificadores=mods,
+            version_modelo=version,
         )
 
 
@@ -408,6 +693,217 @@ def get_engine() -> CombatSimulatorEngine:
     return _engine
 
 
+class GeneradorBloques:
+    """
+    Generador de los motores de bucle: pide a NumPy PCG64 bloques de uniformes y los
+    entrega con un cursor en C (itertools.chain sobre listas), sin una llamada a NumPy por
+    número. Expone el subconjunto de random.Random que usan los motores (random, uniform,
+    choice y seed) y se siembra con las mismas semillas estables (_semilla).
+
+    Con números aleatorios comunes, iteracion(k) coloca el cursor al principio del
+    subflujo k de la semilla (advance de PCG64, sin volver a sembrar): la iteración k
+    ve los mismos números en todas las variantes que se comparan. Los bloques empiezan
+    pequeños y crecen, así que cambiar de subflujo no genera números que se descartan.
+    """
+
+    __slots__ = ("random", "_bits", "_generador", "_estado_base")
+
+    def __init__(self, semilla: Optional[int] = None) -> None:
+        self.seed(semilla)
+
+    def seed(self, semilla: Optional[int] = None) -> None:
+        self._bits = np.random.PCG64(semilla)
+        self._generador = np.random.Generator(self._bits)
+        self._estado_base = self._bits.state
+        self.random = itertools.chain.from_iterable(self._bloques()).__next__
+
+    def iteracion(self, k: int) -> None:
+        self._bits.state = self._estado_base
+        self._bits.advance(k * RNG_SALTO_ITERACION)
+        self.random = itertools.chain.from_iterable(self._bloques()).__next__
+
+    def _bloques(self):
+        n = RNG_BLOQUE_INICIAL
+        while True:
+            yield self._generador.random(n).tolist()
+            n = min(n * 2, RNG_BLOQUE_MAX)
+
+    def uniform(self, a: float, b: float) -> float:
+        return a + (b - a) * self.random()
+
+    def choice(self, secuencia: List[Any]) -> Any:
+        return secuencia[int(self.random() * len(secuencia))]
+
+
+class _CacheLRU:
+    """Caché LRU acotada y segura entre hilos."""
+
+    def __init__(self, max_items: int) -> None:
+        self.max_items = max_items
+        self._datos: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def get(self, clave: Any) -> Any:
+        with self._lock:
+            valor = self._datos.get(clave)
+            if valor is not None:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+            else:
+                self.fallos += 1
+            return valor
+
+    def put(self, clave: Any, valor: Any) -> None:
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_items:
+                self._datos.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self) -> int:
+        return len(self._datos)
+
+    def __contains__(self, clave: Any) -> bool:
+        with self._lock:
+            return clave in self._datos
+
+    def estadisticas(self) -> Dict[str, Any]:
+        consultas = self.aciertos + self.fallos
+        return {
+            "entradas": len(self._datos),
+            "max_entradas": self.max_items,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_acierto": round(self.aciertos / consultas, 4) if consultas else 0.0,
+        }
+
+
+_cache_perfiles = _CacheLRU(CACHE_PERFILES_MAX)
+_cache_disparos = _CacheLRU(CACHE_DISPAROS_MAX)
+_cache_duelos = _CacheLRU(CACHE_DUELOS_MAX)
+# Claves de duelo precalculadas por el calentador y aún no pedidas: el primer acierto
+# sobre cada una habría sido un fallo sin calentamiento.
+_claves_calentadas: set = set()
+_aciertos_calentados = 0
+
+
+def huella_tanque(tanque: Dict[str, Any]) -> str:
+    """Hash estable del documento del tanque (sin _id ni versión del catálogo) para claves de caché."""
+    contenido = {k: v for k, v in tanque.items() if k not in ("_id", CLAVE_VERSION_CATALOGO)}
+    serializado = json.dumps(contenido, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(serializado.encode("utf-8")).hexdigest()
+
+
+def _semilla(*clave: Any) -> int:
+    """Semilla de 32 bits para la clave. hash() de str cambia en cada proceso (PYTHONHASHSEED); esta no."""
+    return int.from_bytes(hashlib.sha256(repr(clave).encode("utf-8")).digest()[:4], "little")
+
+
+def agrupar_tanques(equipo: List[Dict[str, Any]]) -> List[GrupoTanques]:
+    """Agrupa un equipo en (tanque, copias) por huella, conservando el orden de primera aparición."""
+    grupos: Dict[str, GrupoTanques] = {}
+    for i, tanque in enumerate(equipo):
+        grupo = grupos.setdefault(huella_tanque(tanque), GrupoTanques(tanque))
+        grupo.indices.append(i)
+    return list(grupos.values())
+
+
+def _clave_tanque(tanque: Dict[str, Any]) -> Any:
+    """
+    (_id, versión del catálogo) si el tanque es una copia sin modificar del catálogo en
+    memoria; si no (equipos enviados por el cliente, workers, tanques sintéticos), su huella.
+    """
+    version = tanque.get(CLAVE_VERSION_CATALOGO)
+    if version is not None and tanque.get("_id") is not None:
+        return (str(tanque["_id"]), version)
+    return huella_tanque(tanque)
+
+
+def obtener_perfil(
+    tanque: Dict[str, Any],
+    distancia: int,
+    blindaje_objetivo: Optional[float] = None,
+) -> PerfilCombate:
+    """Versión cacheada de CombatSimulatorEngine.construir_perfil. El perfil devuelto es compartido: no mutar."""
+    blindaje_clave = None if blindaje_objetivo is None else round(float(blindaje_objetivo), 3)
+    clave = (_clave_tanque(tanque), int(distancia), blindaje_clave, get_engine().version_modelo)
+    perfil = _cache_perfiles.get(clave)
+    if perfil is None:
+        perfil = get_engine().construir_perfil(tanque, distancia, blindaje_objetivo)
+        _cache_perfiles.put(clave, perfil)
+    return perfil
+
+
+def _prob_penetracion_media(pen: float, blindaje: float) -> float:
+    """Probabilidad de penetración de _simular_disparo integrada sobre el ángulo de impacto."""
+    pasos = DISPAROS_PUNTOS_ANGULO
+    angulos = 0.88 + (np.arange(pasos) + 0.5) * (1.45 - 0.88) / pasos
+    umbrales = blindaje * angulos
+    ratios = pen / np.maximum(umbrales, 1.0)
+    probs = np.where(pen >= umbrales, 1.0, np.clip(ratios ** 1.4, 0.05, 0.92))
+    return float(probs.mean())
+
+
+def _construir_distribucion_disparos(pen: float, dano_base: float, blindaje: float) -> DistribucionDisparos:
+    resolucion = DISPAROS_RESOLUCION_HP
+    prob_pen = _prob_penetracion_media(pen, blindaje)
+
+    # Daño por impacto penetrante: min(1, dano_base * U(0.75, 1.25)) en unidades de 1/resolucion de HP,
+    # repartido entre las dos celdas vecinas para conservar la media.
+    pasos = DISPAROS_PUNTOS_VARIACION
+    variaciones = 0.75 + (np.arange(pasos) + 0.5) * 0.5 / pasos
+    unidades = np.minimum(1.0, dano_base * variaciones) * resolucion
+    dano_pmf = np.zeros(resolucion + 1)
+    bajo = np.floor(unidades).astype(int)
+    frac = unidades - bajo
+    np.add.at(dano_pmf, bajo, (1.0 - frac) * prob_pen / pasos)
+    np.add.at(dano_pmf, np.minimum(bajo + 1, resolucion), frac * prob_pen / pasos)
+    dano_pmf[0] += 1.0 - prob_pen
+
+    vivos = np.zeros(resolucion)
+    vivos[0] = 1.0
+    muertes: List[float] = []
+    if dano_pmf[0] < 1.0:
+        for _ in range(DISPAROS_MAX):
+            conv = np.convolve(vivos, dano_pmf)
+            muertes.append(float(conv[resolucion:].sum()))
+            vivos = conv[:resolucion]
+            if vivos.sum() < 1e-9:
+                break
+
+    disparos_pmf = np.array(muertes)
+    return DistribucionDisparos(
+        prob_penetracion=prob_pen,
+        dano_pmf=dano_pmf,
+        disparos_pmf=disparos_pmf,
+        disparos_cdf=np.cumsum(disparos_pmf),
+    )
+
+
+def distribucion_disparos(atacante: PerfilCombate, defensor: PerfilCombate) -> DistribucionDisparos:
+    """
+    Distribución de disparos para destruir al defensor, equivalente a repetir _simular_disparo.
+    Se cachea por los parámetros efectivos del disparo, así que perfiles distintos con
+    la misma balística comparten entrada.
+    """
+    pen = atacante.municion_optima.penetracion_mm * atacante.modificadores[0]
+    supervivencia = max(defensor.modificadores[2] * defensor.supervivencia_base, 0.6)
+    dano_base = atacante.municion_optima.dano_esperado * atacante.modificadores[1] / supervivencia
+    blindaje = defensor.blindaje_efectivo
+    clave = (round(pen, 4), round(dano_base, 6), round(blindaje, 4))
+    dist = _cache_disparos.get(clave)
+    if dist is None:
+        dist = _construir_distribucion_disparos(pen, dano_base, blindaje)
+        _cache_disparos.put(clave, dist)
+    return dist
+
+
 def parse_distancia_combate(situacion: str) -> int:
     texto = situacion.lower()
     km_match = re.search(r"(\d+(?:[.,]\d+)?)\s*km", texto)
@@ -572,97 +1068,351 @@ def calcular_dpm(tanque: Dict[str, Any], distancia: int) -> float:
     return disparos_por_min * dano * 100
 
 
-def _tiempo_de_apuntado(atacante: PerfilCombate, distancia: int, rng: random.Random) -> float:
+def _tiempo_de_apuntado_base(atacante: PerfilCombate, distancia: int) -> float:
     distancia_factor = 1.0 + min(max(distancia / 1500.0, 0.0), 0.5)
     turret_speed_penalty = max(0.9, 1.0 + (45.0 - atacante.velocidad_torreta) / 120.0)
     elevation_penalty = 1.0 + max(0.0, (25.0 - atacante.angulo_elevacion_max) / 80.0 + (12.0 - atacante.angulo_depresion_max) / 140.0)
     crew_penalty = 1.0 + (1.0 - atacante.tripulacion) * 0.35
+    return atacante.tiempo_apuntado_base * distancia_factor * turret_speed_penalty * elevation_penalty * crew_penalty
+
+
+def _tiempo_de_apuntado(atacante: PerfilCombate, distancia: int, rng: GeneradorBloques) -> float:
     ruido = rng.uniform(0.85, 1.15)
-    return max(0.35, atacante.tiempo_apuntado_base * distancia_factor * turret_speed_penalty * elevation_penalty * crew_penalty * ruido)
+    return max(0.35, _tiempo_de_apuntado_base(atacante, distancia) * ruido)
+
+
+# --------------------------------------------------------------------
+# Modo traza. El disparo y el bucle de duelo se escriben una sola vez, con las
+# llamadas a `registro` que alimentan la traza; _compilar_sin_traza genera al
+# importar el módulo la variante normal quitando esas llamadas y el parámetro.
+# Las dos consumen el RNG en el mismo orden (una iteración trazada da el mismo
+# resultado que sin trazar) y el bucle normal no lleva ninguna comprobación.
+# --------------------------------------------------------------------
+
+class _QuitarRegistro(ast.NodeTransformer):
+    """Quita las sentencias registro.x(...), el parámetro y los argumentos `registro`
+    y renombra las funciones *_traza a su variante sin traza."""
+
+    def visit_FunctionDef(self, nodo: ast.FunctionDef) -> ast.FunctionDef:
+        nodo.name = nodo.name.removesuffix("_traza")
+        nodo.args.args = [a for a in nodo.args.args if a.arg != "registro"]
+        return self.generic_visit(nodo)
+
+    def visit_Expr(self, nodo: ast.Expr) -> Optional[ast.Expr]:
+        llamada = nodo.value
+        if (
+            isinstance(llamada, ast.Call)
+            and isinstance(llamada.func, ast.Attribute)
+            and isinstance(llamada.func.value, ast.Name)
+            and llamada.func.value.id == "registro"
+        ):
+            return None
+        return self.generic_visit(nodo)
+
+    def visit_Call(self, nodo: ast.Call) -> ast.Call:
+        nodo.args = [a for a in nodo.args if not (isinstance(a, ast.Name) and a.id == "registro")]
+        return self.generic_visit(nodo)
+
+    def visit_Name(self, nodo: ast.Name) -> ast.Name:
+        if nodo.id.endswith("_traza"):
+            nodo.id = nodo.id.removesuffix("_traza")
+        return nodo
+
+    def generic_visit(self, nodo: ast.AST) -> ast.AST:
+        super().generic_visit(nodo)
+        # Un bloque que solo registraba se queda con un pass
+        if getattr(nodo, "body", None) == []:
+            nodo.body = [ast.Pass()]
+        return nodo
 
 
-def _prob_penetracion(pen: float, blindaje: float, pen_mod: float, rng: random.Random) -> bool:
-    angulo = rng.uniform(0.88, 1.45)
-    umbral = blindaje * angulo / max(pen_mod, 0.1)
-    if pen >= umbral:
-        return True
-    ratio = pen / max(umbral, 1)
-    return rng.random() < max(0.05, min(0.92, ratio ** 1.4))
+def _compilar_sin_traza(funcion: Any) -> Any:
+    """Variante de `funcion` (escrita con un parámetro `registro`) sin ninguna llamada de traza."""
+    arbol = ast.parse(textwrap.dedent(inspect.getsource(funcion)))
+    ast.increment_lineno(arbol, funcion.__code__.co_firstlineno - 1)
+    arbol = ast.fix_missing_locations(_QuitarRegistro().visit(arbol))
+    codigo = compile(arbol, inspect.getsourcefile(funcion), "exec", flags=annotations.compiler_flag, dont_inherit=True)
+    espacio: Dict[str, Any] = {}
+    exec(codigo, funcion.__globals__, espacio)
+    (compilada,) = espacio.values()
+    return compilada
 
 
-def _simular_disparo(
+class _RegistroTraza:
+    """Recoge el detalle disparo a disparo de una iteración trazada."""
+
+    __slots__ = ("eventos", "_tirada", "_impacto")
+
+    def __init__(self) -> None:
+        self.eventos: List[Dict[str, Any]] = []
+        self._tirada: Dict[str, Any] = {}
+        self._impacto: Dict[str, Any] = {}
+
+    def penetracion(self, tirada: float, prob: float) -> None:
+        self._tirada = {"tirada": round(tirada, 4), "prob_penetrar": round(prob, 4)}
+
+    def impacto(self, pen: float, umbral: float, penetra: bool, dano: float) -> None:
+        self._impacto = {
+            "penetracion_mm": round(pen, 1),
+            "blindaje_efectivo_mm": round(umbral, 1),
+            "tirada": None,
+            "prob_penetrar": 1.0,
+            **self._tirada,
+            "penetra": penetra,
+            "dano": round(dano, 4),
+        }
+        self._tirada = {}
+
+    def disparo(self, t: float, tirador: PerfilCombate, hp_a: float, hp_b: float) -> None:
+        self.eventos.append({"t": round(t, 2), "tirador": tirador.nombre, "tipo": "disparo", **self._impacto,
+                             "hp_a": round(hp_a, 4), "hp_b": round(hp_b, 4)})
+
+    def recarga(self, t: float, tirador: PerfilCombate, listo_en: float) -> None:
+        self.eventos.append({"t": round(t, 2), "tirador": tirador.nombre, "tipo": "recarga", "listo_en": round(listo_en, 2)})
+
+
+def _simular_disparo_traza(
     atacante: PerfilCombate,
     defensor: PerfilCombate,
-    rng: random.Random,
+    rng: GeneradorBloques,
+    registro: _RegistroTraza,
 ) -> float:
     pen = atacante.municion_optima.penetracion_mm * atacante.modificadores[0]
-    if not _prob_penetracion(pen, defensor.blindaje_efectivo, 1.0, rng):
-        return 0.0
+    umbral = defensor.blindaje_efectivo * rng.uniform(0.88, 1.45)
+    if pen < umbral:
+        prob = max(0.05, min(0.92, (pen / max(umbral, 1)) ** 1.4))
+        tirada = rng.random()
+        registro.penetracion(tirada, prob)
+        if tirada >= prob:
+            registro.impacto(pen, umbral, False, 0.0)
+            return 0.0
     dano = atacante.municion_optima.dano_esperado * atacante.modificadores[1]
     supervivencia = max(defensor.modificadores[2] * defensor.supervivencia_base, 0.6)
-    dano /= supervivencia
-    variacion = rng.uniform(0.75, 1.25)
-    return min(1.0, dano * variacion)
+    dano = min(1.0, dano / supervivencia * rng.uniform(0.75, 1.25))
+    registro.impacto(pen, umbral, True, dano)
+    return dano
+
+
+_simular_disparo = _compilar_sin_traza(_simular_disparo_traza)
+def _siguiente_tick(t: float, siguiente: float, dt: float) -> float:
+    """
+    Avance de los bucles por ticks de dt: salta directamente al primer tick en que vence
+    `siguiente` (el próximo disparo, recarga o el límite de tiempo), como mínimo uno.
+    Los ticks intermedios no cambian el estado ni consumen el RNG, y t avanza siempre en
+    múltiplos de dt: los eventos se disparan en el mismo tick que avanzando de uno en uno.
+    """
+    pasos = max(1, math.ceil((siguiente - t) / dt))
+    return t + pasos * dt
 
 
-def _simular_duelo_unico(
+def _simular_duelo_unico_traza(
     perfil_a: PerfilCombate,
     perfil_b: PerfilCombate,
     distancia: int,
-    rng: random.Random,
+    rng: GeneradorBloques,
+    registro: _RegistroTraza,
     max_tiempo: float = 120.0,
-) -> Tuple[str, float]:
+) -> Tuple[str, float, int, int]:
+    """
+    Un duelo; devuelve (lado ganador, duración, disparos de A, disparos de B). El ganador
+    es "A" o "B" y no el nombre, que se repite en los duelos espejo. La variante sin
+    traza es _simular_duelo_unico.
+    """
     hp_a, hp_b = 1.0, 1.0
     t = 0.0
     next_a = _tiempo_de_apuntado(perfil_a, distancia, rng)
     next_b = _tiempo_de_apuntado(perfil_b, distancia, rng) * rng.uniform(0.8, 1.2)
     rounds_a = perfil_a.cargador
     rounds_b = perfil_b.cargador
+    disparos_a = disparos_b = 0
 
     while t < max_tiempo and hp_a > 0 and hp_b > 0:
         if t >= next_a and hp_b > 0:
             if rounds_a <= 0:
                 rounds_a = perfil_a.cargador
                 next_a = t + max(perfil_a.recarga * rng.uniform(0.85, 1.15), 1.0)
+                registro.recarga(t, perfil_a, next_a)
             else:
-                hp_b -= _simular_disparo(perfil_a, perfil_b, rng)
+                hp_b -= _simular_disparo_traza(perfil_a, perfil_b, rng, registro)
                 rounds_a -= 1
+                disparos_a += 1
                 intervalo = perfil_a.intervalo_disparo
                 aim_penalty = _tiempo_de_apuntado(perfil_a, distancia, rng)
                 next_a = t + max(intervalo, aim_penalty)
+                registro.disparo(t, perfil_a, hp_a, hp_b)
 
         if t >= next_b and hp_a > 0:
             if rounds_b <= 0:
                 rounds_b = perfil_b.cargador
                 next_b = t + max(perfil_b.recarga * rng.uniform(0.85, 1.15), 1.0)
+                registro.recarga(t, perfil_b, next_b)
             else:
-                hp_a -= _simular_disparo(perfil_b, perfil_a, rng)
+                hp_a -= _simular_disparo_traza(perfil_b, perfil_a, rng, registro)
                 rounds_b -= 1
+                disparos_b += 1
                 intervalo = perfil_b.intervalo_disparo
                 aim_penalty = _tiempo_de_apuntado(perfil_b, distancia, rng)
                 next_b = t + max(intervalo, aim_penalty)
+                registro.disparo(t, perfil_b, hp_a, hp_b)
 
-        t += 0.05
+        if hp_a > 0 and hp_b > 0:
+            t = _siguiente_tick(t, min(next_a, next_b, max_tiempo), 0.05)
+        else:
+            t += 0.05
 
     if hp_a <= 0 and hp_b <= 0:
-        ganador = perfil_a.nombre if rng.random() < 0.5 else perfil_b.nombre
+        ganador = "A" if rng.random() < 0.5 else "B"
     elif hp_b <= 0:
-        ganador = perfil_a.nombre
+        ganador = "A"
     elif hp_a <= 0:
-        ganador = perfil_b.nombre
+        ganador = "B"
     else:
-        ganador = perfil_a.nombre if hp_a > hp_b else perfil_b.nombre
-    return ganador, t
+        ganador = "A" if hp_a > hp_b else "B"
+    return ganador, t, disparos_a, disparos_b
 
 
-def simular_duelo_monte_carlo(
+_simular_duelo_unico = _compilar_sin_traza(_simular_duelo_unico_traza)
+
+
+def _iteraciones_trazadas(n_simulaciones: int, trazas: int) -> set:
+    """Muestra de iteraciones a trazar, repartida uniformemente sobre la simulación."""
+    trazas = max(0, min(trazas, TRAZAS_MAX, n_simulaciones))
+    if not trazas:
+        return set()
+    return {int(i) for i in np.linspace(0, n_simulaciones - 1, trazas)}
+
+
+def _puntos_uniformes(bajo: float, alto: float, n: int) -> np.ndarray:
+    return bajo + (np.arange(n) + 0.5) * (alto - bajo) / n
+
+
+def _ticks_relativos(perfil: PerfilCombate, distancia: int, dt: float) -> np.ndarray:
+    """
+    Ticks (esperados) de cada disparo de _simular_duelo_unico contados desde el primero:
+    hueco max(intervalo, apuntado) y recarga del cargador tras cada `cargador` disparos.
+    """
+    ruido = _puntos_uniformes(0.85, 1.15, DUELO_ANALITICO_PUNTOS)
+    apuntado = np.maximum(0.35, _tiempo_de_apuntado_base(perfil, distancia) * ruido)
+    hueco = np.ceil(np.maximum(perfil.intervalo_disparo, apuntado) / dt - 1e-9).mean()
+    hueco_recarga = np.ceil(np.maximum(perfil.recarga * ruido, 1.0) / dt - 1e-9).mean()
+    huecos = np.full(DISPAROS_MAX - 1, hueco)
+    cargador = max(perfil.cargador, 1)
+    huecos[cargador - 1::cargador] += hueco_recarga
+    return np.concatenate(([0.0], np.cumsum(huecos)))
+
+
+def _ticks_primer_disparo(perfil: PerfilCombate, distancia: int, dt: float, retardo: bool) -> np.ndarray:
+    """Tick del primer disparo para cada punto de cuadratura del ruido de apuntado (y retardo de B)."""
+    ruido = _puntos_uniformes(0.85, 1.15, DUELO_ANALITICO_PUNTOS)
+    inicio = np.maximum(0.35, _tiempo_de_apuntado_base(perfil, distancia) * ruido)
+    if retardo:
+        inicio = np.outer(inicio, _puntos_uniformes(0.8, 1.2, DUELO_ANALITICO_PUNTOS)).ravel()
+    return np.ceil(inicio / dt - 1e-9)
+
+
+def _prob_desempate_tiempo(vivos_a: np.ndarray, vivos_b: np.ndarray) -> float:
+    """P(daño acumulado en A < daño acumulado en B) con ambos vivos; empate a cero gana B."""
+    masa_a, masa_b = vivos_a.sum(), vivos_b.sum()
+    if masa_a <= 0 or masa_b <= 0:
+        return 0.5
+    a = vivos_a / masa_a
+    b = vivos_b / masa_b
+    mayor_b = np.append(np.cumsum(b[::-1])[::-1][1:], 0.0)
+    return float((a * mayor_b).sum()) + 0.5 * float((a[1:] * b[1:]).sum())
+
+
+def _resolver_duelo_analitico(
+    perfil_a: PerfilCombate,
+    perfil_b: PerfilCombate,
+    distancia: int,
+    max_tiempo: float = 120.0,
+    dt: float = 0.05,
+) -> Tuple[float, float]:
+    """
+    Resuelve _simular_duelo_unico sin muestreo. Cada tanque dispara según una secuencia de
+    renovación (cadencia, cargador, recarga) y necesita N disparos con la distribución de
+    distribucion_disparos; el desfase entre primeros disparos se integra por cuadratura y se
+    evalúa vectorizado. Devuelve (probabilidad de victoria de A, tiempo medio de combate).
+    """
+    prob_a, tiempo_medio, _, _ = _resolver_duelo_analitico_completo(perfil_a, perfil_b, distancia, max_tiempo, dt)
+    return prob_a, tiempo_medio
+
+
+def _resolver_duelo_analitico_completo(
+    perfil_a: PerfilCombate,
+    perfil_b: PerfilCombate,
+    distancia: int,
+    max_tiempo: float = 120.0,
+    dt: float = 0.05,
+) -> Tuple[float, float, np.ndarray, np.ndarray]:
+    """Como _resolver_duelo_analitico, más la distribución de la duración: (duraciones, probabilidades)."""
+    dist_ab = distribucion_disparos(perfil_a, perfil_b)
+    dist_ba = distribucion_disparos(perfil_b, perfil_a)
+    max_ticks = math.ceil(max_tiempo / dt - 1e-9)
+
+    rel_a = _ticks_relativos(perfil_a, distancia, dt)
+    rel_b = _ticks_relativos(perfil_b, distancia, dt)
+    inicio_a = _ticks_primer_disparo(perfil_a, distancia, dt, retardo=False)
+    inicio_b = _ticks_primer_disparo(perfil_b, distancia, dt, retardo=True)
+    desfases, inversos = np.unique(np.subtract.outer(inicio_b, inicio_a).ravel(), return_inverse=True)
+    pesos = np.bincount(inversos) / inversos.size
+    origen = float(inicio_a.mean())
+
+    # A: una fila; B: una fila por desfase. Los disparos fuera del límite de tiempo no cuentan.
+    abs_a = origen + rel_a
+    pmf_a = np.zeros(DISPAROS_MAX)
+    pmf_a[:len(dist_ab.disparos_pmf)] = dist_ab.disparos_pmf
+    pmf_a = np.where(abs_a < max_ticks, pmf_a, 0.0)
+    cdf_a = np.concatenate(([0.0], np.cumsum(pmf_a)))
+    abs_b = origen + desfases[:, None] + rel_b[None, :]
+    pmf_b = np.zeros(DISPAROS_MAX)
+    pmf_b[:len(dist_ba.disparos_pmf)] = dist_ba.disparos_pmf
+    pmf_b = np.where(abs_b < max_ticks, pmf_b[None, :], 0.0)
+    cdf_b = np.concatenate((np.zeros((len(desfases), 1)), np.cumsum(pmf_b, axis=1)), axis=1)
+
+    # A destruye a B con su disparo k: gana si B no lo destruyó antes; en el mismo tick ambos caen (50/50).
+    previos_b = np.searchsorted(rel_b, rel_a[None, :] - desfases[:, None], side="left")
+    hasta_b = np.searchsorted(rel_b, rel_a[None, :] - desfases[:, None], side="right")
+    cdf_b_hasta = np.take_along_axis(cdf_b, hasta_b, axis=1)
+    sobrevive_b = 1.0 - cdf_b_hasta
+    empate = cdf_b_hasta - np.take_along_axis(cdf_b, previos_b, axis=1)
+    gana_a = (pmf_a[None, :] * (sobrevive_b + 0.5 * empate)).sum(axis=1)
+
+    hasta_a = np.searchsorted(rel_a, rel_b[None, :] + desfases[:, None], side="right")
+    sobrevive_a = 1.0 - cdf_a[hasta_a]
+
+    # El combate termina en el tick siguiente al primer derribo o en el límite de tiempo.
+    masa_fin_a = pmf_a[None, :] * (sobrevive_b + empate)
+    masa_fin_b = pmf_b * sobrevive_a
+    tiempo = (masa_fin_a * (abs_a[None, :] + 1) * dt).sum(axis=1)
+    tiempo += (masa_fin_b * (abs_b + 1) * dt).sum(axis=1)
+
+    p_limite = (1.0 - cdf_a[-1]) * (1.0 - cdf_b[:, -1])
+    vivos_b = dist_ab.vivos_tras(int((abs_a < max_ticks).sum()))
+    disparos_b = (abs_b < max_ticks).sum(axis=1)
+    desempate = {n: _prob_desempate_tiempo(dist_ba.vivos_tras(int(n)), vivos_b) for n in np.unique(disparos_b)}
+    gana_a += p_limite * np.array([desempate[n] for n in disparos_b])
+    tiempo += p_limite * max_ticks * dt
+
+    prob_a = float((pesos * gana_a).sum())
+    duraciones = np.concatenate((
+        np.broadcast_to((abs_a + 1) * dt, masa_fin_a.shape).ravel(),
+        ((abs_b + 1) * dt).ravel(),
+        np.full(len(desfases), max_ticks * dt),
+    ))
+    probabilidades = np.concatenate((
+        (pesos[:, None] * masa_fin_a).ravel(),
+        (pesos[:, None] * masa_fin_b).ravel(),
+        pesos * p_limite,
+    ))
+    return min(1.0, max(0.0, prob_a)), float((pesos * tiempo).sum()), duraciones, probabilidades
+
+
+def _perfiles_duelo(
     tanque1: Dict[str, Any],
     tanque2: Dict[str, Any],
-    situacion: str,
-    n_simulaciones: int = MC_DUELO_ITERACIONES,
-) -> ResultadoDuelo:
-    engine = get_engine()
-    distancia = parse_distancia_combate(situacion)
+    distancia: int,
+) -> Tuple[PerfilCombate, PerfilCombate]:
     blindaje_v2 = max(
         float(tanque2.get("blindaje_chasis") or 0),
         float(tanque2.get("blindaje_torreta") or 0),
@@ -671,20 +1421,67 @@ def simular_duelo_monte_carlo(
         float(tanque1.get("blindaje_chasis") or 0),
         float(tanque1.get("blindaje_torreta") or 0),
     ) * SLOPE_FACTOR
-    p1 = engine.construir_perfil(tanque1, distancia, blindaje_v2)
-    p2 = engine.construir_perfil(tanque2, distancia, blindaje_v1)
+    return obtener_perfil(tanque1, distancia, blindaje_v2), obtener_perfil(tanque2, distancia, blindaje_v1)
 
-    rng = random.Random(hash((p1.nombre, p2.nombre, distancia)) & 0xFFFFFFFF)
-    victorias = {p1.nombre: 0, p2.nombre: 0}
-    tiempos: List[float] = []
 
-    for _ in range(n_simulaciones):
-        ganador, tiempo = _simular_duelo_unico(p1, p2, distancia, rng)
-        victorias[ganador] += 1
-        tiempos.append(tiempo)
-
-    prob1 = victorias[p1.nombre] / n_simulaciones
-    prob2 = victorias[p2.nombre] / n_simulaciones
+def simular_duelo_monte_carlo(
+    tanque1: Dict[str, Any],
+    tanque2: Dict[str, Any],
+    situacion: str,
+    n_simulaciones: int = MC_DUELO_ITERACIONES,
+    metodo: str = "monte_carlo",
+    trazas: int = 0,
+) -> ResultadoDuelo:
+    """
+    Simula el duelo 1v1. `metodo="analitico"` usa el solver determinista
+    (_resolver_duelo_analitico); "monte_carlo" se mantiene como referencia.
+    `trazas` > 0 registra el detalle disparo a disparo de una muestra de iteraciones
+    (solo Monte Carlo); esas iteraciones pasan por _simular_duelo_unico_traza.
+    """
+    if metodo not in METODOS_DUELO:
+        raise ValueError(f"Método de simulación desconocido: {metodo}")
+    distancia = parse_distancia_combate(situacion)
+    p1, p2 = _perfiles_duelo(tanque1, tanque2, distancia)
+
+    traza = None
+    if metodo == "analitico":
+        prob1, tiempo_medio, duraciones, probabilidades = _resolver_duelo_analitico_completo(p1, p2, distancia)
+        prob2 = 1.0 - prob1
+        # Histograma de TTK con los conteos esperados para n_simulaciones iteraciones; los
+        # disparos efectuados no salen del solver (solo su distribución hasta el derribo)
+        estadisticas_ttk = EstadisticasStreaming.desde_distribucion(
+            0.0, 120.0, HISTOGRAMA_TTK_BINS, duraciones, probabilidades, n_simulaciones,
+        )
+        n_simulaciones = None
+        estadisticas_disparos_v1 = estadisticas_disparos_v2 = None
+    else:
+        rng = GeneradorBloques(_semilla(p1.nombre, p2.nombre, distancia))
+        victorias = {"A": 0, "B": 0}
+        estadisticas_ttk = _estadisticas_ttk(120.0)
+        estadisticas_disparos_v1 = _estadisticas_disparos()
+        estadisticas_disparos_v2 = _estadisticas_disparos()
+
+        trazadas = _iteraciones_trazadas(n_simulaciones, trazas)
+        traza = [] if trazadas else None
+
+        for k in range(n_simulaciones):
+            if k in trazadas:
+                registro = _RegistroTraza()
+                ganador, tiempo, disparos_1, disparos_2 = _simular_duelo_unico_traza(p1, p2, distancia, rng, registro)
+                nombre_ganador = p1.nombre if ganador == "A" else p2.nombre
+                traza.append({
+                    "iteracion": k, "ganador": nombre_ganador, "duracion_s": round(tiempo, 2), "eventos": registro.eventos,
+                })
+            else:
+                ganador, tiempo, disparos_1, disparos_2 = _simular_duelo_unico(p1, p2, distancia, rng)
+            victorias[ganador] += 1
+            estadisticas_ttk.agregar(tiempo)
+            estadisticas_disparos_v1.agregar(disparos_1)
+            estadisticas_disparos_v2.agregar(disparos_2)
+
+        prob1 = victorias["A"] / n_simulaciones
+        prob2 = victorias["B"] / n_simulaciones
+        tiempo_medio = estadisticas_ttk.media
     if prob1 >= prob2:
         ganador, perdedor, prob_g = p1.nombre, p2.nombre, prob1
     else:
@@ -707,15 +1504,265 @@ def simular_duelo_monte_carlo(
         prob_victoria_v2=prob2,
         distancia_m=distancia,
         simulaciones=n_simulaciones,
-        tiempo_medio_victoria_s=sum(tiempos) / len(tiempos),
+        tiempo_medio_victoria_s=tiempo_medio,
         municion_v1=p1.municion_optima,
         municion_v2=p2.municion_optima,
         detalles_v1=detalles_v1,
         detalles_v2=detalles_v2,
         resumen_tecnico=resumen,
+        metodo=metodo,
+        estadisticas_ttk=estadisticas_ttk,
+        estadisticas_disparos_v1=estadisticas_disparos_v1,
+        estadisticas_disparos_v2=estadisticas_disparos_v2,
+        traza=traza,
+        version_modelo=p1.version_modelo,
+    )
+
+
+def comparar_solvers_duelo(
+    tanque1: Dict[str, Any],
+    tanque2: Dict[str, Any],
+    situacion: str,
+    n_simulaciones: int = MC_DUELO_ITERACIONES,
+) -> Dict[str, float]:
+    """Ejecuta ambos métodos sobre el mismo duelo para validar el solver analítico contra Monte Carlo."""
+    mc = simular_duelo_monte_carlo(tanque1, tanque2, situacion, n_simulaciones)
+    analitico = simular_duelo_monte_carlo(tanque1, tanque2, situacion, metodo="analitico")
+    return {
+        "prob_v1_monte_carlo": mc.prob_victoria_v1,
+        "prob_v1_analitico": analitico.prob_victoria_v1,
+        "diferencia_prob_v1": abs(mc.prob_victoria_v1 - analitico.prob_victoria_v1),
+        "tiempo_medio_monte_carlo_s": mc.tiempo_medio_victoria_s,
+        "tiempo_medio_analitico_s": analitico.tiempo_medio_victoria_s,
+    }
+
+
+_metricas_router = {"analitico": 0, "monte_carlo": 0}
+_lock_metricas_router = threading.Lock()
+
+
+def simular_duelo_escalonado(
+    tanque1: Dict[str, Any],
+    tanque2: Dict[str, Any],
+    situacion: str,
+    n_simulaciones: int = MC_DUELO_ITERACIONES,
+    fidelidad: str = "auto",
+    trazas: int = 0,
+) -> ResultadoDuelo:
+    """
+    Router de fidelidad delante de simular_duelo_monte_carlo: primero resuelve el duelo
+    con el solver analítico y, si el favorito supera ROUTER_UMBRAL_DECISIVO, devuelve esa
+    respuesta. Solo escala a Monte Carlo en duelos ajustados, con `fidelidad="completa"`
+    o cuando se piden trazas (el solver analítico no tiene disparos que registrar).
+    """
+    global _aciertos_calentados
+    if fidelidad not in FIDELIDADES_DUELO:
+        raise ValueError(f"Fidelidad desconocida: {fidelidad}")
+
+    clave = None
+    if not trazas:
+        clave = clave_duelo(tanque1, tanque2, situacion, n_simulaciones, fidelidad)
+        resultado = _cache_duelos.get(clave)
+        if resultado is not None:
+            with _lock_metricas_router:
+                _metricas_router[resultado.metodo] += 1
+                if clave in _claves_calentadas:
+                    _claves_calentadas.discard(clave)
+                    _aciertos_calentados += 1
+            return resultado
+
+    resultado = _resolver_duelo_escalonado(tanque1, tanque2, situacion, n_simulaciones, fidelidad, trazas)
+    if clave is not None:
+        _cache_duelos.put(clave, resultado)
+    with _lock_metricas_router:
+        _metricas_router[resultado.metodo] += 1
+    return resultado
+
+
+def _resolver_duelo_escalonado(
+    tanque1: Dict[str, Any],
+    tanque2: Dict[str, Any],
+    situacion: str,
+    n_simulaciones: int,
+    fidelidad: str,
+    trazas: int,
+) -> ResultadoDuelo:
+    if fidelidad == "auto" and not trazas:
+        estimacion = simular_duelo_monte_carlo(tanque1, tanque2, situacion, metodo="analitico")
+        if estimacion.prob_victoria_ganador >= ROUTER_UMBRAL_DECISIVO:
+            return replace(estimacion, motivo_metodo="decisivo")
+    resultado = simular_duelo_monte_carlo(tanque1, tanque2, situacion, n_simulaciones, trazas=trazas)
+    # Copia anotada: el resultado acaba en _cache_duelos y se comparte entre peticiones
+    if fidelidad == "completa":
+        return replace(resultado, motivo_metodo="fidelidad_completa")
+    return replace(resultado, motivo_metodo="traza" if trazas else "ajustado")
+
+
+def clave_duelo(
+    tanque1: Dict[str, Any],
+    tanque2: Dict[str, Any],
+    situacion: str,
+    n_simulaciones: int = MC_DUELO_ITERACIONES,
+    fidelidad: str = "auto",
+) -> Tuple[str, str, int, int, str, str]:
+    return (
+        huella_tanque(tanque1), huella_tanque(tanque2), parse_distancia_combate(situacion),
+        n_simulaciones, fidelidad, get_engine().version_modelo,
     )
 
 
+def calentar_duelo(tanque1: Dict[str, Any], tanque2: Dict[str, Any], situacion: str) -> bool:
+    """
+    Precalcula el duelo con los parámetros por defecto de la API y lo deja en caché.
+    Devuelve False si ya estaba en caché. No cuenta en las métricas del router.
+    """
+    clave = clave_duelo(tanque1, tanque2, situacion)
+    if clave in _cache_duelos:
+        return False
+    resultado = _resolver_duelo_escalonado(tanque1, tanque2, situacion, MC_DUELO_ITERACIONES, "auto", 0)
+    _cache_duelos.put(clave, resultado)
+    with _lock_metricas_router:
+        _claves_calentadas.add(clave)
+    return True
+
+
+def metricas_cache() -> Dict[str, Any]:
+    """Estado de las cachés del motor y efecto del calentador sobre la de duelos."""
+    duelos = _cache_duelos.estadisticas()
+    consultas = duelos["aciertos"] + duelos["fallos"]
+    with _lock_metricas_router:
+        aciertos_calentados = _aciertos_calentados
+        pendientes = len(_claves_calentadas)
+    sin_calentador = duelos["aciertos"] - aciertos_calentados
+    return {
+        "perfiles": _cache_perfiles.estadisticas(),
+        "disparos": _cache_disparos.estadisticas(),
+        "duelos": duelos,
+        "calentador": {
+            "aciertos_por_calentamiento": aciertos_calentados,
+            "claves_calentadas_sin_usar": pendientes,
+            "tasa_acierto_sin_calentador": round(sin_calentador / consultas, 4) if consultas else 0.0,
+            "mejora_tasa_acierto": round(aciertos_calentados / consultas, 4) if consultas else 0.0,
+        },
+    }
+
+
+def metricas_router() -> Dict[str, Any]:
+    """Reparto de duelos resueltos por cada nivel del router desde el arranque."""
+    with _lock_metricas_router:
+        conteos = dict(_metricas_router)
+    total = sum(conteos.values())
+    return {
+        "total": total,
+        "por_metodo": conteos,
+        "fraccion_analitico": round(conteos["analitico"] / total, 4) if total else 0.0,
+        "umbral_decisivo": ROUTER_UMBRAL_DECISIVO,
+    }
+
+
+def _perturbar_perfil(perfil: PerfilCombate, estadistica: str, delta: float) -> PerfilCombate:
+    """Copia del perfil con una estadística desplazada `delta`; no reconstruye desde el documento."""
+    if estadistica == "recarga":
+        recarga = max(0.1, perfil.recarga + delta)
+        intervalo = recarga if perfil.cargador <= 1 else perfil.intervalo_disparo
+        return replace(perfil, recarga=recarga, intervalo_disparo=intervalo)
+    if estadistica == "blindaje":
+        blindaje = max(perfil.blindaje_chasis, perfil.blindaje_torreta)
+        factor_inclinacion = perfil.blindaje_efectivo / blindaje if blindaje > 0 else SLOPE_FACTOR
+        return replace(
+            perfil,
+            blindaje_chasis=perfil.blindaje_chasis + delta,
+            blindaje_torreta=perfil.blindaje_torreta + delta,
+            blindaje_efectivo=max(0.0, perfil.blindaje_efectivo + delta * factor_inclinacion),
+            supervivencia_base=perfil.supervivencia_base + delta / 300.0 * 0.6,
+        )
+    if estadistica == "penetracion":
+        municion = perfil.municion_optima
+        return replace(perfil, municion_optima=replace(municion, penetracion_mm=max(0.0, municion.penetracion_mm + delta)))
+    if estadistica == "velocidad":
+        return replace(perfil, velocidad=max(0.0, perfil.velocidad + delta))
+    raise ValueError(f"Estadística de sensibilidad desconocida: {estadistica}")
+
+
+def _victorias_duelo_crn(
+    perfil_a: PerfilCombate,
+    perfil_b: PerfilCombate,
+    distancia: int,
+    n: int,
+    semilla: int,
+) -> List[int]:
+    """Resultado (1 = gana A) de cada iteración; la iteración k siempre usa el subflujo k de la semilla."""
+    rng = GeneradorBloques(semilla)
+    resultados = []
+    for k in range(n):
+        rng.iteracion(k)
+        ganador = _simular_duelo_unico(perfil_a, perfil_b, distancia, rng)[0]
+        resultados.append(1 if ganador == "A" else 0)
+    return resultados
+
+
+def analizar_sensibilidad_duelo(
+    tanque1: Dict[str, Any],
+    tanque2: Dict[str, Any],
+    situacion: str,
+    estadisticas: Optional[List[str]] = None,
+    deltas: Optional[Dict[str, float]] = None,
+    n_simulaciones: int = MC_SENSIBILIDAD_ITERACIONES,
+) -> Dict[str, Any]:
+    """
+    Gradiente de la probabilidad de victoria del vehículo 1 respecto a sus estadísticas,
+    por diferencias centrales (+delta / -delta) sobre los perfiles ya construidos y con
+    números aleatorios comunes, de modo que la diferencia no arrastra el ruido de Monte Carlo.
+    La munición óptima de ambos se mantiene fija.
+    """
+    distancia = parse_distancia_combate(situacion)
+    p1, p2 = _perfiles_duelo(tanque1, tanque2, distancia)
+    semilla = _semilla(p1.nombre, p2.nombre, distancia, "sensibilidad")
+    estadisticas = estadisticas or [e for e in SENSIBILIDAD_DELTAS if e not in SENSIBILIDAD_SIN_EFECTO]
+    desconocidas = [e for e in estadisticas if e not in SENSIBILIDAD_DELTAS]
+    desconocidas += [e for e in (deltas or {}) if e not in SENSIBILIDAD_DELTAS]
+    if desconocidas:
+        raise ValueError(f"Estadísticas de sensibilidad desconocidas: {', '.join(desconocidas)}")
+    deltas = {**SENSIBILIDAD_DELTAS, **(deltas or {})}
+    no_positivos = [e for e in estadisticas if not (math.isfinite(deltas[e]) and deltas[e] > 0)]
+    if no_positivos:
+        raise ValueError(f"Los deltas de sensibilidad deben ser positivos: {', '.join(no_positivos)}")
+
+    base = _victorias_duelo_crn(p1, p2, distancia, n_simulaciones, semilla)
+    prob_base = sum(base) / n_simulaciones
+    resultados: Dict[str, Any] = {}
+    omitidas: Dict[str, str] = {}
+    for estadistica in estadisticas:
+        if estadistica in SENSIBILIDAD_SIN_EFECTO:
+            omitidas[estadistica] = SENSIBILIDAD_SIN_EFECTO[estadistica]
+            continue
+        delta = float(deltas[estadistica])
+        mas = _victorias_duelo_crn(_perturbar_perfil(p1, estadistica, delta), p2, distancia, n_simulaciones, semilla)
+        menos = _victorias_duelo_crn(_perturbar_perfil(p1, estadistica, -delta), p2, distancia, n_simulaciones, semilla)
+        diferencias = [a - b for a, b in zip(mas, menos)]
+        media = sum(diferencias) / n_simulaciones
+        varianza = sum((d - media) ** 2 for d in diferencias) / max(n_simulaciones - 1, 1)
+        resultados[estadistica] = {
+            "delta": delta,
+            "prob_victoria_base": round(prob_base, 4),
+            "prob_victoria_mas_delta": round(sum(mas) / n_simulaciones, 4),
+            "prob_victoria_menos_delta": round(sum(menos) / n_simulaciones, 4),
+            "gradiente_por_unidad": media / (2 * delta),
+            "error_estandar_gradiente": math.sqrt(varianza / n_simulaciones) / (2 * delta),
+        }
+
+    return {
+        "vehiculo": p1.nombre,
+        "oponente": p2.nombre,
+        "distancia_m": distancia,
+        "simulaciones_por_punto": n_simulaciones,
+        "version_modelo": p1.version_modelo,
+        "prob_victoria_base": round(prob_base, 4),
+        "sensibilidad": resultados,
+        **({"estadisticas_omitidas": omitidas} if omitidas else {}),
+    }
+
+
 def _detalle_perfil(
     atacante: PerfilCombate,
     defensor: PerfilCombate,
@@ -724,6 +1771,7 @@ def _detalle_perfil(
 ) -> Dict[str, Any]:
     pen = atacante.municion_optima.penetracion_mm
     puede_penetrar = pen >= defensor.blindaje_efectivo * 0.85
+    disparos = distribucion_disparos(atacante, defensor)
     return {
         "nombre": atacante.nombre,
         "nacion": atacante.nacion,
@@ -749,6 +1797,10 @@ def _detalle_perfil(
             "masa_explosivo_g": atacante.municion_optima.masa_explosivo,
         },
         "puede_penetrar_oponente": puede_penetrar,
+        "prob_penetracion_disparo": round(disparos.prob_penetracion, 3),
+        "disparos_medios_para_destruir": (
+            round(disparos.disparos_medios, 2) if disparos.prob_muerte > 0 else None
+        ),
         "dpm_estimado": round(calcular_dpm(tanque, distancia), 1),
     }
 
@@ -759,16 +1811,15 @@ def _simular_pareja(
     distancia: int,
     n: int = MC_PAREJA_ITERACIONES,
 ) -> Dict[str, float]:
-    engine = get_engine()
-    pa = engine.construir_perfil(tanque_a, distancia, max(
+    pa = obtener_perfil(tanque_a, distancia, max(
         float(tanque_b.get("blindaje_chasis") or 0),
         float(tanque_b.get("blindaje_torreta") or 0),
     ) * SLOPE_FACTOR)
-    pb = engine.construir_perfil(tanque_b, distancia, max(
+    pb = obtener_perfil(tanque_b, distancia, max(
         float(tanque_a.get("blindaje_chasis") or 0),
         float(tanque_a.get("blindaje_torreta") or 0),
     ) * SLOPE_FACTOR)
-    rng = random.Random(hash((pa.nombre, pb.nombre, distancia, n)) & 0xFFFFFFFF)
+    rng = GeneradorBloques(_semilla(pa.nombre, pb.nombre, distancia, n))
     wins_a = 0
     dmg_to_b = 0.0
     dmg_to_a = 0.0
@@ -788,7 +1839,7 @@ def _simular_pareja(
                 hp_a -= d
                 dmg_to_a += d
                 next_b = t + pb.intervalo_disparo
-            t += 0.05
+            t = _siguiente_tick(t, min(next_a, next_b, 90), 0.05)
         if hp_b <= 0 and hp_a > 0:
             wins_a += 1
         elif hp_a <= 0 and hp_b > 0:
@@ -806,6 +1857,93 @@ def _simular_pareja(
     }
 
 
+class _ConjuntoVivos:
+    """Índices vivos de un equipo con baja y elección aleatoria en O(1)."""
+
+    __slots__ = ("indices", "_posicion")
+
+    def __init__(self, n: int) -> None:
+        self.indices = list(range(n))
+        self._posicion = list(range(n))
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def eliminar(self, i: int) -> None:
+        pos = self._posicion[i]
+        ultimo = self.indices[-1]
+        self.indices[pos] = ultimo
+        self._posicion[ultimo] = pos
+        self.indices.pop()
+
+
+def _simular_batalla_equipos(
+    perfiles_aliados: List[PerfilCombate],
+    perfiles_enemigos: List[PerfilCombate],
+    rng: GeneradorBloques,
+    max_tiempo: float = 240.0,
+) -> Tuple[int, int, float, int]:
+    """Una batalla de equipos; devuelve (aliados vivos, enemigos vivos, duración, disparos totales)."""
+    hp_aliados = [1.0] * len(perfiles_aliados)
+    hp_enemigos = [1.0] * len(perfiles_enemigos)
+    timers_a = [rng.uniform(0, p.intervalo_disparo) for p in perfiles_aliados]
+    timers_e = [rng.uniform(0, p.intervalo_disparo) for p in perfiles_enemigos]
+    vivos_a = _ConjuntoVivos(len(perfiles_aliados))
+    vivos_e = _ConjuntoVivos(len(perfiles_enemigos))
+    t = 0.0
+    disparos = 0
+
+    while t < max_tiempo and vivos_a and vivos_e:
+        # Los tiradores de un bando no mueren durante su propia fase: se puede recorrer la lista viva.
+        for i in vivos_a.indices:
+            if t < timers_a[i]:
+                continue
+            if not vivos_e:
+                break
+            pa = perfiles_aliados[i]
+            j = rng.choice(vivos_e.indices)
+            hp_enemigos[j] -= _simular_disparo(pa, perfiles_enemigos[j], rng)
+            disparos += 1
+            if hp_enemigos[j] <= 0:
+                vivos_e.eliminar(j)
+            timers_a[i] = t + pa.intervalo_disparo
+
+        for j in vivos_e.indices:
+            if t < timers_e[j]:
+                continue
+            if not vivos_a:
+                break
+            pe = perfiles_enemigos[j]
+            i = rng.choice(vivos_a.indices)
+            hp_aliados[i] -= _simular_disparo(pe, perfiles_aliados[i], rng)
+            disparos += 1
+            if hp_aliados[i] <= 0:
+                vivos_a.eliminar(i)
+            timers_e[j] = t + pe.intervalo_disparo
+
+        if vivos_a and vivos_e:
+            siguiente = min(
+                min(timers_a[i] for i in vivos_a.indices),
+                min(timers_e[j] for j in vivos_e.indices),
+                max_tiempo,
+            )
+            t = _siguiente_tick(t, siguiente, 0.1)
+        else:
+            t += 0.1
+
+    return len(vivos_a), len(vivos_e), t, disparos
+
+
+def _perfiles_por_grupo(grupos: List[GrupoTanques], n: int, distancia: int) -> List[PerfilCombate]:
+    """Un perfil por tipo de tanque, repartido a todas sus copias (mismo objeto)."""
+    perfiles: List[Optional[PerfilCombate]] = [None] * n
+    for grupo in grupos:
+        perfil = obtener_perfil(grupo.tanque, distancia)
+        for i in grupo.indices:
+            perfiles[i] = perfil
+    return perfiles
+
+
 def simular_equipos_monte_carlo(
     equipo_aliado: List[Dict[str, Any]],
     equipo_enemigo: List[Dict[str, Any]],
@@ -813,61 +1951,42 @@ def simular_equipos_monte_carlo(
     situacion: str,
     n_simulaciones: int = MC_EQUIPO_ITERACIONES,
 ) -> ResultadoEquipos:
-    engine = get_engine()
     distancia = parse_distancia_combate(situacion)
     usuario = equipo_aliado[tanque_usuario_index]
 
-    perfiles_aliados = [engine.construir_perfil(t, distancia) for t in equipo_aliado]
-    perfiles_enemigos = [engine.construir_perfil(t, distancia) for t in equipo_enemigo]
+    grupos_enemigos = agrupar_tanques(equipo_enemigo)
+    perfiles_aliados = _perfiles_por_grupo(agrupar_tanques(equipo_aliado), len(equipo_aliado), distancia)
+    perfiles_enemigos = _perfiles_por_grupo(grupos_enemigos, len(equipo_enemigo), distancia)
 
-    rng = random.Random(hash((distancia, len(equipo_aliado), len(equipo_enemigo))) & 0xFFFFFFFF)
+    rng = GeneradorBloques(_semilla(distancia, len(equipo_aliado), len(equipo_enemigo)))
     victorias_aliados = 0
     aliados_vivos_total = 0.0
     enemigos_vivos_total = 0.0
 
-    for _ in range(n_simulaciones):
-        hp_aliados = [1.0] * len(perfiles_aliados)
-        hp_enemigos = [1.0] * len(perfiles_enemigos)
-        timers_a = [rng.uniform(0, p.intervalo_disparo) for p in perfiles_aliados]
-        timers_e = [rng.uniform(0, p.intervalo_disparo) for p in perfiles_enemigos]
-        t = 0.0
-
-        while t < 240 and any(h > 0 for h in hp_aliados) and any(h > 0 for h in hp_enemigos):
-            for i, pa in enumerate(perfiles_aliados):
-                if hp_aliados[i] <= 0 or t < timers_a[i]:
-                    continue
-                objetivos = [j for j, h in enumerate(hp_enemigos) if h > 0]
-                if not objetivos:
-                    break
-                j = rng.choice(objetivos)
-                hp_enemigos[j] -= _simular_disparo(pa, perfiles_enemigos[j], rng)
-                timers_a[i] = t + pa.intervalo_disparo
-
-            for j, pe in enumerate(perfiles_enemigos):
-                if hp_enemigos[j] <= 0 or t < timers_e[j]:
-                    continue
-                objetivos = [i for i, h in enumerate(hp_aliados) if h > 0]
-                if not objetivos:
-                    break
-                i = rng.choice(objetivos)
-                hp_aliados[i] -= _simular_disparo(pe, perfiles_aliados[i], rng)
-                timers_e[j] = t + pe.intervalo_disparo
+    estadisticas_duracion = _estadisticas_ttk(240.0)
+    estadisticas_disparos = _estadisticas_disparos(HISTOGRAMA_DISPAROS_MAX * (len(perfiles_aliados) + len(perfiles_enemigos)))
 
-            t += 0.1
-
-        if not any(h > 0 for h in hp_enemigos):
+    for _ in range(n_simulaciones):
+        aliados_vivos, enemigos_vivos, duracion, disparos = _simular_batalla_equipos(
+            perfiles_aliados, perfiles_enemigos, rng
+        )
+        estadisticas_duracion.agregar(duracion)
+        estadisticas_disparos.agregar(disparos)
+        if enemigos_vivos == 0:
             victorias_aliados += 1
-        aliados_vivos_total += sum(1 for h in hp_aliados if h > 0)
-        enemigos_vivos_total += sum(1 for h in hp_enemigos if h > 0)
+        aliados_vivos_total += aliados_vivos
+        enemigos_vivos_total += enemigos_vivos
 
     prob_victoria = (victorias_aliados / n_simulaciones) * 100.0
-    duelos_usuario: List[Dict[str, Any]] = []
+    # Un duelo por tipo de enemigo; las copias comparten el resultado.
+    perfil_u = obtener_perfil(usuario, distancia)
+    duelos_usuario: List[Optional[Dict[str, Any]]] = [None] * len(equipo_enemigo)
 
-    for enemigo in equipo_enemigo:
+    for grupo in grupos_enemigos:
+        enemigo = grupo.tanque
         stats = _simular_pareja(usuario, enemigo, distancia)
-        perfil_u = engine.construir_perfil(usuario, distancia)
-        perfil_e = engine.construir_perfil(enemigo, distancia)
-        duelos_usuario.append({
+        perfil_e = perfiles_enemigos[grupo.indices[0]]
+        duelo = {
             "enemigo": enemigo.get("nombre"),
             "nacion": enemigo.get("nacion"),
             "prob_usuario_gana": stats["prob_victoria_a"],
@@ -878,8 +1997,12 @@ def simular_equipos_monte_carlo(
             "puede_enemigo_penetrar": stats["puede_b_pen_a"],
             "municion_usuario": perfil_u.municion_optima.nombre,
             "municion_enemigo": perfil_e.municion_optima.nombre,
-        })
+            "cantidad": grupo.cantidad,
+        }
+        for i in grupo.indices:
+            duelos_usuario[i] = duelo
 
+    # La clasificación ve cada copia, como si los duelos se hubieran simulado uno a uno
     clasificaciones = _clasificar_enemigos_usuario(usuario, equipo_aliado, duelos_usuario, tanque_usuario_index, distancia)
 
     resumen = (
@@ -922,6 +2045,9 @@ def simular_equipos_monte_carlo(
         resumen_batalla=resumen,
         detalles_aliados=detalles_aliados,
         detalles_enemigos=detalles_enemigos,
+        estadisticas_duracion=estadisticas_duracion,
+        estadisticas_disparos=estadisticas_disparos,
+        version_modelo=perfiles_aliados[0].version_modelo,
     )
 
 
@@ -1006,14 +2132,12 @@ def _evaluar_companeros(
     usuario_idx: int,
     distancia: int,
 ) -> List[ElementoClasificado]:
-    engine = get_engine()
-    perfil_u = engine.construir_perfil(usuario, distancia)
-    resultados: List[ElementoClasificado] = []
-
-    for i, aliado in enumerate(aliados):
-        if i == usuario_idx:
-            continue
-        perfil_a = engine.construir_perfil(aliado, distancia)
+    perfil_u = obtener_perfil(usuario, distancia)
+    companeros = [aliado for i, aliado in enumerate(aliados) if i != usuario_idx]
+    resultados: List[Optional[ElementoClasificado]] = [None] * len(companeros)
+    for grupo in agrupar_tanques(companeros):
+        aliado = grupo.tanque
+        perfil_a = obtener_perfil(aliado, distancia)
         pen_gap = perfil_a.municion_optima.penetracion_mm - perfil_u.municion_optima.penetracion_mm
         armor_gap = perfil_a.blindaje_efectivo - perfil_u.blindaje_efectivo
         speed_gap = perfil_a.velocidad - perfil_u.velocidad
@@ -1035,17 +2159,110 @@ def _evaluar_companeros(
         if not razones:
             razones.append("apoyo equilibrado en fuego y supervivencia")
 
-        resultados.append(ElementoClasificado(
+        elemento = ElementoClasificado(
             nombre=aliado.get("nombre", "Aliado"),
             nacion=aliado.get("nacion", "N/A"),
             score=score,
             razon="Cooperación recomendada por: " + ", ".join(razones) + ".",
-        ))
+        )
+        for i in grupo.indices:
+            resultados[i] = elemento
 
     resultados.sort(key=lambda x: x.score, reverse=True)
     return resultados
 
 
+def _intervalo_wilson(exitos: int, n: int, z: float = 1.96) -> Tuple[float, float]:
+    if n <= 0:
+        return 0.0, 1.0
+    p = exitos / n
+    denominador = 1 + z * z / n
+    centro = (p + z * z / (2 * n)) / denominador
+    margen = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominador
+    return max(0.0, centro - margen), min(1.0, centro + margen)
+
+
+def optimizar_lineup(
+    candidatos: List[Dict[str, Any]],
+    equipo_aliado: List[Dict[str, Any]],
+    equipo_enemigo: List[Dict[str, Any]],
+    situacion: str,
+    n_simulaciones: int = MC_EQUIPO_ITERACIONES,
+    n_inicial: int = MC_LINEUP_ITERACIONES_INICIALES,
+) -> Tuple[int, List[CandidatoLineup]]:
+    """
+    Elige el vehículo del lineup con mayor probabilidad de victoria frente a un equipo enemigo.
+    Cada candidato ocupa el puesto del usuario junto a `equipo_aliado`. Se usa successive
+    halving: en cada ronda todos los candidatos activos juegan las mismas batallas (números
+    aleatorios comunes, un subflujo del generador por iteración), se descarta la peor mitad
+    y se duplica el presupuesto; el superviviente completa `n_simulaciones`.
+    Devuelve (distancia, candidatos ordenados de mejor a peor).
+    """
+    distancia = parse_distancia_combate(situacion)
+    perfiles_enemigos = _perfiles_por_grupo(agrupar_tanques(equipo_enemigo), len(equipo_enemigo), distancia)
+    perfiles_companeros = _perfiles_por_grupo(agrupar_tanques(equipo_aliado), len(equipo_aliado), distancia)
+    perfiles_candidatos = _perfiles_por_grupo(agrupar_tanques(candidatos), len(candidatos), distancia)
+    resultados = [
+        CandidatoLineup(indice=i, nombre=t.get("nombre", "Desconocido"), nacion=t.get("nacion", "N/A"))
+        for i, t in enumerate(candidatos)
+    ]
+
+    semilla = _semilla(distancia, len(equipo_aliado), len(equipo_enemigo), "lineup")
+    rng = GeneradorBloques(semilla)
+    activos = list(range(len(candidatos)))
+    iteracion = 0
+    n_ronda = max(1, min(n_inicial, n_simulaciones))
+    ronda = 0
+    while activos:
+        ronda += 1
+        for i in activos:
+            perfiles_aliados = [perfiles_candidatos[i]] + perfiles_companeros
+            for k in range(iteracion, iteracion + n_ronda):
+                rng.iteracion(k)
+                enemigos_vivos = _simular_batalla_equipos(perfiles_aliados, perfiles_enemigos, rng)[1]
+                if enemigos_vivos == 0:
+                    resultados[i].victorias += 1
+            resultados[i].simulaciones += n_ronda
+            resultados[i].rondas = ronda
+        iteracion += n_ronda
+
+        restantes = n_simulaciones - iteracion
+        if restantes <= 0:
+            break
+        activos.sort(key=lambda i: resultados[i].prob_victoria, reverse=True)
+        activos = activos[: max(1, len(activos) // 2)]
+        n_ronda = restantes if len(activos) == 1 else min(n_ronda * 2, restantes)
+
+    ordenados = sorted(resultados, key=lambda c: (c.rondas, c.prob_victoria), reverse=True)
+    return distancia, ordenados
+
+
+def resultado_lineup_a_dict(distancia: int, candidatos: List[CandidatoLineup]) -> Dict[str, Any]:
+    lista = []
+    for posicion, c in enumerate(candidatos, start=1):
+        ic_inf, ic_sup = _intervalo_wilson(c.victorias, c.simulaciones)
+        lista.append({
+            "posicion": posicion,
+            "indice": c.indice,
+            "nombre": c.nombre,
+            "nacion": c.nacion,
+            "probabilidad_victoria": round(c.prob_victoria * 100, 1),
+            "intervalo_confianza_95": [round(ic_inf * 100, 1), round(ic_sup * 100, 1)],
+            "simulaciones": c.simulaciones,
+            "rondas_superadas": c.rondas,
+        })
+    return {
+        "distancia_m": distancia,
+        "mejor_candidato": lista[0]["nombre"] if lista else None,
+        "candidatos": lista,
+        "version_modelo": get_engine().version_modelo,
+    }
+
+
+def _estadisticas_a_dict(estadisticas: Optional[EstadisticasStreaming], decimales: int = 2) -> Optional[Dict[str, Any]]:
+    return estadisticas.a_dict(decimales) if estadisticas is not None else None
+
+
 def resultado_duelo_a_dict(resultado: ResultadoDuelo) -> Dict[str, Any]:
     return {
         "ganador": resultado.ganador,
@@ -1055,10 +2272,17 @@ def resultado_duelo_a_dict(resultado: ResultadoDuelo) -> Dict[str, Any]:
         "prob_victoria_v2_pct": round(resultado.prob_victoria_v2 * 100, 2),
         "distancia_m": resultado.distancia_m,
         "simulaciones_monte_carlo": resultado.simulaciones,
+        "metodo_simulacion": resultado.metodo,
+        "motivo_metodo": resultado.motivo_metodo,
+        "version_modelo": resultado.version_modelo,
         "tiempo_medio_victoria_s": round(resultado.tiempo_medio_victoria_s, 1),
         "vehiculo_1": resultado.detalles_v1,
         "vehiculo_2": resultado.detalles_v2,
         "resumen_tecnico": resultado.resumen_tecnico,
+        "distribucion_ttk": _estadisticas_a_dict(resultado.estadisticas_ttk),
+        "distribucion_disparos_v1": _estadisticas_a_dict(resultado.estadisticas_disparos_v1, 1),
+        "distribucion_disparos_v2": _estadisticas_a_dict(resultado.estadisticas_disparos_v2, 1),
+        **({"trace": resultado.traza} if resultado.traza is not None else {}),
     }
 
 
@@ -1081,4 +2305,7 @@ def resultado_equipos_a_dict(resultado: ResultadoEquipos) -> Dict[str, Any]:
         "resumen_batalla": resultado.resumen_batalla,
         "detalles_aliados": resultado.detalles_aliados or [],
         "detalles_enemigos": resultado.detalles_enemigos or [],
+        "distribucion_duracion": _estadisticas_a_dict(resultado.estadisticas_duracion),
+        "distribucion_disparos": _estadisticas_a_dict(resultado.estadisticas_disparos, 1),
+        "version_modelo": resultado.version_modelo,
     }
@@ -0,0 +1,337 @@
+"""
+Modelo sustituto (surrogate) para estimaciones instantáneas de duelos 1v1.
+
+Una red pequeña entrenada offline sobre la salida del simulador predice la
+probabilidad de victoria a partir de las características de ambos tanques
+(CombatSimulatorEngine._vector_caracteristicas) y la distancia. La salida es
+antisimétrica por construcción: logit(A, B) = h(A, B) - h(B, A), de modo que
+P(A gana) + P(B gana) = 1.
+
+El modelo solo se consulta con COMBAT_SURROGATE_ACTIVADO=1 y si supera la
+puerta de precisión: su informe de calibración debe venir de tanques del
+catálogo (fuente "mongo", no sintéticos) con un error absoluto medio frente al
+simulador no mayor que COMBAT_SURROGATE_ERROR_MAX (0.05 por defecto). Unos
+pesos entrenados con tanques sintéticos daban ~0.11, demasiado para sustituir
+a la simulación, así que el repositorio no incluye pesos: hay que entrenarlos.
+Desactivado, sin pesos válidos o si el par cae fuera de la distribución de
+entrenamiento, la estimación la da Monte Carlo.
+
+Las estimaciones se cachean con la versión del modelo del motor y el hash de
+los pesos, de modo que reentrenar el sustituto invalida las entradas antiguas.
+
+Entrenamiento con los tanques de MongoDB e informe de calibración:
+    python combat_surrogate.py --pares 3000 --fuente mongo
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from combat_simulator import (
+    BASE_DIR,
+    DISTANCIAS_REF,
+    CombatSimulatorEngine,
+    _CacheLRU,
+    get_engine,
+    huella_tanque,
+    parse_distancia_combate,
+    simular_duelo_monte_carlo,
+)
+
+SURROGATE_ACTIVADO = os.getenv("COMBAT_SURROGATE_ACTIVADO", "0") == "1"
+SURROGATE_PATH = Path(os.getenv("COMBAT_SURROGATE_PATH", str(BASE_DIR / "combat_surrogate.npz")))
+CALIBRACION_PATH = SURROGATE_PATH.with_name(SURROGATE_PATH.stem + "_calibracion.json")
+SURROGATE_ERROR_MAX = float(os.getenv("COMBAT_SURROGATE_ERROR_MAX", "0.05"))
+CACHE_ESTIMACIONES_MAX = int(os.getenv("COMBAT_SURROGATE_CACHE_MAX", "2048"))
+MARGEN_DISTRIBUCION = 0.1
+CAPA_OCULTA = 32
+
+
+class SurrogateDuelo:
+    """Red de una capa oculta (tanh) evaluada con NumPy."""
+
+    def __init__(self, pesos: Dict[str, np.ndarray], hash_pesos: str = "") -> None:
+        self.hash_pesos = hash_pesos
+        self.w1 = pesos["w1"]
+        self.b1 = pesos["b1"]
+        self.w2 = pesos["w2"]
+        self.media = pesos["media"]
+        self.desviacion = pesos["desviacion"]
+        self.minimo = pesos["minimo"]
+        self.maximo = pesos["maximo"]
+
+    @staticmethod
+    def entrada(f1: np.ndarray, f2: np.ndarray, distancia: np.ndarray) -> np.ndarray:
+        return np.concatenate([f1, f2, f1 - f2, distancia[:, None] / 2000.0], axis=1)
+
+    def _h(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        oculta = np.tanh(((x - self.media) / self.desviacion) @ self.w1 + self.b1)
+        return oculta @ self.w2, oculta
+
+    def predecir(self, f1: np.ndarray, f2: np.ndarray, distancia: np.ndarray) -> np.ndarray:
+        h12, _ = self._h(self.entrada(f1, f2, distancia))
+        h21, _ = self._h(self.entrada(f2, f1, distancia))
+        return 1.0 / (1.0 + np.exp(-(h12 - h21)))
+
+    def en_distribucion(self, f: np.ndarray) -> bool:
+        """Comprueba que las características de un tanque caen dentro del rango visto al entrenar."""
+        rango = np.maximum(self.maximo - self.minimo, 1e-6)
+        return bool(np.all(f >= self.minimo - MARGEN_DISTRIBUCION * rango)
+                    and np.all(f <= self.maximo + MARGEN_DISTRIBUCION * rango))
+
+
+_surrogate: Optional[SurrogateDuelo] = None
+_surrogate_cargado = False
+_lock = threading.Lock()
+_cache_estimaciones = _CacheLRU(CACHE_ESTIMACIONES_MAX)
+
+
+def calibracion_aceptable(informe: Dict[str, Any]) -> bool:
+    """Puerta de precisión: entrenado sobre el catálogo real y con error absoluto medio acotado."""
+    error = informe.get("error_absoluto_medio")
+    return informe.get("fuente") == "mongo" and error is not None and float(error) <= SURROGATE_ERROR_MAX
+
+
+def get_surrogate() -> Optional[SurrogateDuelo]:
+    """Carga perezosa de los pesos; None si no hay modelo entrenado o no pasa la puerta de precisión."""
+    global _surrogate, _surrogate_cargado
+    with _lock:
+        if not _surrogate_cargado:
+            _surrogate_cargado = True
+            if SURROGATE_PATH.exists():
+                try:
+                    with open(CALIBRACION_PATH, encoding="utf-8") as f:
+                        informe = json.load(f)
+                    if not calibracion_aceptable(informe):
+                        print(
+                            f"Advertencia: modelo sustituto {SURROGATE_PATH} descartado (fuente "
+                            f"{informe.get('fuente')}, error absoluto medio {informe.get('error_absoluto_medio')}, "
+                            f"máximo {SURROGATE_ERROR_MAX})"
+                        )
+                        return None
+                    contenido = SURROGATE_PATH.read_bytes()
+                    with np.load(SURROGATE_PATH) as datos:
+                        _surrogate = SurrogateDuelo(
+                            {k: datos[k] for k in datos.files},
+                            hash_pesos=hashlib.sha256(contenido).hexdigest()[:12],
+                        )
+                except Exception as exc:
+                    print(f"Advertencia: no se pudo cargar el modelo sustituto {SURROGATE_PATH}: {exc}")
+        return _surrogate
+
+
+def version_estimacion() -> str:
+    """Versión de las estimaciones rápidas: la del motor más el hash de los pesos del sustituto activo."""
+    version = get_engine().version_modelo
+    modelo = get_surrogate() if SURROGATE_ACTIVADO else None
+    return f"{version}+surrogate-{modelo.hash_pesos}" if modelo is not None else version
+
+
+def predecir_duelo(tanque1: Dict[str, Any], tanque2: Dict[str, Any], distancia: int) -> Optional[float]:
+    """
+    Probabilidad de victoria del tanque 1, o None si el modelo está desactivado, no hay
+    pesos o el par está fuera de distribución.
+    """
+    if not SURROGATE_ACTIVADO:
+        return None
+    modelo = get_surrogate()
+    if modelo is None:
+        return None
+    engine = get_engine()
+    f1 = np.array(engine._vector_caracteristicas(tanque1, distancia), dtype=np.float64)
+    f2 = np.array(engine._vector_caracteristicas(tanque2, distancia), dtype=np.float64)
+    if not (modelo.en_distribucion(f1) and modelo.en_distribucion(f2)):
+        return None
+    return float(modelo.predecir(f1[None, :], f2[None, :], np.array([float(distancia)]))[0])
+
+
+def estimacion_rapida_duelo(tanque1: Dict[str, Any], tanque2: Dict[str, Any], situacion: str) -> Dict[str, Any]:
+    """Estimación instantánea con el modelo sustituto; Monte Carlo si no es aplicable."""
+    distancia = parse_distancia_combate(situacion)
+    version = version_estimacion()
+    clave = (huella_tanque(tanque1), huella_tanque(tanque2), distancia, version)
+    estimacion = _cache_estimaciones.get(clave)
+    if estimacion is not None:
+        return dict(estimacion)
+
+    prob1 = predecir_duelo(tanque1, tanque2, distancia)
+    fuente = "surrogado"
+    if prob1 is None:
+        fuente = "monte_carlo"
+        prob1 = simular_duelo_monte_carlo(tanque1, tanque2, situacion).prob_victoria_v1
+    nombre1 = tanque1.get("nombre", "Vehículo 1")
+    nombre2 = tanque2.get("nombre", "Vehículo 2")
+    estimacion = {
+        "ganador": nombre1 if prob1 >= 0.5 else nombre2,
+        "prob_victoria_v1_pct": round(prob1 * 100, 2),
+        "prob_victoria_v2_pct": round((1 - prob1) * 100, 2),
+        "distancia_m": distancia,
+        "fuente": fuente,
+        "version_modelo": version,
+    }
+    _cache_estimaciones.put(clave, estimacion)
+    return dict(estimacion)
+
+
+# ====================================================================
+# ENTRENAMIENTO OFFLINE
+# ====================================================================
+
+def _tanques_entrenamiento(fuente: str) -> List[Dict[str, Any]]:
+    if fuente == "mongo":
+        from database import get_tanks_collection
+        from database import convertir_decimal128_recursivo
+
+        return [convertir_decimal128_recursivo(t) for t in get_tanks_collection().find({}, {"_id": 0})]
+    return [dict(CombatSimulatorEngine._tanque_sintetico(), nombre=f"Synth {i}") for i in range(600)]
+
+
+def generar_dataset(
+    tanques: List[Dict[str, Any]],
+    n_pares: int,
+    iteraciones: int,
+    metodo: str,
+    semilla: int = 7,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Pares aleatorios etiquetados con la probabilidad de victoria que da el simulador."""
+    rng = random.Random(semilla)
+    engine = get_engine()
+    f1s, f2s, distancias, objetivos = [], [], [], []
+    for i in range(n_pares):
+        t1, t2 = rng.sample(tanques, 2)
+        t1 = dict(t1, nombre=f"{t1.get('nombre')} #A")
+        t2 = dict(t2, nombre=f"{t2.get('nombre')} #B")
+        distancia = rng.choice(DISTANCIAS_REF) if rng.random() < 0.5 else rng.randint(0, 2000)
+        resultado = simular_duelo_monte_carlo(t1, t2, f"{distancia}m", iteraciones, metodo=metodo)
+        f1s.append(engine._vector_caracteristicas(t1, distancia))
+        f2s.append(engine._vector_caracteristicas(t2, distancia))
+        distancias.append(float(resultado.distancia_m))
+        objetivos.append(resultado.prob_victoria_v1)
+        if (i + 1) % 250 == 0:
+            print(f"  {i + 1}/{n_pares} pares simulados")
+    return np.array(f1s), np.array(f2s), np.array(distancias), np.array(objetivos)
+
+
+def entrenar(
+    f1: np.ndarray,
+    f2: np.ndarray,
+    distancia: np.ndarray,
+    objetivo: np.ndarray,
+    epocas: int = 8000,
+    lr: float = 0.01,
+    semilla: int = 7,
+) -> SurrogateDuelo:
+    """Ajusta la red con entropía cruzada sobre probabilidades suaves (Adam, lote completo)."""
+    rng = np.random.default_rng(semilla)
+    x12 = SurrogateDuelo.entrada(f1, f2, distancia)
+    x21 = SurrogateDuelo.entrada(f2, f1, distancia)
+    todas = np.concatenate([x12, x21])
+    caracteristicas = np.concatenate([f1, f2])
+    pesos = {
+        "w1": rng.normal(0, 1 / np.sqrt(x12.shape[1]), (x12.shape[1], CAPA_OCULTA)),
+        "b1": np.zeros(CAPA_OCULTA),
+        "w2": rng.normal(0, 1 / np.sqrt(CAPA_OCULTA), CAPA_OCULTA),
+        "media": todas.mean(axis=0),
+        "desviacion": todas.std(axis=0) + 1e-6,
+        "minimo": caracteristicas.min(axis=0),
+        "maximo": caracteristicas.max(axis=0),
+    }
+    modelo = SurrogateDuelo(pesos)
+    entrenables = ("w1", "b1", "w2")
+    m = {k: np.zeros_like(pesos[k]) for k in entrenables}
+    v = {k: np.zeros_like(pesos[k]) for k in entrenables}
+
+    for paso in range(1, epocas + 1):
+        h12, a12 = modelo._h(x12)
+        h21, a21 = modelo._h(x21)
+        p = 1.0 / (1.0 + np.exp(-(h12 - h21)))
+        g = (p - objetivo) / len(objetivo)
+        grads = {"w2": a12.T @ g - a21.T @ g}
+        dz12 = np.outer(g, modelo.w2) * (1 - a12 ** 2)
+        dz21 = -np.outer(g, modelo.w2) * (1 - a21 ** 2)
+        grads["w1"] = ((x12 - modelo.media) / modelo.desviacion).T @ dz12 \
+            + ((x21 - modelo.media) / modelo.desviacion).T @ dz21
+        grads["b1"] = dz12.sum(axis=0) + dz21.sum(axis=0)
+        for k in entrenables:
+            m[k] = 0.9 * m[k] + 0.1 * grads[k]
+            v[k] = 0.999 * v[k] + 0.001 * grads[k] ** 2
+            m_hat = m[k] / (1 - 0.9 ** paso)
+            v_hat = v[k] / (1 - 0.999 ** paso)
+            pesos[k] -= lr * m_hat / (np.sqrt(v_hat) + 1e-8)
+        modelo.w1, modelo.b1, modelo.w2 = pesos["w1"], pesos["b1"], pesos["w2"]
+    return modelo
+
+
+def informe_calibracion(prediccion: np.ndarray, objetivo: np.ndarray, bins: int = 10) -> Dict[str, Any]:
+    """Brier, error absoluto medio y tabla de fiabilidad (media predicha vs simulada por bin)."""
+    tabla = []
+    indices = np.minimum((prediccion * bins).astype(int), bins - 1)
+    for b in range(bins):
+        mascara = indices == b
+        if not mascara.any():
+            continue
+        tabla.append({
+            "bin": [b / bins, (b + 1) / bins],
+            "n": int(mascara.sum()),
+            "prob_predicha_media": round(float(prediccion[mascara].mean()), 4),
+            "prob_simulada_media": round(float(objetivo[mascara].mean()), 4),
+        })
+    return {
+        "n": int(len(objetivo)),
+        "brier": round(float(((prediccion - objetivo) ** 2).mean()), 5),
+        "error_absoluto_medio": round(float(np.abs(prediccion - objetivo).mean()), 4),
+        "acierto_ganador": round(float(((prediccion >= 0.5) == (objetivo >= 0.5)).mean()), 4),
+        "fiabilidad": tabla,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Entrena el modelo sustituto de duelos.")
+    parser.add_argument("--pares", type=int, default=3000)
+    parser.add_argument("--iteraciones", type=int, default=400, help="Iteraciones Monte Carlo por par")
+    parser.add_argument("--metodo", choices=["monte_carlo", "analitico"], default="monte_carlo")
+    parser.add_argument("--fuente", choices=["mongo", "sintetico"], default="mongo")
+    parser.add_argument("--epocas", type=int, default=8000)
+    args = parser.parse_args()
+
+    inicio = time.time()
+    tanques = _tanques_entrenamiento(args.fuente)
+    print(f"Generando {args.pares} pares con {len(tanques)} tanques ({args.fuente}, {args.metodo})...")
+    f1, f2, distancia, objetivo = generar_dataset(tanques, args.pares, args.iteraciones, args.metodo)
+
+    corte = int(len(objetivo) * 0.8)
+    modelo = entrenar(f1[:corte], f2[:corte], distancia[:corte], objetivo[:corte], epocas=args.epocas)
+    prediccion = modelo.predecir(f1[corte:], f2[corte:], distancia[corte:])
+    informe = informe_calibracion(prediccion, objetivo[corte:])
+    informe.update({
+        "fuente": args.fuente,
+        "metodo_objetivo": args.metodo,
+        "iteraciones_por_par": args.iteraciones if args.metodo == "monte_carlo" else 0,
+        "pares_entrenamiento": corte,
+        "segundos": round(time.time() - inicio, 1),
+    })
+
+    np.savez(
+        SURROGATE_PATH,
+        w1=modelo.w1, b1=modelo.b1, w2=modelo.w2,
+        media=modelo.media, desviacion=modelo.desviacion,
+        minimo=modelo.minimo, maximo=modelo.maximo,
+    )
+    with open(CALIBRACION_PATH, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(json.dumps({k: v for k, v in informe.items() if k != "fiabilidad"}, indent=2, ensure_ascii=False))
+    print(f"Modelo guardado en {SURROGATE_PATH}; calibración en {CALIBRACION_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 # mongo_client.py
 from pymongo import MongoClient
 from pymongo.database import Database
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from typing import Any, Dict, List
 import os
 from dotenv import load_dotenv
 # ==========================
@@ -48,6 +51,51 @@ def get_users_collection():
     """
     return database["users"]
 
+
+def get_jobs_collection():
+    """
+    Devuelve la colección 'jobs' (cola de trabajos de simulación).
+    """
+    return database["jobs"]
+
+
+def convertir_decimal128_recursivo(dato):
+    """
+    Convierte todos los Decimal128 a float de forma recursiva.
+    Funciona con diccionarios, listas y valores individuales.
+    """
+    if isinstance(dato, Decimal128):
+        # Convertir Decimal128 a float
+        return float(dato.to_decimal())
+    elif isinstance(dato, dict):
+        # Si es un diccionario, convertir cada valor
+        return {clave: convertir_decimal128_recursivo(valor) for clave, valor in dato.items()}
+    elif isinstance(dato, list):
+        # Si es una lista, convertir cada elemento
+        return [convertir_decimal128_recursivo(elemento) for elemento in dato]
+    else:
+        # Si es otro tipo, dejarlo como está
+        return dato
+
+def cargar_tanques(ids: List[str]) -> List[Dict[str, Any]]:
+    """Carga tanques por id respetando orden y repeticiones."""
+    unicos = set(ids)
+    if not all(ObjectId.is_valid(i) for i in unicos):
+        raise ValueError("ID de MongoDB inválido")
+    docs = {
+        str(t["_id"]): convertir_decimal128_recursivo(t)
+        for t in get_tanks_collection().find({"_id": {"$in": [ObjectId(i) for i in unicos]}})
+    }
+    faltan = unicos - docs.keys()
+    if faltan:
+        raise ValueError(f"Vehículos no encontrados: {', '.join(sorted(faltan))}")
+    tanques = []
+    for i in ids:
+        tanque = dict(docs[i])
+        tanque["_id"] = str(tanque["_id"])
+        tanques.append(tanque)
+    return tanques
+
 # ==========================
 # Función de verificación opcional
 # ==========================
@@ -23,6 +23,7 @@ from dotenv import load_dotenv
 from typing import List, Dict, Optional
 import aiohttp
 import asyncio
+from urllib.parse import quote
 
 # ====================================================================
 # PASO 1: Cargar variables de entorno
@@ -86,6 +87,24 @@ class WarThunderAPI:
 
         return None
 
+    async def _post(self, endpoint: str, payload: dict, retries: int = 2):
+        if not self.session:
+            raise RuntimeError("API session not started")
+
+        url = f"{self.base_url}{endpoint}"
+
+        for attempt in range(retries):
+            try:
+                async with asyncio.timeout(12):
+                    async with self.session.post(url, json=payload) as resp:
+                        if resp.status == 200:
+                            return await resp.json()
+            except (asyncio.TimeoutError, aiohttp.ClientError):
+                if attempt < retries - 1:
+                    await asyncio.sleep(3)
+
+        return None
+
     async def obtener_todos_tanques(self):
         return await self._get("/tanques/") or []
 
@@ -96,18 +115,15 @@ class WarThunderAPI:
         return await self._get(f"/tanques/nacion/{nacion}") or []
 
     async def buscar_tanque_por_nombre(self, nombre: str):
-        tanques = await self.obtener_todos_tanques()
-        nombre = nombre.lower()
+        # La búsqueda (exacta y luego parcial) la hace la API sobre su catálogo en memoria
+        return await self._get(f"/tanques/buscar?nombre={quote(nombre)}")
 
-        for t in tanques:
-            if t["nombre"].lower() == nombre:
-                return t
-
-        for t in tanques:
-            if nombre in t["nombre"].lower():
-                return t
-
-        return None
+    async def estimar_duelo(self, id1: str, id2: str, situacion: str = "500m"):
+        return await self._post("/duelos/estimacion-rapida", {
+            "vehiculo1_id": id1,
+            "vehiculo2_id": id2,
+            "situacion": situacion,
+        })
     
     async def obtener_stats(self, br_min=None, br_max=None, modo="realista"):
         params = {"modo": modo}
@@ -621,6 +637,20 @@ async def comparar(ctx, tanque1: str, tanque2: str):
             ),
             inline=False  # Ocupa toda la línea
         )
+
+    # PASO 11: Estimación instantánea del duelo (modelo sustituto del simulador)
+    id1 = t1.get("_id") or t1.get("id")
+    id2 = t2.get("_id") or t2.get("id")
+    estimacion = await api.estimar_duelo(id1, id2) if id1 and id2 else None
+    if estimacion:
+        embed.add_field(
+            name="🎲 Duelo estimado (500m)",
+            value=(
+                f"**{t1['nombre']}:** {estimacion['prob_victoria_v1_pct']}%\n"
+                f"**{t2['nombre']}:** {estimacion['prob_victoria_v2_pct']}%"
+            ),
+            inline=False
+        )
     
     await ctx.send(embed=embed)
 
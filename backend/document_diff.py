@@ -0,0 +1,143 @@
+"""
+Escrituras por diferencias para documentos de tanques.
+
+Las rutas de escritura hacían `$set` del documento entero (los dos setups y
+todas las municiones) aunque solo cambiase un campo. calcular_diff compara con
+el documento guardado y produce el `$set`/`$unset` mínimo por rutas con puntos,
+con la misma semántica que aquel `$set` completo:
+
+    - las claves de primer nivel que no vienen en el documento nuevo se conservan
+    - dentro de un subdocumento, las claves que desaparecen se borran ($unset)
+    - las listas de igual longitud se comparan elemento a elemento (ruta.i);
+      si cambia la longitud se reescribe la lista entera
+    - una clave con "." o "$" no se puede usar en una ruta: se reescribe el
+      subdocumento que la contiene
+
+Si no hay diferencias no se escribe nada. `campos` son las rutas tocadas, para
+invalidar cachés, y metricas_escrituras() acumula el ahorro en bytes frente al
+`$set` completo.
+"""
+
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Set
+
+import bson
+
+_AUSENTE = object()
+
+
+@dataclass
+class DiffDocumento:
+    fijar: Dict[str, Any] = field(default_factory=dict)
+    borrar: Dict[str, str] = field(default_factory=dict)
+    completo: Dict[str, Any] = field(default_factory=dict, repr=False)
+    bytes_completo: int = 0
+
+    @property
+    def vacio(self) -> bool:
+        return not self.fijar and not self.borrar
+
+    @property
+    def campos(self) -> Set[str]:
+        return set(self.fijar) | set(self.borrar)
+
+    def operacion(self) -> Optional[Dict[str, Any]]:
+        """$set/$unset por rutas, o el $set completo si casi todo ha cambiado y ocupa menos."""
+        if self.vacio:
+            return None
+        operacion: Dict[str, Any] = {}
+        if self.fijar:
+            operacion["$set"] = self.fijar
+        if self.borrar:
+            operacion["$unset"] = self.borrar
+        if len(bson.encode(operacion)) >= self.bytes_completo:
+            return {"$set": self.completo}
+        return operacion
+
+    @property
+    def bytes_diff(self) -> int:
+        operacion = self.operacion()
+        return len(bson.encode(operacion)) if operacion else 0
+
+
+def _igual(a: Any, b: Any) -> bool:
+    # El tipo cuenta, también en profundidad: 5 -> 5.0 o float -> Decimal128 sí es un cambio en Mongo
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_igual(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(_igual(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def _clave_segura(clave: Any) -> bool:
+    return isinstance(clave, str) and "." not in clave and not clave.startswith("$")
+
+
+def _diff_valor(viejo: Any, nuevo: Any, ruta: str, diff: DiffDocumento) -> None:
+    if _igual(viejo, nuevo):
+        return
+
+    if isinstance(viejo, dict) and isinstance(nuevo, dict):
+        distintas = [
+            k for k in set(viejo) | set(nuevo)
+            if not _igual(viejo.get(k, _AUSENTE), nuevo.get(k, _AUSENTE))
+        ]
+        if not all(_clave_segura(k) for k in distintas):
+            diff.fijar[ruta] = nuevo
+            return
+        for k in distintas:
+            if k in nuevo:
+                _diff_valor(viejo.get(k, _AUSENTE), nuevo[k], f"{ruta}.{k}", diff)
+            else:
+                diff.borrar[f"{ruta}.{k}"] = ""
+        return
+
+    if isinstance(viejo, list) and isinstance(nuevo, list) and len(viejo) == len(nuevo):
+        for i, (a, b) in enumerate(zip(viejo, nuevo)):
+            _diff_valor(a, b, f"{ruta}.{i}", diff)
+        return
+
+    diff.fijar[ruta] = nuevo
+
+
+def calcular_diff(original: Dict[str, Any], nuevo: Dict[str, Any]) -> DiffDocumento:
+    """Operación mínima equivalente a `{"$set": nuevo}` sobre `original` (ignora _id)."""
+    nuevo = {k: v for k, v in nuevo.items() if k != "_id"}
+    diff = DiffDocumento(completo=nuevo, bytes_completo=len(bson.encode({"$set": nuevo})))
+    for clave, valor in nuevo.items():
+        _diff_valor(original.get(clave, _AUSENTE), valor, clave, diff)
+    return diff
+
+
+_lock_metricas = threading.Lock()
+_metricas = {"escrituras": 0, "sin_cambios": 0, "bytes_completos": 0, "bytes_escritos": 0}
+
+
+def registrar_escritura(diff: DiffDocumento) -> None:
+    with _lock_metricas:
+        _metricas["bytes_completos"] += diff.bytes_completo
+        if diff.vacio:
+            _metricas["sin_cambios"] += 1
+        else:
+            _metricas["escrituras"] += 1
+            _metricas["bytes_escritos"] += diff.bytes_diff
+
+
+def metricas_escrituras() -> Dict[str, Any]:
+    with _lock_metricas:
+        metricas = dict(_metricas)
+    completos = metricas["bytes_completos"]
+    metricas["ahorro_pct"] = round(100 * (1 - metricas["bytes_escritos"] / completos), 1) if completos else 0.0
+    return metricas
+
+
+def aplicar_diff(coleccion, filtro: Dict[str, Any], original: Dict[str, Any], nuevo: Dict[str, Any]) -> DiffDocumento:
+    """update_one con solo lo que ha cambiado; sin cambios no toca la base de datos."""
+    diff = calcular_diff(original, nuevo)
+    registrar_escritura(diff)
+    if not diff.vacio:
+        coleccion.update_one(filtro, diff.operacion())
+    return diff
@@ -0,0 +1,127 @@
+"""
+Servidor local que imita la API de Gemini para pruebas de carga sin red ni cuota.
+
+Responde a generateContent con JSON canónico válido para cada prompt del backend
+(enriquecimiento con su esquema, análisis de duelo, narrativa de equipos) y a
+models.list con un catálogo fijo, con latencia y tasa de errores configurables.
+
+Uso:
+    python fake_gemini_server.py --puerto 8090 --latencia-ms 800 --jitter-ms 400 --tasa-error 0.02
+
+y arrancar el backend apuntando a él:
+    GEMINI_API_KEY=falsa GEMINI_BASE_URL=http://localhost:8090 uvicorn main:app
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+from typing import Any, Dict
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+LATENCIA_MS = float(os.getenv("FAKE_GEMINI_LATENCIA_MS", "800"))
+JITTER_MS = float(os.getenv("FAKE_GEMINI_JITTER_MS", "400"))
+TASA_ERROR = float(os.getenv("FAKE_GEMINI_TASA_ERROR", "0"))
+
+MODELOS = ["gemini-3.5-flash-lite", "gemini-3.1-flash-lite-preview", "gemini-3.1-flash-lite", "gemini-2.5-pro"]
+
+app = FastAPI(title="Gemini falso")
+contadores = {"peticiones": 0, "errores": 0}
+
+
+def _texto_prompt(cuerpo: Dict[str, Any]) -> str:
+    return "\n".join(
+        parte.get("text", "")
+        for contenido in cuerpo.get("contents", [])
+        for parte in contenido.get("parts", [])
+    )
+
+
+def _respuesta_canonica(prompt: str, cuerpo: Dict[str, Any]) -> Dict[str, Any]:
+    config = cuerpo.get("generationConfig", {})
+    if config.get("responseSchema") or config.get("responseJsonSchema"):
+        # Enriquecimiento: una entrada válida por cada munición del prompt
+        ids = [int(i) for i in re.findall(r"- id (\d+):", prompt)]
+        return {
+            "slope_factor": round(random.uniform(1.0, 1.8), 2) if "SLOPE FACTOR:" in prompt else None,
+            "municiones": [
+                {
+                    "id": i,
+                    "masa_total": round(random.uniform(3, 25), 2),
+                    "velocidad_bala": random.randint(600, 1700),
+                    "masa_explosivo": round(random.uniform(0, 300), 1),
+                }
+                for i in ids
+            ],
+        }
+    if '"resultado_general"' in prompt:
+        return {"resultado_general": "## Desarrollo de la batalla\n\nNarrativa generada por el servidor falso de Gemini."}
+    return {
+        "analisis": "## Análisis\n\nAnálisis generado por el servidor falso de Gemini.",
+        "puntos_clave": ["Punto clave 1", "Punto clave 2", "Punto clave 3"],
+    }
+
+
+@app.post("/{version}/models/{modelo}:generateContent")
+async def generate_content(version: str, modelo: str, request: Request):
+    contadores["peticiones"] += 1
+    await asyncio.sleep(max(0.0, random.gauss(LATENCIA_MS, JITTER_MS)) / 1000)
+
+    if random.random() < TASA_ERROR:
+        contadores["errores"] += 1
+        codigo = random.choice([429, 500, 503])
+        return JSONResponse(
+            status_code=codigo,
+            content={"error": {"code": codigo, "message": "Error simulado", "status": "UNAVAILABLE"}},
+        )
+
+    cuerpo = await request.json()
+    texto = json.dumps(_respuesta_canonica(_texto_prompt(cuerpo), cuerpo), ensure_ascii=False)
+    return {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": texto}]},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": 0, "totalTokenCount": 0},
+        "modelVersion": modelo,
+    }
+
+
+@app.get("/{version}/models")
+async def listar_modelos(version: str):
+    return {"models": [
+        {
+            "name": f"models/{nombre}",
+            "displayName": nombre,
+            "description": "Modelo del servidor falso",
+            "supportedActions": ["generateContent"],
+        }
+        for nombre in MODELOS
+    ]}
+
+
+@app.get("/estadisticas")
+async def estadisticas():
+    return contadores
+
+
+def main() -> None:
+    global LATENCIA_MS, JITTER_MS, TASA_ERROR
+    parser = argparse.ArgumentParser(description="Servidor falso de Gemini para pruebas de carga.")
+    parser.add_argument("--puerto", type=int, default=8090)
+    parser.add_argument("--latencia-ms", type=float, default=LATENCIA_MS)
+    parser.add_argument("--jitter-ms", type=float, default=JITTER_MS)
+    parser.add_argument("--tasa-error", type=float, default=TASA_ERROR, help="fracción de respuestas 429/500/503")
+    args = parser.parse_args()
+    LATENCIA_MS, JITTER_MS, TASA_ERROR = args.latencia_ms, args.jitter_ms, args.tasa_error
+    uvicorn.run(app, host="0.0.0.0", port=args.puerto)
+
+
+if __name__ == "__main__":
+    main()
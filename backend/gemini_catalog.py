@@ -0,0 +1,122 @@
+"""
+Catálogo de modelos de Gemini para el selector del frontend (GET /ia/modelos/).
+
+El listado del SDK es una llamada de red paginada, así que se sirve desde memoria
+con stale-while-revalidate: pasado GEMINI_CATALOGO_TTL_S se devuelve la lista
+vieja y se refresca en segundo plano. La última lista buena se guarda en MongoDB
+para que un arranque en frío responda al momento sin esperar a la API. Si una
+descarga falla, el fallo se recuerda GEMINI_CATALOGO_TTL_FALLO_S (caché negativa):
+mientras tanto se sirve la lista anterior, o una vacía, sin esperar ni reintentar.
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import gemini_client
+from database import get_db
+
+GEMINI_CATALOGO_TTL_S = float(os.getenv("GEMINI_CATALOGO_TTL_S", "3600"))
+GEMINI_CATALOGO_TTL_FALLO_S = float(os.getenv("GEMINI_CATALOGO_TTL_FALLO_S", "60"))
+CATALOGOS_COLECCION = "catalogos"
+CATALOGO_ID = "modelos_gemini"
+
+# LISTA NEGRA: Palabras clave de modelos que NO son para chat/texto general
+PALABRAS_BLOQUEADAS = [
+    'embedding', 'aqa', 'search', 'image', 'vision-only',
+    'banana', 'nano-experimental', 'internal'
+]
+
+_catalogo: Optional[Dict[str, Any]] = None  # {"modelos": [...], "actualizado": epoch, "fallido": bool}
+_refresco: Optional[asyncio.Task] = None
+
+
+def _descargar_modelos() -> List[Dict[str, Any]]:
+    modelos = []
+    for m in gemini_client.client_ai.models.list():
+        # El nombre suele venir como 'models/gemini-1.5-flash'
+        nombre_id = m.name.lower().replace('models/', '')
+
+        # FILTRO: Debe permitir generar contenido
+        # En la nueva SDK (google-genai), el atributo es 'supported_actions'
+        acciones = getattr(m, 'supported_actions', [])
+        if acciones and 'generateContent' not in acciones:
+            continue
+
+        es_modelo_especializado = any(p in nombre_id for p in PALABRAS_BLOQUEADAS)
+
+        # Solo incluimos modelos de la familia Gemini que no sean especializados
+        if nombre_id.startswith('gemini-') and not es_modelo_especializado:
+            modelos.append({
+                "id": nombre_id,
+                "nombre": m.display_name,
+                "descripcion": m.description
+            })
+
+    # Ordenamos la lista para que los más nuevos salgan primero
+    modelos.sort(key=lambda x: x['id'], reverse=True)
+    return modelos
+
+
+def _leer_persistido() -> Optional[Dict[str, Any]]:
+    try:
+        documento = get_db()[CATALOGOS_COLECCION].find_one({"_id": CATALOGO_ID})
+    except Exception as e:
+        print(f"Advertencia: no se pudo leer el catálogo de modelos guardado: {e}")
+        return None
+    if not documento:
+        return None
+    # Se sirve al momento, pero cuenta como caducado para refrescarlo en segundo plano
+    return {"modelos": documento["modelos"], "actualizado": 0.0, "fallido": False}
+
+
+def _persistir(modelos: List[Dict[str, Any]]) -> None:
+    try:
+        get_db()[CATALOGOS_COLECCION].replace_one(
+            {"_id": CATALOGO_ID},
+            {"modelos": modelos, "fecha": datetime.now(timezone.utc)},
+            upsert=True,
+        )
+    except Exception as e:
+        print(f"Advertencia: no se pudo guardar el catálogo de modelos: {e}")
+
+
+async def refrescar_catalogo() -> None:
+    """Descarga la lista de la API; si falla se conserva la anterior y se reintenta pasado GEMINI_CATALOGO_TTL_FALLO_S."""
+    global _catalogo
+    try:
+        modelos = await asyncio.to_thread(_descargar_modelos)
+    except Exception as e:
+        print(f"Error al listar modelos: {e}")
+        # Caduca GEMINI_CATALOGO_TTL_FALLO_S después de ahora, no GEMINI_CATALOGO_TTL_S
+        _catalogo = {
+            "modelos": _catalogo["modelos"] if _catalogo else [],
+            "actualizado": time.time() - GEMINI_CATALOGO_TTL_S + GEMINI_CATALOGO_TTL_FALLO_S,
+            "fallido": True,
+        }
+        return
+    _catalogo = {"modelos": modelos, "actualizado": time.time(), "fallido": False}
+    await asyncio.to_thread(_persistir, modelos)
+
+
+def _programar_refresco() -> None:
+    global _refresco
+    if _refresco is None or _refresco.done():
+        _refresco = asyncio.create_task(refrescar_catalogo())
+
+
+async def obtener_catalogo() -> List[Dict[str, Any]]:
+    global _catalogo
+    if _catalogo is None:
+        _catalogo = await asyncio.to_thread(_leer_persistido)
+    if _catalogo is None:
+        # Primer arranque sin nada guardado: no queda otra que esperar a la API
+        # (las peticiones simultáneas esperan a la misma descarga)
+        _programar_refresco()
+        await asyncio.shield(_refresco)
+        return _catalogo["modelos"] if _catalogo else []
+    if time.time() - _catalogo["actualizado"] > GEMINI_CATALOGO_TTL_S:
+        _programar_refresco()
+    return _catalogo["modelos"]
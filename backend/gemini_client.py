@@ -0,0 +1,191 @@
+"""
+Cliente de Gemini compartido por la API y los procesos offline.
+
+Todas las llamadas pasan por generar_contenido_gemini: cliente asíncrono del SDK,
+timeout por llamada (GEMINI_TIMEOUT_S, o menos si el llamante tiene un plazo), un
+limitador de tasa común a todo el proceso (GEMINI_MAX_RPS) y un cortocircuito que
+deja de llamar durante GEMINI_CIRCUITO_ENFRIAMIENTO_S segundos tras
+GEMINI_CIRCUITO_FALLOS fallos seguidos de Gemini (timeouts, 5xx, 429 o sin conexión).
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Optional
+
+import aiohttp
+import httpx
+from google import genai
+from google.genai import errors as genai_errors
+from google.genai import types as genai_types
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_TIMEOUT_S = float(os.getenv("GEMINI_TIMEOUT_S", "30"))
+GEMINI_MAX_RPS = float(os.getenv("GEMINI_MAX_RPS", "5"))  # 0 = sin límite
+GEMINI_CIRCUITO_FALLOS = int(os.getenv("GEMINI_CIRCUITO_FALLOS", "5"))
+GEMINI_CIRCUITO_ENFRIAMIENTO_S = float(os.getenv("GEMINI_CIRCUITO_ENFRIAMIENTO_S", "30"))
+GEMINI_LLAMADA_MIN_S = 0.5  # margen mínimo para la llamada tras la cola del limitador
+# Modelo de los endpoints de IA y del enriquecimiento cuando la petición no elige otro
+MODELO_IA_POR_DEFECTO = "gemini-3.5-flash-lite"
+
+# Para pruebas de carga sin cuota: URL de fake_gemini_server.py (o cualquier proxy compatible)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+
+client_ai = None
+if GEMINI_API_KEY:
+    client_ai = genai.Client(
+        api_key=GEMINI_API_KEY,
+        http_options=genai_types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None,
+    )
+else:
+    print("⚠️ ADVERTENCIA: GEMINI_API_KEY no configurada. El endpoint de IA no funcionará.")
+
+
+class LimitadorTasa:
+    """
+    Espacia las llamadas a GEMINI_MAX_RPS por segundo entre todas las peticiones del proceso.
+    Cada llamada reserva su turno sin await intermedio, así que no necesita lock.
+    """
+
+    def __init__(self, por_segundo: float):
+        self.intervalo = 1.0 / por_segundo if por_segundo > 0 else 0.0
+        self._siguiente = 0.0
+
+    async def esperar_turno(self, hasta: Optional[float] = None) -> None:
+        """
+        Espera el turno. Si no llega antes de `hasta` (time.monotonic()), lanza
+        asyncio.TimeoutError al momento sin reservarlo.
+        """
+        ahora = time.monotonic()
+        turno = max(ahora, self._siguiente)
+        if hasta is not None and turno > hasta:
+            raise asyncio.TimeoutError
+        self._siguiente = turno + self.intervalo
+        if turno > ahora:
+            await asyncio.sleep(turno - ahora)
+
+
+limitador_gemini = LimitadorTasa(GEMINI_MAX_RPS)
+
+
+class CircuitoAbierto(Exception):
+    """Gemini está fallando: no se llama hasta que pase el enfriamiento."""
+
+
+class Cortocircuito:
+    """
+    Tras `umbral` fallos seguidos de Gemini (ver es_fallo_gemini) se abre y rechaza
+    las llamadas al momento. Pasado el enfriamiento deja pasar una sola de prueba
+    (semiabierto): si va bien se cierra, si falla vuelve a abrirse.
+    """
+
+    def __init__(self, umbral: int, enfriamiento_s: float):
+        self.umbral = umbral
+        self.enfriamiento_s = enfriamiento_s
+        self.fallos_seguidos = 0
+        self._abierto_hasta = 0.0
+        self._prueba_en_curso = False
+        self.rechazadas = 0
+        self.aperturas = 0
+
+    @property
+    def estado(self) -> str:
+        if self.fallos_seguidos < self.umbral:
+            return "cerrado"
+        return "abierto" if time.monotonic() < self._abierto_hasta else "semiabierto"
+
+    def permitir(self) -> None:
+        """Lanza CircuitoAbierto si la llamada no debe hacerse."""
+        estado = self.estado
+        if estado == "cerrado":
+            return
+        if estado == "semiabierto" and not self._prueba_en_curso:
+            self._prueba_en_curso = True
+            return
+        self.rechazadas += 1
+        raise CircuitoAbierto("Gemini no disponible temporalmente")
+
+    def exito(self) -> None:
+        self.fallos_seguidos = 0
+        self._prueba_en_curso = False
+
+    def fallo(self) -> None:
+        ya_abierto = self.estado == "abierto"
+        self.fallos_seguidos += 1
+        self._prueba_en_curso = False
+        if self.fallos_seguidos >= self.umbral:
+            self._abierto_hasta = time.monotonic() + self.enfriamiento_s
+            if not ya_abierto:
+                self.aperturas += 1
+
+    def cancelada(self) -> None:
+        # Ni éxito ni fallo: solo libera el turno de prueba
+        self._prueba_en_curso = False
+
+    def metricas(self) -> dict:
+        return {
+            "estado": self.estado,
+            "fallos_seguidos": self.fallos_seguidos,
+            "aperturas": self.aperturas,
+            "rechazadas": self.rechazadas,
+        }
+
+
+circuito_gemini = Cortocircuito(GEMINI_CIRCUITO_FALLOS, GEMINI_CIRCUITO_ENFRIAMIENTO_S)
+
+
+def es_fallo_gemini(error: BaseException) -> bool:
+    """
+    Solo cuentan para el cortocircuito los fallos del servicio: timeout de la llamada, 5xx,
+    429 y errores de conexión. Un 4xx (p. ej. un modelo que no existe) es culpa de la
+    petición y no dice nada de la salud de Gemini.
+    """
+    if isinstance(error, genai_errors.APIError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (asyncio.TimeoutError, httpx.TransportError, aiohttp.ClientError, OSError))
+
+
+def parsear_json_gemini(texto: str) -> dict:
+    texto_limpio = texto.replace("```json", "").replace("```", "").strip()
+    return json.loads(texto_limpio)
+
+
+async def generar_contenido_gemini(
+    prompt: str,
+    modelo: str,
+    config: Optional[genai_types.GenerateContentConfig] = None,
+    timeout_s: Optional[float] = None,
+) -> str:
+    """
+    Llamada a Gemini con el cliente asíncrono del SDK, para no bloquear el event loop
+    mientras el modelo responde. Lanza asyncio.TimeoutError si supera timeout_s (como
+    mucho GEMINI_TIMEOUT_S, cola del limitador incluida) y CircuitoAbierto sin llamar
+    si Gemini lleva varios fallos seguidos.
+    """
+    circuito_gemini.permitir()
+    limite = GEMINI_TIMEOUT_S if timeout_s is None else min(timeout_s, GEMINI_TIMEOUT_S)
+    plazo = time.monotonic() + limite
+    try:
+        # Si el turno no deja GEMINI_LLAMADA_MIN_S para la llamada, timeout sin llamar:
+        # es cola local, no un fallo de Gemini
+        await limitador_gemini.esperar_turno(hasta=plazo - GEMINI_LLAMADA_MIN_S)
+    except BaseException:
+        circuito_gemini.cancelada()
+        raise
+    try:
+        response = await asyncio.wait_for(
+            client_ai.aio.models.generate_content(model=modelo, contents=prompt, config=config),
+            timeout=max(0.0, plazo - time.monotonic()),
+        )
+    except asyncio.CancelledError:
+        circuito_gemini.cancelada()
+        raise
+    except Exception as e:
+        if es_fallo_gemini(e):
+            circuito_gemini.fallo()
+        else:
+            circuito_gemini.cancelada()
+        raise
+    circuito_gemini.exito()
+    return response.text
@@ -1,5 +1,6 @@
 import json
 from database import get_tanks_collection
+from tank_catalog import marcar_catalogo_modificado
 
 # Paso 1: Leer el archivo JSON
 with open('tanques.json', 'r', encoding='utf-8') as archivo:
@@ -20,4 +21,7 @@ for tank in datos_tanque:
     tanque_insertado = tanks_collection.find_one({"_id": resultado.inserted_id})
     print(f"Nombre del tanque: {tanque_insertado['nombre']}")
     print(f"Nación: {tanque_insertado['nacion']}")
-    print(f"Rating: {tanque_insertado['rating_arcade']}")
\ No newline at end of file
+    print(f"Rating: {tanque_insertado['rating_arcade']}")
+
+# Paso 6: Avisar a la API de que el catálogo de tanques ha cambiado
+marcar_catalogo_modificado()
@@ -0,0 +1,134 @@
+"""
+Prueba de carga de los endpoints con IA (/combate-ia/ y /simulacion-equipos-ia/).
+
+Pensada para correr contra un backend apuntado a fake_gemini_server.py, sin red
+ni cuota:
+
+    python fake_gemini_server.py --latencia-ms 800 --tasa-error 0.02 &
+    GEMINI_API_KEY=falsa GEMINI_BASE_URL=http://localhost:8090 uvicorn main:app --port 8000 &
+    python load_test_ia.py --url http://localhost:8000 --peticiones 200 --concurrencia 20
+
+Mide throughput, latencia p50/p95/p99/máx y errores por código. Con --variar-distancia
+cada petición usa una distancia aleatoria para que no la sirvan las cachés de
+resultados y narrativas.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+import aiohttp
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _situacion(args: argparse.Namespace) -> str:
+    return f"{random.randrange(100, 2000, 50)}m" if args.variar_distancia else args.situacion
+
+
+def _peticion_duelo(tanques: List[Dict[str, Any]], args: argparse.Namespace) -> Tuple[str, Dict[str, Any]]:
+    v1, v2 = random.sample(tanques, 2)
+    return "/combate-ia/", {
+        "vehiculo1_id": v1["_id"],
+        "vehiculo2_id": v2["_id"],
+        "situacion": _situacion(args),
+        "modelo": args.modelo,
+    }
+
+
+def _peticion_equipos(tanques: List[Dict[str, Any]], args: argparse.Namespace) -> Tuple[str, Dict[str, Any]]:
+    equipo = random.sample(tanques, 2 * args.tamano_equipo)
+    return "/simulacion-equipos-ia/", {
+        "equipo_aliado": equipo[:args.tamano_equipo],
+        "equipo_enemigo": equipo[args.tamano_equipo:],
+        "tanque_usuario_index": 0,
+        "situacion": _situacion(args),
+        "modelo": args.modelo,
+    }
+
+
+async def _ejecutar(args: argparse.Namespace) -> Dict[str, Any]:
+    timeout = aiohttp.ClientTimeout(total=args.timeout_s)
+    async with aiohttp.ClientSession(base_url=args.url, timeout=timeout) as sesion:
+        async with sesion.get("/tanques/") as respuesta:
+            respuesta.raise_for_status()
+            tanques = await respuesta.json()
+        if len(tanques) < 2 * args.tamano_equipo:
+            raise SystemExit(f"Hacen falta al menos {2 * args.tamano_equipo} tanques en la base de datos")
+
+        generadores = {"duelo": [_peticion_duelo], "equipos": [_peticion_equipos]}
+        generadores["ambos"] = generadores["duelo"] + generadores["equipos"]
+        latencias: Dict[str, List[float]] = {"/combate-ia/": [], "/simulacion-equipos-ia/": []}
+        codigos: Counter = Counter()
+        semaforo = asyncio.Semaphore(args.concurrencia)
+
+        async def una_peticion() -> None:
+            endpoint, cuerpo = random.choice(generadores[args.endpoint])(tanques, args)
+            async with semaforo:
+                inicio = time.perf_counter()
+                try:
+                    async with sesion.post(endpoint, json=cuerpo) as respuesta:
+                        await respuesta.read()
+                        codigos[respuesta.status] += 1
+                        if respuesta.status == 200:
+                            latencias[endpoint].append(time.perf_counter() - inicio)
+                except asyncio.TimeoutError:
+                    codigos["timeout"] += 1
+                except aiohttp.ClientError as e:
+                    codigos[type(e).__name__] += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(una_peticion() for _ in range(args.peticiones)))
+        duracion = time.perf_counter() - inicio
+
+    informe: Dict[str, Any] = {
+        "peticiones": args.peticiones,
+        "concurrencia": args.concurrencia,
+        "segundos": round(duracion, 2),
+        "throughput_rps": round(codigos[200] / duracion, 2),
+        "codigos": dict(codigos),
+    }
+    for endpoint, valores in latencias.items():
+        if valores:
+            informe[endpoint] = {
+                "ok": len(valores),
+                "media_ms": round(statistics.mean(valores) * 1000),
+                "p50_ms": round(_percentil(valores, 50) * 1000),
+                "p95_ms": round(_percentil(valores, 95) * 1000),
+                "p99_ms": round(_percentil(valores, 99) * 1000),
+                "max_ms": round(max(valores) * 1000),
+            }
+    return informe
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prueba de carga de los endpoints con IA.")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", choices=["duelo", "equipos", "ambos"], default="ambos")
+    parser.add_argument("--peticiones", type=int, default=100)
+    parser.add_argument("--concurrencia", type=int, default=10)
+    parser.add_argument("--tamano-equipo", type=int, default=4)
+    parser.add_argument("--situacion", default="500m")
+    parser.add_argument("--variar-distancia", action="store_true")
+    parser.add_argument("--modelo", default="gemini-3.5-flash-lite")
+    parser.add_argument("--timeout-s", type=float, default=120)
+    parser.add_argument("--semilla", type=int, default=None)
+    args = parser.parse_args()
+    random.seed(args.semilla)
+
+    informe = asyncio.run(_ejecutar(args))
+    for clave, valor in informe.items():
+        print(f"{clave}: {valor}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,62 @@
 
-from fastapi import FastAPI, HTTPException, File, UploadFile, Depends
+from fastapi import FastAPI, HTTPException, File, UploadFile, Depends, Request, Response
 from fastapi.concurrency import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional
 import markdown
-from database import get_tanks_collection, verificar_conexion
-from models import Tanque, TanqueDB, CombateIARequest, CombateIAResponse, SimulacionEquiposIARequest, SimulacionEquiposIAResponse
+from database import get_tanks_collection, verificar_conexion, convertir_decimal128_recursivo
+from models import (
+    Tanque, TanqueDB, CombateIARequest, CombateIAResponse, SimulacionEquiposIARequest, SimulacionEquiposIAResponse,
+    OptimizarLineupRequest, OptimizarLineupResponse, SensibilidadDueloRequest, EstimacionDueloRequest,
+    ActivarModeloRequest, SimulacionDueloRequest, SimulacionEquiposRequest, NarrativaResponse,
+)
 from combat_simulator import (
-    simular_duelo_monte_carlo,
+    CLAVE_VERSION_CATALOGO,
+    EQUIPO_MAX_TANQUES,
+    LINEUP_MAX_CANDIDATOS,
+    MC_EQUIPO_ITERACIONES,
+    MC_SENSIBILIDAD_ITERACIONES,
+    analizar_sensibilidad_duelo,
+    get_engine,
+    metricas_cache,
+    metricas_router,
+    simular_duelo_escalonado,
     simular_equipos_monte_carlo,
+    optimizar_lineup,
     resultado_duelo_a_dict,
     resultado_equipos_a_dict,
+    resultado_lineup_a_dict,
+)
+from combat_surrogate import estimacion_rapida_duelo
+import model_registry
+from cache_warmer import CALENTADOR_ACTIVO, bucle_calentador, registrar_acceso
+import cache_warmer
+import gemini_client
+from gemini_client import (
+    MODELO_IA_POR_DEFECTO,
+    CircuitoAbierto,
+    circuito_gemini,
+    generar_contenido_gemini,
+    parsear_json_gemini,
 )
-from google import genai
+from tank_enrichment import enriquecer_tanques, guardar_enriquecidos
+from gemini_catalog import obtener_catalogo
+from document_diff import aplicar_diff, metricas_escrituras
+from narrative_cache import (
+    asegurar_indices_narrativas,
+    clave_narrativa,
+    guardar_narrativa,
+    guardar_resultado,
+    metricas_narrativas,
+    obtener_narrativa,
+    obtener_resultado,
+)
+from narrative_template import metricas_plantillas, narrativa_plantilla, registrar_plantilla
+from tank_catalog import marcar_catalogo_modificado, metricas_catalogo, obtener_catalogo_tanques
+import asyncio
+import copy
 import json
+import time
 from bson import ObjectId
 from auth_routes import router as auth_router
 from auth import obtener_usuario_activo_actual
@@ -24,29 +67,12 @@ from pathlib import Path
 import shutil
 from pending_changes_routes import router as pending_changes_router
 from pending_changes_routes import crear_cambio_pendiente
+from simulation_jobs_routes import router as simulation_jobs_router
 from contextlib import asynccontextmanager
 from fastapi import APIRouter, Query
 from typing import Optional
 from statistics import mean
-from bson.decimal128 import Decimal128
 
-def convertir_decimal128_recursivo(dato):
-    """
-    Convierte todos los Decimal128 a float de forma recursiva.
-    Funciona con diccionarios, listas y valores individuales.
-    """
-    if isinstance(dato, Decimal128):
-        # Convertir Decimal128 a float
-        return float(dato.to_decimal())
-    elif isinstance(dato, dict):
-        # Si es un diccionario, convertir cada valor
-        return {clave: convertir_decimal128_recursivo(valor) for clave, valor in dato.items()}
-    elif isinstance(dato, list):
-        # Si es una lista, convertir cada elemento
-        return [convertir_decimal128_recursivo(elemento) for elemento in dato]
-    else:
-        # Si es otro tipo, dejarlo como está
-        return dato
     
 # Paso 3: Evento que se ejecuta al iniciar la aplicación
 #@app.on_event("startup")
@@ -58,7 +84,15 @@ async def lifespan(app: FastAPI):
     """
     print("Iniciando aplicación...")
     verificar_conexion()
+    await asyncio.to_thread(asegurar_indices_narrativas)
+    try:
+        await obtener_catalogo_tanques()
+    except Exception as e:
+        print(f"Advertencia: no se pudo cargar el catálogo de tanques, se cargará en la primera petición: {e}")
+    calentador = asyncio.create_task(bucle_calentador()) if CALENTADOR_ACTIVO else None
     yield
+    if calentador:
+        calentador.cancel()
     print("Deteniendo aplicación.")
 
 # Paso 1: Crear la aplicación FastAPI
@@ -75,14 +109,16 @@ FRONTEND_URL = os.getenv(
 )
 
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
+# Con ENRIQUECIMIENTO_EN_PETICION=1 los endpoints de IA completan en línea los tanques que
+# tank_enrichment.py aún no ha procesado (esperando a Gemini, como mucho hasta el plazo de
+# la petición). Por defecto no esperan.
+ENRIQUECIMIENTO_EN_PETICION = os.getenv("ENRIQUECIMIENTO_EN_PETICION", "0") == "1"
 
-# Configurar Gemini
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-client_ai = None
-if GEMINI_API_KEY:
-    client_ai = genai.Client(api_key=GEMINI_API_KEY)
-else:
-    print("⚠️ ADVERTENCIA: GEMINI_API_KEY no configurada. El endpoint de IA no funcionará.")
+# Plazo total de los endpoints con IA (simulación + narrativa). Lo que quede al terminar
+# la simulación es lo que se espera a Gemini; si no llega, narrativa de plantilla.
+PETICION_IA_PLAZO_S = float(os.getenv("PETICION_IA_PLAZO_S", "12"))
+NARRATIVA_PLAZO_MIN_S = 0.5  # con menos margen ni se intenta
+CATALOGO_MODELOS_ESPERA_S = 2.0  # primer arranque: lo que se espera al listado de modelos para validar
 
 allowed_origins = [
     "http://localhost:4200",  # Desarrollo local Angular
@@ -122,6 +158,7 @@ app.add_middleware(
 app.include_router(auth_router)
 # Incluir el router de cambios pendientes
 app.include_router(pending_changes_router)
+app.include_router(simulation_jobs_router)
 
 app.mount("/imagenes", StaticFiles(directory="imagenes"), name="imagenes")
 
@@ -327,11 +364,69 @@ async def root():
     
 @app.api_route("/health", methods=["GET", "HEAD"])
 async def health():
-    try:
-        verificar_conexion()
+    # El ping puede tardar hasta serverSelectionTimeoutMS: fuera del bucle de eventos
+    if await asyncio.to_thread(verificar_conexion):
         return {"status": "ok", "db": "connected"}
-    except Exception:
-        return {"status": "degraded", "db": "error"}
+    return {"status": "degraded", "db": "error"}
+
+
+@app.get("/metricas/simulacion")
+async def metricas_simulacion():
+    """Reparto de niveles de fidelidad (analítico vs Monte Carlo) usados en los duelos."""
+    return metricas_router()
+
+
+@app.get("/modelo")
+async def modelo_combate():
+    """Versión del modelo de combate en uso y contenido del registro."""
+    # La primera llamada a get_engine() carga el modelo y leer_manifiesto() lee disco: fuera del bucle
+    def leer() -> dict:
+        return {"version_modelo": get_engine().version_modelo, "registro": model_registry.leer_manifiesto()}
+
+    return await asyncio.to_thread(leer)
+
+
+@app.post("/admin/modelo/activar")
+async def activar_modelo_combate(
+    request: ActivarModeloRequest,
+    usuario_actual: UsuarioEnDB = Depends(obtener_usuario_activo_actual)
+):
+    """
+    Cambia en caliente el modelo de combate (solo administradores). Sin versión, recarga
+    la versión activa del registro. Las simulaciones en curso terminan con el modelo anterior.
+    """
+    if not usuario_actual.es_admin:
+        raise HTTPException(status_code=403, detail="Solo los administradores pueden cambiar el modelo")
+    try:
+        version = await asyncio.to_thread(lambda: get_engine().recargar_modelo(request.version))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"version_modelo": version}
+
+
+@app.get("/metricas/cache")
+async def metricas_cache_simulacion():
+    """Tasa de aciertos de las cachés del motor y de narrativas, y efecto del calentador (última pasada incluida)."""
+    return {
+        **metricas_cache(),
+        "narrativas": metricas_narrativas(),
+        "ultima_pasada_calentador": cache_warmer.ultimo_informe,
+    }
+
+
+@app.get("/metricas/ia")
+async def metricas_ia():
+    """Estado del cortocircuito de Gemini y narrativas servidas con plantilla, por motivo."""
+    return {
+        "circuito_gemini": circuito_gemini.metricas(),
+        "narrativas_plantilla": metricas_plantillas(),
+    }
+
+
+@app.get("/metricas/escrituras")
+async def metricas_escrituras_tanques():
+    """Escrituras por diferencias de este proceso: omitidas por no-op y bytes ahorrados frente al $set completo."""
+    return metricas_escrituras()
 
 
 # Paso 5: Crear un nuevo tanque (POST)
@@ -360,6 +455,7 @@ async def crear_tanque(
     if usuario_actual.es_admin:
         # ADMIN: Crear inmediatamente
         resultado = tanks_collection.insert_one(tanque_dict)
+        marcar_catalogo_modificado()
         return {
             "mensaje": "Tanque creado exitosamente",
             "id": str(resultado.inserted_id)
@@ -437,27 +533,41 @@ async def upload_tank_image(file: UploadFile = File(...)):
 
 # Paso 6: Obtener todos los tanques (GET)
 @app.get("/tanques/", response_model=List[dict])  # ← Cambiar de nuevo a dict
-async def obtener_tanques():
+async def obtener_tanques(request: Request):
     """
     Obtiene todos los tanques de la base de datos.
     Prueba con: http://localhost:8000/tanques/
     
+    Sale del catálogo en memoria con el JSON ya serializado. El ETag es la versión del
+    catálogo: con If-None-Match igual se responde 304 sin cuerpo.
+
     Returns:
         Lista de todos los tanques
     """
-    tanques = []
-    
-    # Buscar todos los documentos en la colección
-    for tanque_dict in tanks_collection.find().sort([("rating_realista", 1), ("nacion", 1)]):
-        # Convertir ObjectId a string
-        tanque_dict["_id"] = str(tanque_dict["_id"])
-        
-        # Convertir todos los Decimal128 a float (recursivamente)
-        tanque_dict = convertir_decimal128_recursivo(tanque_dict)
-        
-        tanques.append(tanque_dict)
-    
-    return tanques
+    catalogo = await obtener_catalogo_tanques()
+    cabeceras = {"ETag": catalogo.etag, "X-Catalogo-Version": str(catalogo.version)}
+    if request.headers.get("if-none-match") == catalogo.etag:
+        return Response(status_code=304, headers=cabeceras)
+    return Response(content=catalogo.json_tanques, media_type="application/json", headers=cabeceras)
+
+
+@app.get("/tanques/version")
+async def version_catalogo_tanques():
+    """Versión del catálogo de tanques, para validar cachés de clientes (cambia con cada escritura)."""
+    await obtener_catalogo_tanques()
+    return metricas_catalogo()
+
+
+@app.get("/tanques/buscar", response_model=dict)
+async def buscar_tanque_por_nombre(nombre: str = Query(..., min_length=1)):
+    """
+    Busca un tanque por nombre (sin distinguir mayúsculas): coincidencia exacta o,
+    si no hay, el primero que contenga el texto. Lo usa el bot de Discord.
+    """
+    tanque = (await obtener_catalogo_tanques()).buscar_por_nombre(nombre)
+    if tanque is None:
+        raise HTTPException(status_code=404, detail=f"No se encontró ningún tanque llamado: {nombre}")
+    return tanque
 
 # Paso 7: Obtener un tanque específico por ID (GET)
 @app.get("/tanques/{id}", response_model=dict)
@@ -476,18 +586,12 @@ async def obtener_tanque_por_id(id: str):
         if not ObjectId.is_valid(id):
             raise HTTPException(status_code=400, detail="ID de MongoDB inválido")
 
-        # Buscar el tanque por _id (ObjectId, no string)
-        tanque_dict = tanks_collection.find_one({"_id": ObjectId(id)})
+        # Buscar el tanque en el catálogo en memoria (ya convertido)
+        tanque_dict = (await obtener_catalogo_tanques()).por_id.get(id)
 
         if tanque_dict is None:
             raise HTTPException(status_code=404, detail="Tanque no encontrado")
 
-        # Convertir ObjectId a string
-        tanque_dict["_id"] = str(tanque_dict["_id"])
-        
-        # Convertir todos los Decimal128 a float (recursivamente)
-        tanque_dict = convertir_decimal128_recursivo(tanque_dict)
-        
         return tanque_dict
 
     except HTTPException:
@@ -510,17 +614,8 @@ async def obtener_tanques_por_nacion(nacion: str):
     Returns:
         Lista de tanques de esa nación
     """
-    tanques = []
-    
-    # Buscar tanques de la nación especificada
-    for tanque_dict in tanks_collection.find({"nacion": nacion}):
-        # Convertir ObjectId a string
-        tanque_dict["_id"] = str(tanque_dict["_id"])
-        
-        # Convertir todos los Decimal128 a float (recursivamente)
-        tanque_dict = convertir_decimal128_recursivo(tanque_dict)
-        
-        tanques.append(tanque_dict)
+    # Tanques de la nación especificada, desde el catálogo en memoria
+    tanques = list((await obtener_catalogo_tanques()).por_nacion.get(nacion, ()))
     
     if not tanques:
         raise HTTPException(
@@ -561,12 +656,11 @@ async def actualizar_tanque(
 
         # VERIFICAR SI ES ADMIN
         if usuario_actual.es_admin:
-            # ADMIN: Actualizar inmediatamente
-            resultado = tanks_collection.update_one(
-                {"_id": ObjectId(id)},
-                {"$set": tanque_dict}
-            )
-            return {"mensaje": "Tanque actualizado exitosamente"}
+            # ADMIN: Actualizar inmediatamente (solo los campos que cambian)
+            diff = aplicar_diff(tanks_collection, {"_id": ObjectId(id)}, tanque_original, tanque_dict)
+            if not diff.vacio:
+                marcar_catalogo_modificado()
+            return {"mensaje": "Tanque actualizado exitosamente", "campos_actualizados": sorted(diff.campos)}
         else:
             # NO ADMIN: Crear cambio pendiente
             cambio_id = await crear_cambio_pendiente(
@@ -616,6 +710,8 @@ async def eliminar_tanque(
         if usuario_actual.es_admin:
             # ADMIN: Eliminar inmediatamente
             resultado = tanks_collection.delete_one({"_id": ObjectId(id)})
+            if resultado.deleted_count:
+                marcar_catalogo_modificado()
             return {"mensaje": "Tanque eliminado exitosamente"}
         else:
             # NO ADMIN: Crear cambio pendiente
@@ -641,7 +737,7 @@ async def obtener_stats(
     br_max: Optional[float] = Query(None, ge=0),
     modo: str = Query("realista", regex="^(realista|arcade)$")
 ):
-    tanques = await obtener_tanques()  # Mongo o lo que uses
+    tanques = list((await obtener_catalogo_tanques()).tanques)
 
     if br_min is not None or br_max is not None:
         tanques = filtrar_por_br(tanques, br_min, br_max, modo)
@@ -743,8 +839,8 @@ async def obtener_top(
     - br_max: Battle Rating máximo (opcional)
     - modo: realista o arcade (por defecto: realista)
     """
-    # PASO 1: Obtener todos los tanques
-    tanques = await obtener_tanques()
+    # PASO 1: Obtener todos los tanques (catálogo en memoria)
+    tanques = list((await obtener_catalogo_tanques()).tanques)
     
     # PASO 2: Filtrar por BR si se especificó
     if br_min is not None or br_max is not None:
@@ -843,62 +939,68 @@ async def listar_modelos_ia():
     """
     Retorna la lista de modelos de Gemini disponibles para la API Key actual.
     """
-    if not client_ai:
+    if not gemini_client.client_ai:
         return []
-    
+    # Desde memoria (o lo último guardado en Mongo); si está caducado se refresca en segundo plano
+    return await obtener_catalogo()
+
+
+async def _validar_modelo_ia(modelo: str) -> bool:
+    """
+    400 si el modelo no está en el catálogo de GET /ia/modelos/, antes de que llegue al SDK.
+    Sin cliente de Gemini no se valida (la narrativa será de plantilla). Devuelve False si
+    el catálogo está vacío o no llega a tiempo: el modelo no se puede comprobar y la
+    petición sigue con narrativa de plantilla en lugar de fallar.
+    """
+    if not gemini_client.client_ai or modelo == MODELO_IA_POR_DEFECTO:
+        return True
     try:
-        modelos = []
-        # Obtenemos todos los modelos de la API
-        for m in client_ai.models.list():
-            # El nombre suele venir como 'models/gemini-1.5-flash'
-            full_name = m.name.lower()
-            nombre_id = full_name.replace('models/', '')
-            
-            # FILTRO: Debe permitir generar contenido
-            # En la nueva SDK (google-genai), el atributo es 'supported_actions'
-            acciones = getattr(m, 'supported_actions', [])
-            if acciones and 'generateContent' not in acciones:
-                continue
-                
-            # LISTA NEGRA: Palabras clave de modelos que NO son para chat/texto general
-            palabras_bloqueadas = [
-                'embedding', 'aqa', 'search', 'image', 'vision-only', 
-                'banana', 'nano-experimental', 'internal'
-            ]
-            
-            es_modelo_especializado = any(p in nombre_id for p in palabras_bloqueadas)
-            
-            # Solo incluimos modelos de la familia Gemini que no sean especializados
-            if nombre_id.startswith('gemini-') and not es_modelo_especializado:
-                modelos.append({
-                    "id": nombre_id,
-                    "nombre": m.display_name,
-                    "descripcion": m.description
-                })
-        
-        # Ordenamos la lista para que los más nuevos (2.0, 1.5) salgan primero
-        modelos.sort(key=lambda x: x['id'], reverse=True)
-        
-        return modelos
-    except Exception as e:
-        print(f"Error al listar modelos: {e}")
-        return []
+        catalogo = await asyncio.wait_for(obtener_catalogo(), timeout=CATALOGO_MODELOS_ESPERA_S)
+    except asyncio.TimeoutError:
+        catalogo = []
+    if not catalogo:
+        return False
+    if modelo not in {m["id"] for m in catalogo}:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Modelo de IA no disponible: {modelo}. Consulta GET /ia/modelos/",
+        )
+    return True
+
+def _resultado_para_prompt(resultado_sim: dict) -> dict:
+    """
+    Proyección del resultado que se envía a Gemini: sin la traza de depuración y con las
+    distribuciones reducidas a media/p10/p50/p90 (los histogramas solo gastan tokens).
+    """
+    proyeccion = {}
+    for clave, valor in resultado_sim.items():
+        if clave == "trace":
+            continue
+        if clave.startswith("distribucion_") and isinstance(valor, dict):
+            valor = {k: valor[k] for k in ("media", "p10", "p50", "p90") if k in valor}
+        proyeccion[clave] = valor
+    return proyeccion
+
 
-def _parsear_json_gemini(texto: str) -> dict:
-    texto_limpio = texto.replace("```json", "").replace("```", "").strip()
-    return json.loads(texto_limpio)
+def _metodo_duelo_prompt(resultado_sim: dict) -> str:
+    if resultado_sim.get("metodo_simulacion") == "analitico":
+        return "el solver analítico del simulador (probabilidades exactas, sin iteraciones aleatorias)"
+    return (
+        f"simulación Monte Carlo ({resultado_sim['simulaciones_monte_carlo']} iteraciones) "
+        "y refinamiento con red neuronal PyTorch"
+    )
 
 
-def _generar_analisis_duelo_gemini(
+async def _generar_analisis_duelo_gemini(
     v1: dict,
     v2: dict,
     situacion: str,
     resultado_sim: dict,
     modelo: str,
+    timeout_s: Optional[float] = None,
 ) -> dict:
     prompt = f"""
-Eres un analista militar de War Thunder. El resultado del combate YA FUE CALCULADO por simulación Monte Carlo
-({resultado_sim['simulaciones_monte_carlo']} iteraciones) y refinamiento con red neuronal PyTorch.
+Eres un analista militar de War Thunder. El resultado del combate YA FUE CALCULADO por {_metodo_duelo_prompt(resultado_sim)}.
 NO cambies el ganador ni las probabilidades. Tu tarea es EXPLICAR el resultado con base en los datos.
 
 SITUACIÓN DE COMBATE:
@@ -908,7 +1010,7 @@ VEHÍCULO 1: {v1['nombre']} ({v1['nacion']})
 VEHÍCULO 2: {v2['nombre']} ({v2['nacion']})
 
 RESULTADOS CALCULADOS (fuente de verdad):
-{json.dumps(resultado_sim, indent=2, ensure_ascii=False)}
+{json.dumps(_resultado_para_prompt(resultado_sim), indent=2, ensure_ascii=False)}
 
 Redacta un análisis técnico detallado en markdown explicando:
 - Por qué ganó {resultado_sim['ganador']}
@@ -921,15 +1023,15 @@ Responde estrictamente en JSON:
     "puntos_clave": ["Punto 1", "Punto 2", "Punto 3"]
 }}
 """
-    response = client_ai.models.generate_content(model=modelo, contents=prompt)
-    return _parsear_json_gemini(response.text)
+    return parsear_json_gemini(await generar_contenido_gemini(prompt, modelo, timeout_s=timeout_s))
 
 
-def _generar_narrativa_equipos_gemini(
+async def _generar_narrativa_equipos_gemini(
     usuario: dict,
     situacion: str,
     resultado_sim: dict,
     modelo: str,
+    timeout_s: Optional[float] = None,
 ) -> str:
     prompt = f"""
 Eres un estratega de War Thunder. La batalla entre equipos YA FUE SIMULADA con Monte Carlo
@@ -943,7 +1045,7 @@ TANQUE DEL USUARIO:
 {usuario.get('nombre')} ({usuario.get('nacion')})
 
 RESULTADOS CALCULADOS:
-{json.dumps(resultado_sim, indent=2, ensure_ascii=False)}
+{json.dumps(_resultado_para_prompt(resultado_sim), indent=2, ensure_ascii=False)}
 
 Redacta en markdown una narrativa táctica del desarrollo de la batalla coherente con:
 - Probabilidad de victoria aliada: {resultado_sim['probabilidad_victoria']}%
@@ -955,149 +1057,278 @@ Responde estrictamente en JSON:
     "resultado_general": "Narrativa en markdown"
 }}
 """
-    response = client_ai.models.generate_content(model=modelo, contents=prompt)
-    return _parsear_json_gemini(response.text)["resultado_general"]
+    return parsear_json_gemini(await generar_contenido_gemini(prompt, modelo, timeout_s=timeout_s))["resultado_general"]
 
 
-def _estimar_datos_municion_gemini(nombre_arma: str, municion: dict, tanque_nombre: str, modelo: str) -> dict:
-    prompt = f"""
-Eres un experto balístico de War Thunder. Necesito estimar datos faltantes para la munición '{municion.get('nombre')}' (tipo: {municion.get('tipo')}) disparada por el cañón '{nombre_arma}' del tanque '{tanque_nombre}'.
-Solo estima los datos faltantes si no existen o son 0.
-Debes devolver un JSON con esta estructura exacta:
-{{
-    "masa_total": <numero en kg, ej: 15.5>,
-    "velocidad_bala": <numero en m/s, ej: 850>,
-    "masa_explosivo": <numero en gramos, ej: 150>
-}}
-Si no sabes, haz tu mejor estimación realista basada en municiones similares de la vida real o del juego. No devuelvas markdown, solo el JSON puro.
-"""
-    response = client_ai.models.generate_content(model=modelo, contents=prompt)
-    return _parsear_json_gemini(response.text)
+async def _narrativa_gemini(documento: dict, modelo: str, timeout_s: float) -> dict:
+    resultado_sim = documento["resultado"]
+    if documento["tipo"] == "duelo":
+        v1, v2 = documento["contexto"]
+        generada = await _generar_analisis_duelo_gemini(
+            v1, v2, documento["situacion"], resultado_sim, modelo, timeout_s=timeout_s,
+        )
+        return {
+            "analisis": markdown.markdown(generada.get("analisis", "")),
+            "puntos_clave": generada.get("puntos_clave", [])[:3],
+        }
+    (usuario,) = documento["contexto"]
+    generada = await _generar_narrativa_equipos_gemini(
+        usuario, documento["situacion"], resultado_sim, modelo, timeout_s=timeout_s,
+    )
+    return {"resultado_general": markdown.markdown(generada)}
 
 
-def _estimar_slope_factor_gemini(tanque: dict, modelo: str) -> float:
-    prompt = f"""
-Eres un experto en blindaje de tanques de War Thunder. El simulador necesita un 'slope factor' (factor de efectividad del blindaje inclinado) para el tanque '{tanque.get('nombre')}' ({tanque.get('nacion')}).
-El valor por defecto es 1.35. Basado en el diseño del chasis y torreta de este tanque, devuelve una estimación realista de su factor multiplicador de blindaje frente a proyectiles.
-Un tanque con blindaje muy inclinado (ej. T-34, Panther) puede tener 1.5 - 1.8, uno con blindaje plano (ej. Tiger I) puede tener 1.0 - 1.2.
-Debes devolver un JSON con esta estructura exacta:
-{{
-    "slope_factor": <numero flotante, ej: 1.45>
-}}
-No devuelvas markdown, solo el JSON puro.
-"""
-    response = client_ai.models.generate_content(model=modelo, contents=prompt)
-    data = _parsear_json_gemini(response.text)
-    return float(data.get("slope_factor", 1.35))
+async def _narrativa_resultado(documento: dict, modelo: str, limite: float, modelo_verificado: bool = True) -> dict:
+    """
+    Narrativa de un resultado guardado, ya renderizada a HTML: desde la caché o generada
+    con Gemini antes de `limite` (time.monotonic()). Si Gemini no está configurado, el modelo
+    no se pudo comprobar (`modelo_verificado`), no llega a tiempo, falla o el cortocircuito
+    está abierto, narrativa de plantilla (marcada y sin cachear, para que la próxima
+    petición vuelva a intentarlo con Gemini).
+    """
+    clave = clave_narrativa(documento["_id"], modelo)
+    narrativa = await asyncio.to_thread(obtener_narrativa, clave)
+    if narrativa is not None:
+        return narrativa
+    if not gemini_client.client_ai:
+        registrar_plantilla("sin_clave")
+        return {**narrativa_plantilla(documento), "narrativa_plantilla": True}
+    if not modelo_verificado:
+        registrar_plantilla("sin_catalogo")
+        return {**narrativa_plantilla(documento), "narrativa_plantilla": True}
+
+    restante = limite - time.monotonic()
+    try:
+        if restante < NARRATIVA_PLAZO_MIN_S:
+            raise asyncio.TimeoutError
+        narrativa = await _narrativa_gemini(documento, modelo, restante)
+    except asyncio.TimeoutError:
+        registrar_plantilla("plazo")
+    except CircuitoAbierto:
+        registrar_plantilla("circuito")
+    except Exception as e:
+        print(f"Error generando narrativa con IA, se usa la plantilla: {e}")
+        registrar_plantilla("error")
+    else:
+        await asyncio.to_thread(guardar_narrativa, clave, narrativa, modelo)
+        return narrativa
+    return {**narrativa_plantilla(documento), "narrativa_plantilla": True}
 
 
-async def _procesar_tanque_con_ia(tanque: dict, modelo: str) -> dict:
-    if not client_ai:
-        return tanque
-    
-    modificado = False
-    
-    if "slope_factor_ia" not in tanque:
-        try:
-            sf = _estimar_slope_factor_gemini(tanque, modelo)
-            tanque["slope_factor_ia"] = sf
-            modificado = True
-        except Exception as e:
-            print(f"Error estimando slope_factor: {e}")
-            
-    for armamento_key in ["armamento", "setup_1", "setup_2"]:
-        if armamento_key in tanque and isinstance(tanque[armamento_key], dict):
-            for nombre_arma, datos_arma in tanque[armamento_key].items():
-                if "municiones" in datos_arma:
-                    for municion in datos_arma["municiones"]:
-                        faltan = False
-                        if not municion.get("masa_total"): faltan = True
-                        if not municion.get("velocidad_bala"): faltan = True
-                        if not municion.get("masa_explosivo"): faltan = True
-                        
-                        if faltan:
-                            try:
-                                estimacion = _estimar_datos_municion_gemini(nombre_arma, municion, tanque.get("nombre", "Desconocido"), modelo)
-                                if not municion.get("masa_total"): municion["masa_total"] = float(estimacion.get("masa_total") or 0)
-                                if not municion.get("velocidad_bala"): municion["velocidad_bala"] = int(estimacion.get("velocidad_bala") or 0)
-                                if not municion.get("masa_explosivo"): municion["masa_explosivo"] = float(estimacion.get("masa_explosivo") or 0)
-                                municion["datos_generados_por_ia"] = True
-                                modificado = True
-                            except Exception as e:
-                                print(f"Error estimando munición: {e}")
-                                
-    if modificado and "_id" in tanque:
-        try:
-            id_tanque = tanque["_id"]
-            if isinstance(id_tanque, str):
-                id_tanque = ObjectId(id_tanque)
-            
-            tanque_update = dict(tanque)
-            if "_id" in tanque_update:
-                del tanque_update["_id"]
-                
-            tanks_collection.update_one({"_id": id_tanque}, {"$set": tanque_update})
-        except Exception as e:
-            print(f"Error actualizando tanque en BD: {e}")
+def _contexto_narrativa(tanque: dict) -> dict:
+    """Lo único del tanque que usan los prompts de narrativa."""
+    return {"nombre": tanque.get("nombre"), "nacion": tanque.get("nacion")}
+
 
+async def _enriquecer_en_peticion(tanques: List[dict], modelo: str, limite: float) -> List[dict]:
+    """
+    Solo con ENRIQUECIMIENTO_EN_PETICION; si no, el enriquecimiento es cosa de tank_enrichment.py.
+    Espera a Gemini como mucho hasta `limite` (time.monotonic()); si no llega, sigue con los
+    tanques sin enriquecer (se enriquecen sobre copias para no dejarlos a medias).
+    """
+    if not ENRIQUECIMIENTO_EN_PETICION:
+        return tanques
+    try:
+        enriquecidos, modificados = await asyncio.wait_for(
+            enriquecer_tanques(copy.deepcopy(tanques), modelo),
+            timeout=max(0.0, limite - time.monotonic()),
+        )
+    except asyncio.TimeoutError:
+        print("Enriquecimiento en petición fuera de plazo; se simula con los datos actuales")
+        return tanques
+    # Ya no coinciden con su versión del catálogo: la caché de perfiles vuelve a usar su huella
+    for _, tanque in modificados:
+        tanque.pop(CLAVE_VERSION_CATALOGO, None)
+    try:
+        await asyncio.to_thread(guardar_enriquecidos, modificados)
+    except Exception as e:
+        print(f"Error actualizando tanques en BD: {e}")
+    return enriquecidos
+
+
+async def _tanques_del_catalogo(*ids: str) -> List[dict]:
+    """
+    Copias de los tanques del catálogo en memoria (ya convertidos, con _id en str), sin
+    consultar MongoDB. 400 si algún id no es válido y 404 si alguno no existe.
+    """
+    if not all(ObjectId.is_valid(i) for i in ids):
+        raise HTTPException(status_code=400, detail="ID de MongoDB inválido")
+    catalogo = await obtener_catalogo_tanques()
+    if not all(i in catalogo.por_id for i in ids):
+        raise HTTPException(status_code=404, detail="Uno o ambos vehículos no fueron encontrados")
+    # Los del catálogo son compartidos: el enriquecimiento y los motores trabajan sobre copias,
+    # marcadas con la versión del catálogo para que la caché de perfiles no tenga que hashearlas
+    copias = [copy.deepcopy(catalogo.por_id[i]) for i in ids]
+    for copia in copias:
+        copia[CLAVE_VERSION_CATALOGO] = catalogo.version
+    return copias
+
+
+def _tanque_del_cliente(tanque: dict) -> dict:
+    """Tanque enviado en la petición: la versión del catálogo solo la pone el servidor."""
+    tanque = convertir_decimal128_recursivo(tanque)
+    tanque.pop(CLAVE_VERSION_CATALOGO, None)
     return tanque
 
 
-@app.post("/combate-ia/", response_model=CombateIAResponse)
-async def simular_combate_ia(request: CombateIARequest):
+async def _simular_duelo(request: SimulacionDueloRequest, modelo: str, limite: float) -> dict:
+    """Simulación numérica del duelo, guardada para narrarla después. Devuelve el documento del resultado."""
+    v1, v2 = await _tanques_del_catalogo(request.vehiculo1_id, request.vehiculo2_id)
+
+    # Con ENRIQUECIMIENTO_EN_PETICION, completar con IA los datos que falten
+    v1, v2 = await _enriquecer_en_peticion([v1, v2], modelo, limite)
+
+    # insert_one de pymongo es bloqueante aunque use w=0
+    await asyncio.to_thread(registrar_acceso, "duelo", [request.vehiculo1_id, request.vehiculo2_id], request.situacion)
+    resultado_mc = await asyncio.to_thread(
+        simular_duelo_escalonado,
+        v1, v2, request.situacion, fidelidad=request.fidelidad or "auto", trazas=request.trazas or 0,
+    )
+    return await asyncio.to_thread(
+        guardar_resultado,
+        "duelo",
+        request.situacion,
+        resultado_duelo_a_dict(resultado_mc),
+        [_contexto_narrativa(v1), _contexto_narrativa(v2)],
+    )
+
+
+def _validar_equipos(request: SimulacionEquiposRequest) -> None:
+    if not (1 <= len(request.equipo_aliado) <= EQUIPO_MAX_TANQUES):
+        raise HTTPException(status_code=400, detail=f"El equipo aliado debe tener entre 1 y {EQUIPO_MAX_TANQUES} tanques.")
+    if not (1 <= len(request.equipo_enemigo) <= EQUIPO_MAX_TANQUES):
+        raise HTTPException(status_code=400, detail=f"El equipo enemigo debe tener entre 1 y {EQUIPO_MAX_TANQUES} tanques.")
+    if not (0 <= request.tanque_usuario_index < len(request.equipo_aliado)):
+        raise HTTPException(status_code=400, detail="El índice del tanque del usuario no es válido.")
+
+
+async def _simular_equipos(request: SimulacionEquiposRequest, modelo: str, limite: float) -> dict:
+    """Simulación numérica de la batalla, guardada para narrarla después. Devuelve el documento del resultado."""
+    tanques = [_tanque_del_cliente(t) for t in request.equipo_aliado + request.equipo_enemigo]
+    tanques = await _enriquecer_en_peticion(tanques, modelo, limite)
+    aliados = tanques[:len(request.equipo_aliado)]
+    enemigos = tanques[len(request.equipo_aliado):]
+
+    usuario = aliados[request.tanque_usuario_index]
+
+    ids_equipos = [t.get("_id") for t in aliados + enemigos]
+    if all(ids_equipos):
+        await asyncio.to_thread(registrar_acceso, "equipos", ids_equipos, request.situacion)
+
+    resultado_mc = await asyncio.to_thread(
+        simular_equipos_monte_carlo,
+        aliados,
+        enemigos,
+        request.tanque_usuario_index,
+        request.situacion,
+    )
+    return await asyncio.to_thread(
+        guardar_resultado,
+        "equipos",
+        request.situacion,
+        resultado_equipos_a_dict(resultado_mc),
+        [_contexto_narrativa(usuario)],
+    )
+
+
+@app.post("/simulacion/duelo")
+async def simulacion_duelo(request: SimulacionDueloRequest):
     """
-    Simula un combate 1v1 con Monte Carlo + PyTorch y usa Gemini solo para redactar el análisis.
+    Resultado numérico de un duelo 1v1 (Monte Carlo + red neuronal), sin IA ni API Key.
+    La narrativa se pide aparte con GET /narrativa/{result_id}.
     """
-    if not GEMINI_API_KEY:
-        raise HTTPException(
-            status_code=500,
-            detail="La funcionalidad de IA no está configurada (falta API Key)"
-        )
+    try:
+        documento = await _simular_duelo(request, MODELO_IA_POR_DEFECTO, time.monotonic() + PETICION_IA_PLAZO_S)
+        return {"result_id": documento["_id"], **documento["resultado"]}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error en simulación de duelo: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al procesar la simulación: {str(e)}")
 
+
+@app.post("/simulacion/equipos")
+async def simulacion_equipos(request: SimulacionEquiposRequest):
+    """
+    Resultado numérico de una batalla de equipos, sin IA ni API Key.
+    La narrativa se pide aparte con GET /narrativa/{result_id}.
+    """
+    _validar_equipos(request)
     try:
-        v1 = tanks_collection.find_one({"_id": ObjectId(request.vehiculo1_id)})
-        v2 = tanks_collection.find_one({"_id": ObjectId(request.vehiculo2_id)})
+        documento = await _simular_equipos(request, MODELO_IA_POR_DEFECTO, time.monotonic() + PETICION_IA_PLAZO_S)
+        return {"result_id": documento["_id"], **documento["resultado"]}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error en simulación de equipos: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al procesar la simulación de equipos: {str(e)}")
 
-        if not v1 or not v2:
-            raise HTTPException(status_code=404, detail="Uno o ambos vehículos no fueron encontrados")
 
-        v1 = convertir_decimal128_recursivo(v1)
-        v2 = convertir_decimal128_recursivo(v2)
-        
-        # Procesar con IA si faltan datos y obtener el slope factor
-        modelo_a_usar = request.modelo if request.modelo else "gemini-3.5-flash-lite"
-        v1 = await _procesar_tanque_con_ia(v1, modelo_a_usar)
-        v2 = await _procesar_tanque_con_ia(v2, modelo_a_usar)
-        
-        v1["_id"] = str(v1["_id"])
-        v2["_id"] = str(v2["_id"])
+@app.get("/narrativa/{result_id}", response_model=NarrativaResponse)
+async def narrativa_simulacion(result_id: str, modelo: Optional[str] = None):
+    """
+    Narrativa de Gemini de un resultado de /simulacion/duelo o /simulacion/equipos.
+    Se genera la primera vez y después sale de la caché de narrativas.
+    """
+    limite = time.monotonic() + PETICION_IA_PLAZO_S
+    documento = await asyncio.to_thread(obtener_resultado, result_id)
+    if not documento:
+        raise HTTPException(status_code=404, detail="Resultado no encontrado o caducado")
 
-        resultado_mc = simular_duelo_monte_carlo(v1, v2, request.situacion)
-        resultado_sim = resultado_duelo_a_dict(resultado_mc)
+    modelo_a_usar = modelo or MODELO_IA_POR_DEFECTO
+    verificado = await _validar_modelo_ia(modelo_a_usar)
+    try:
+        narrativa = await _narrativa_resultado(documento, modelo_a_usar, limite, verificado)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error generando narrativa: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al generar la narrativa: {str(e)}")
 
-        modelo_a_usar = request.modelo if request.modelo else "gemini-3.5-flash-lite"
-        if not client_ai:
-            raise HTTPException(status_code=500, detail="El cliente de IA no está inicializado")
+    return NarrativaResponse(result_id=result_id, tipo=documento["tipo"], modelo=modelo_a_usar, **narrativa)
 
-        narrativa = _generar_analisis_duelo_gemini(
-            v1, v2, request.situacion, resultado_sim, modelo_a_usar
-        )
+
+@app.post("/combate-ia/", response_model=CombateIAResponse)
+async def simular_combate_ia(request: CombateIARequest):
+    """
+    Simula un combate 1v1 con Monte Carlo + PyTorch y usa Gemini solo para redactar el análisis.
+    Equivale a /simulacion/duelo seguido de /narrativa/{result_id}; sin API Key, narrativa de plantilla.
+    """
+    limite = time.monotonic() + PETICION_IA_PLAZO_S
+    try:
+        modelo_a_usar = request.modelo if request.modelo else MODELO_IA_POR_DEFECTO
+        verificado = await _validar_modelo_ia(modelo_a_usar)
+        documento = await _simular_duelo(request, modelo_a_usar if verificado else MODELO_IA_POR_DEFECTO, limite)
+        resultado_sim = documento["resultado"]
+        narrativa = await _narrativa_resultado(documento, modelo_a_usar, limite, verificado)
 
         return CombateIAResponse(
             ganador=resultado_sim["ganador"],
-            analisis=markdown.markdown(narrativa.get("analisis", "")),
-            puntos_clave=narrativa.get("puntos_clave", [])[:3] or [
+            analisis=narrativa["analisis"],
+            puntos_clave=narrativa["puntos_clave"] or [
                 f"Ganador calculado: {resultado_sim['ganador']} ({resultado_sim['prob_victoria_ganador_pct']:.1f}%)",
                 f"Distancia de combate: {resultado_sim['distancia_m']} m",
                 resultado_sim["resumen_tecnico"],
             ],
             detalles_aliados=[resultado_sim["vehiculo_1"]],
             detalles_enemigos=[resultado_sim["vehiculo_2"]],
-            datos_estimados_ia=True
+            datos_estimados_ia=True,
+            distribucion_ttk=resultado_sim["distribucion_ttk"],
+            distribucion_disparos_v1=resultado_sim.get("distribucion_disparos_v1"),
+            distribucion_disparos_v2=resultado_sim.get("distribucion_disparos_v2"),
+            metodo_simulacion=resultado_sim["metodo_simulacion"],
+            trace=resultado_sim.get("trace"),
+            version_modelo=resultado_sim["version_modelo"],
+            result_id=documento["_id"],
+            narrativa_plantilla=narrativa.get("narrativa_plantilla", False),
         )
 
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Error en combate IA: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error al procesar la simulación: {str(e)}")
@@ -1107,55 +1338,20 @@ async def simular_combate_ia(request: CombateIARequest):
 async def simular_combate_equipos_ia(request: SimulacionEquiposIARequest):
     """
     Simula combate de equipos con Monte Carlo + PyTorch y usa Gemini solo para la narrativa.
+    Equivale a /simulacion/equipos seguido de /narrativa/{result_id}; sin API Key, narrativa de plantilla.
     """
-    if not GEMINI_API_KEY:
-        raise HTTPException(
-            status_code=500,
-            detail="La funcionalidad de IA no está configurada (falta API Key)"
-        )
-
-    if not (1 <= len(request.equipo_aliado) <= 16):
-        raise HTTPException(status_code=400, detail="El equipo aliado debe tener entre 1 y 16 tanques.")
-    if not (1 <= len(request.equipo_enemigo) <= 16):
-        raise HTTPException(status_code=400, detail="El equipo enemigo debe tener entre 1 y 16 tanques.")
-    if not (0 <= request.tanque_usuario_index < len(request.equipo_aliado)):
-        raise HTTPException(status_code=400, detail="El índice del tanque del usuario no es válido.")
+    _validar_equipos(request)
 
+    limite = time.monotonic() + PETICION_IA_PLAZO_S
     try:
-        modelo_a_usar = request.modelo if request.modelo else "gemini-3.5-flash-lite"
-        
-        aliados = []
-        for t in request.equipo_aliado:
-            t = convertir_decimal128_recursivo(t)
-            t = await _procesar_tanque_con_ia(t, modelo_a_usar)
-            aliados.append(t)
-            
-        enemigos = []
-        for t in request.equipo_enemigo:
-            t = convertir_decimal128_recursivo(t)
-            t = await _procesar_tanque_con_ia(t, modelo_a_usar)
-            enemigos.append(t)
-            
-        usuario = aliados[request.tanque_usuario_index]
-
-        resultado_mc = simular_equipos_monte_carlo(
-            aliados,
-            enemigos,
-            request.tanque_usuario_index,
-            request.situacion,
-        )
-        resultado_sim = resultado_equipos_a_dict(resultado_mc)
-
-        modelo_a_usar = request.modelo if request.modelo else "gemini-3.5-flash-lite"
-        if not client_ai:
-            raise HTTPException(status_code=500, detail="El cliente de IA no está inicializado")
-
-        resultado_general_md = _generar_narrativa_equipos_gemini(
-            usuario, request.situacion, resultado_sim, modelo_a_usar
-        )
+        modelo_a_usar = request.modelo if request.modelo else MODELO_IA_POR_DEFECTO
+        verificado = await _validar_modelo_ia(modelo_a_usar)
+        documento = await _simular_equipos(request, modelo_a_usar if verificado else MODELO_IA_POR_DEFECTO, limite)
+        resultado_sim = documento["resultado"]
+        narrativa = await _narrativa_resultado(documento, modelo_a_usar, limite, verificado)
 
         return SimulacionEquiposIAResponse(
-            resultado_general=markdown.markdown(resultado_general_md),
+            resultado_general=narrativa["resultado_general"],
             probabilidad_victoria=resultado_sim["probabilidad_victoria"],
             enemigos_prioritarios=resultado_sim["enemigos_prioritarios"],
             enemigos_a_evitar=resultado_sim["enemigos_a_evitar"],
@@ -1164,7 +1360,12 @@ async def simular_combate_equipos_ia(request: SimulacionEquiposIARequest):
             mejores_companeros=resultado_sim["mejores_companeros"],
             detalles_aliados=resultado_sim.get("detalles_aliados", []),
             detalles_enemigos=resultado_sim.get("detalles_enemigos", []),
-            datos_estimados_ia=True
+            datos_estimados_ia=True,
+            distribucion_duracion=resultado_sim.get("distribucion_duracion"),
+            distribucion_disparos=resultado_sim.get("distribucion_disparos"),
+            version_modelo=resultado_sim.get("version_modelo"),
+            result_id=documento["_id"],
+            narrativa_plantilla=narrativa.get("narrativa_plantilla", False),
         )
 
     except HTTPException:
@@ -1174,5 +1375,89 @@ async def simular_combate_equipos_ia(request: SimulacionEquiposIARequest):
         raise HTTPException(status_code=500, detail=f"Error al procesar la simulación de equipos: {str(e)}")
 
 
+@app.post("/equipos/optimizar-lineup", response_model=OptimizarLineupResponse)
+async def optimizar_lineup_equipo(request: OptimizarLineupRequest):
+    """
+    Evalúa en un solo trabajo qué tanque del lineup del usuario da más probabilidad de
+    victoria contra un equipo enemigo conocido. No requiere IA.
+    """
+    if not (1 <= len(request.candidatos) <= LINEUP_MAX_CANDIDATOS):
+        raise HTTPException(status_code=400, detail=f"El lineup debe tener entre 1 y {LINEUP_MAX_CANDIDATOS} tanques.")
+    if len(request.equipo_aliado) + 1 > EQUIPO_MAX_TANQUES:
+        raise HTTPException(status_code=400, detail=f"El equipo aliado (incluido tu tanque) no puede superar {EQUIPO_MAX_TANQUES} tanques.")
+    if not (1 <= len(request.equipo_enemigo) <= EQUIPO_MAX_TANQUES):
+        raise HTTPException(status_code=400, detail=f"El equipo enemigo debe tener entre 1 y {EQUIPO_MAX_TANQUES} tanques.")
+
+    try:
+        candidatos = [_tanque_del_cliente(t) for t in request.candidatos]
+        aliados = [_tanque_del_cliente(t) for t in request.equipo_aliado]
+        enemigos = [_tanque_del_cliente(t) for t in request.equipo_enemigo]
+
+        # Successive halving con hasta `simulaciones` iteraciones: fuera del event loop
+        distancia, ranking = await asyncio.to_thread(
+            optimizar_lineup,
+            candidatos,
+            aliados,
+            enemigos,
+            request.situacion,
+            n_simulaciones=request.simulaciones or MC_EQUIPO_ITERACIONES,
+        )
+        return resultado_lineup_a_dict(distancia, ranking)
+
+    except ValueError as e:
+        # Datos de tanque o situación inválidos: error del cliente, no del servidor
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error optimizando lineup: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al optimizar el lineup: {str(e)}")
+
+
+@app.post("/duelos/sensibilidad")
+async def sensibilidad_duelo(request: SensibilidadDueloRequest):
+    """
+    Análisis "what-if" de un duelo: cuánto cambia la probabilidad de victoria del vehículo 1
+    al variar ligeramente su recarga, blindaje, penetración o velocidad. No requiere IA.
+    """
+    try:
+        v1, v2 = await _tanques_del_catalogo(request.vehiculo1_id, request.vehiculo2_id)
+
+        # 1 + 2·(estadísticas) bucles de Monte Carlo: fuera del event loop
+        return await asyncio.to_thread(
+            analizar_sensibilidad_duelo,
+            v1,
+            v2,
+            request.situacion,
+            estadisticas=request.estadisticas,
+            deltas=request.deltas,
+            n_simulaciones=request.simulaciones or MC_SENSIBILIDAD_ITERACIONES,
+        )
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error en análisis de sensibilidad: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al calcular la sensibilidad: {str(e)}")
+
+
+@app.post("/duelos/estimacion-rapida")
+async def estimacion_rapida(request: EstimacionDueloRequest):
+    """
+    Estimación instantánea de un duelo: modelo sustituto si COMBAT_SURROGATE_ACTIVADO=1 y el par
+    cae dentro de su distribución de entrenamiento; si no, Monte Carlo (campo "fuente").
+    """
+    try:
+        v1, v2 = await _tanques_del_catalogo(request.vehiculo1_id, request.vehiculo2_id)
+
+        return await asyncio.to_thread(estimacion_rapida_duelo, v1, v2, request.situacion)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error en estimación rápida: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al estimar el duelo: {str(e)}")
+
+
 # Para ejecutar la aplicación, usa en la terminal:
 # uvicorn main:app --reload
\ No newline at end of file
@@ -0,0 +1,136 @@
+"""
+Registro de modelos del motor de combate.
+
+Directorio con artefactos ONNX versionados y un manifiesto:
+
+    model_registry/
+        manifest.json          {"activo": "v1", "versiones": {"v1": {...}}}
+        v1/combat_model.onnx
+        v1/combat_model.onnx.data
+
+CombatSimulatorEngine vigila el manifiesto y cambia de sesión ONNX en caliente
+cuando cambia la versión activa (o con POST /admin/modelo/activar).
+
+Uso:
+    python model_registry.py registrar combat_model.onnx --version v2 --activar
+    python model_registry.py activar v1
+    python model_registry.py listar
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+REGISTRO_DIR = Path(os.getenv(
+    "COMBAT_MODEL_REGISTRY_DIR",
+    str(Path(__file__).resolve().parent / "model_registry"),
+))
+MANIFIESTO_PATH = REGISTRO_DIR / "manifest.json"
+
+
+def leer_manifiesto() -> Dict[str, Any]:
+    if not MANIFIESTO_PATH.exists():
+        return {"activo": None, "versiones": {}}
+    with open(MANIFIESTO_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _escribir_manifiesto(manifiesto: Dict[str, Any]) -> None:
+    """Escritura atómica: los lectores ven el manifiesto viejo o el nuevo, nunca uno a medias."""
+    REGISTRO_DIR.mkdir(parents=True, exist_ok=True)
+    temporal = MANIFIESTO_PATH.with_suffix(".json.tmp")
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, indent=2, ensure_ascii=False)
+    os.replace(temporal, MANIFIESTO_PATH)
+
+
+def mtime_manifiesto() -> Optional[float]:
+    try:
+        return MANIFIESTO_PATH.stat().st_mtime
+    except OSError:
+        return None
+
+
+def modelo_activo() -> Optional[Tuple[str, Path]]:
+    """(versión, ruta al .onnx) de la versión activa, o None si el registro está vacío."""
+    manifiesto = leer_manifiesto()
+    version = manifiesto.get("activo")
+    entrada = manifiesto.get("versiones", {}).get(version) if version else None
+    if not entrada:
+        return None
+    return version, REGISTRO_DIR / entrada["archivo"]
+
+
+def _sha256(ruta: Path) -> str:
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 16), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def registrar(origen: Path, version: str, descripcion: str = "", activar: bool = False) -> Dict[str, Any]:
+    """Copia un .onnx (y su .onnx.data si existe) al registro como una versión nueva."""
+    manifiesto = leer_manifiesto()
+    if version in manifiesto["versiones"]:
+        raise ValueError(f"La versión {version} ya existe en el registro")
+    if not origen.exists():
+        raise FileNotFoundError(origen)
+
+    destino_dir = REGISTRO_DIR / version
+    destino_dir.mkdir(parents=True, exist_ok=False)
+    shutil.copy2(origen, destino_dir / origen.name)
+    datos_externos = origen.with_name(origen.name + ".data")
+    if datos_externos.exists():
+        shutil.copy2(datos_externos, destino_dir / datos_externos.name)
+
+    entrada = {
+        "archivo": f"{version}/{origen.name}",
+        "sha256": _sha256(origen),
+        "descripcion": descripcion,
+        "registrado_en": datetime.now(timezone.utc).isoformat(),
+    }
+    manifiesto["versiones"][version] = entrada
+    if activar or not manifiesto.get("activo"):
+        manifiesto["activo"] = version
+    _escribir_manifiesto(manifiesto)
+    return entrada
+
+
+def activar(version: str) -> None:
+    manifiesto = leer_manifiesto()
+    if version not in manifiesto["versiones"]:
+        raise ValueError(f"Versión de modelo desconocida: {version}")
+    manifiesto["activo"] = version
+    _escribir_manifiesto(manifiesto)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gestiona el registro de modelos ONNX.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_reg = sub.add_parser("registrar")
+    p_reg.add_argument("ruta", type=Path)
+    p_reg.add_argument("--version", required=True)
+    p_reg.add_argument("--descripcion", default="")
+    p_reg.add_argument("--activar", action="store_true")
+    p_act = sub.add_parser("activar")
+    p_act.add_argument("version")
+    sub.add_parser("listar")
+    args = parser.parse_args()
+
+    if args.comando == "registrar":
+        print(json.dumps(registrar(args.ruta, args.version, args.descripcion, args.activar), indent=2))
+    elif args.comando == "activar":
+        activar(args.version)
+        print(f"Versión activa: {args.version}")
+    else:
+        print(json.dumps(leer_manifiesto(), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
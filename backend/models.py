@@ -1,6 +1,11 @@
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
+from bson import ObjectId
 from bson.decimal128 import Decimal128
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
+import math
+
+from combat_simulator import EQUIPO_MAX_TANQUES, LINEUP_MAX_CANDIDATOS
+from gemini_client import MODELO_IA_POR_DEFECTO
 
 # Paso 1: Definir el modelo para las municiones
 class Municion(BaseModel):
@@ -78,11 +83,15 @@ class TanqueDB(Tanque):
         # Permite que Pydantic trabaje con el campo "_id" de MongoDB
         populate_by_name = True
 
-class CombateIARequest(BaseModel):
+class SimulacionDueloRequest(BaseModel):
     vehiculo1_id: str
     vehiculo2_id: str
     situacion: str
-    modelo: Optional[str] = "gemini-3.1-flash-lite-preview"
+    fidelidad: Optional[str] = "auto"  # auto | completa
+    trazas: Optional[int] = Field(default=0, ge=0, le=20)  # iteraciones con registro disparo a disparo
+
+class CombateIARequest(SimulacionDueloRequest):
+    modelo: Optional[str] = MODELO_IA_POR_DEFECTO
 
 class CombateIAResponse(BaseModel):
     ganador: str
@@ -91,18 +100,28 @@ class CombateIAResponse(BaseModel):
     detalles_aliados: Optional[List[Dict[str, Any]]] = None
     detalles_enemigos: Optional[List[Dict[str, Any]]] = None
     datos_estimados_ia: Optional[bool] = False
+    distribucion_ttk: Optional[Dict[str, Any]] = None
+    distribucion_disparos_v1: Optional[Dict[str, Any]] = None  # disparos efectuados por cada vehículo
+    distribucion_disparos_v2: Optional[Dict[str, Any]] = None
+    metodo_simulacion: Optional[str] = None
+    trace: Optional[List[Dict[str, Any]]] = None
+    version_modelo: Optional[str] = None
+    result_id: Optional[str] = None
+    narrativa_plantilla: bool = False  # Gemini no llegó a tiempo: narrativa generada sin IA
 
 class ElementoAnalisis(BaseModel):
     nombre: str
     nacion: str
     razon: str
 
-class SimulacionEquiposIARequest(BaseModel):
+class SimulacionEquiposRequest(BaseModel):
     equipo_aliado: List[Dict]
     equipo_enemigo: List[Dict]
     tanque_usuario_index: int
     situacion: str
-    modelo: Optional[str] = "gemini-3.1-flash-lite"
+
+class SimulacionEquiposIARequest(SimulacionEquiposRequest):
+    modelo: Optional[str] = MODELO_IA_POR_DEFECTO
 
 class SimulacionEquiposIAResponse(BaseModel):
     resultado_general: str
@@ -114,4 +133,134 @@ class SimulacionEquiposIAResponse(BaseModel):
     mejores_companeros: List[ElementoAnalisis]
     detalles_aliados: Optional[List[Dict[str, Any]]] = None
     detalles_enemigos: Optional[List[Dict[str, Any]]] = None
-    datos_estimados_ia: Optional[bool] = False
\ No newline at end of file
+    datos_estimados_ia: Optional[bool] = False
+    distribucion_duracion: Optional[Dict[str, Any]] = None
+    distribucion_disparos: Optional[Dict[str, Any]] = None
+    version_modelo: Optional[str] = None
+    result_id: Optional[str] = None
+    narrativa_plantilla: bool = False
+
+class NarrativaResponse(BaseModel):
+    result_id: str
+    tipo: str  # duelo | equipos
+    modelo: str
+    analisis: Optional[str] = None  # duelo
+    puntos_clave: List[str] = []  # duelo
+    resultado_general: Optional[str] = None  # equipos
+    narrativa_plantilla: bool = False
+
+class OptimizarLineupRequest(BaseModel):
+    candidatos: List[Dict]
+    equipo_aliado: List[Dict] = []
+    equipo_enemigo: List[Dict]
+    situacion: str
+    simulaciones: Optional[int] = Field(default=None, ge=50, le=5000)
+
+class CandidatoLineupResultado(BaseModel):
+    posicion: int
+    indice: int
+    nombre: str
+    nacion: str
+    probabilidad_victoria: float
+    intervalo_confianza_95: List[float]
+    simulaciones: int
+    rondas_superadas: int
+
+class OptimizarLineupResponse(BaseModel):
+    distancia_m: int
+    mejor_candidato: Optional[str] = None
+    candidatos: List[CandidatoLineupResultado]
+    version_modelo: Optional[str] = None
+
+EstadisticaSensibilidad = Literal["recarga", "blindaje", "penetracion", "velocidad"]
+
+class SensibilidadDueloRequest(BaseModel):
+    vehiculo1_id: str
+    vehiculo2_id: str
+    situacion: str
+    estadisticas: Optional[List[EstadisticaSensibilidad]] = None  # velocidad se omite: el duelo no la usa
+    deltas: Optional[Dict[EstadisticaSensibilidad, float]] = None
+    simulaciones: Optional[int] = Field(default=None, ge=100, le=5000)
+
+    @field_validator('deltas')
+    @classmethod
+    def deltas_positivos(cls, v):
+        # Un delta de 0 dividiría por cero en el gradiente; uno negativo invierte su signo
+        if v:
+            for estadistica, delta in v.items():
+                if not (math.isfinite(delta) and delta > 0):
+                    raise ValueError(f"El delta de '{estadistica}' debe ser un número positivo")
+        return v
+
+class EstimacionDueloRequest(BaseModel):
+    vehiculo1_id: str
+    vehiculo2_id: str
+    situacion: str = "500m"
+
+class TrabajoSimulacionRequest(BaseModel):
+    tipo: str  # duelo | equipos | matriz_duelos | lineup
+    parametros: Dict[str, Any]  # se validan con PARAMETROS_TRABAJO[tipo] al encolar
+    prioridad: int = 0
+
+# Parámetros de cada tipo de trabajo, con los mismos límites que los endpoints síncronos
+class ParametrosTrabajo(BaseModel):
+    situacion: str
+
+    @model_validator(mode='after')
+    def ids_validos(self):
+        for campo, valor in self:
+            if campo.endswith('_ids') or campo.endswith('_id'):
+                ids = valor if isinstance(valor, list) else [valor]
+                if not all(ObjectId.is_valid(i) for i in ids):
+                    raise ValueError(f"ID de MongoDB inválido en '{campo}'")
+        return self
+
+class ParametrosTrabajoDuelo(ParametrosTrabajo):
+    vehiculo1_id: str
+    vehiculo2_id: str
+    simulaciones: Optional[int] = Field(default=None, ge=100, le=5000)
+    fidelidad: Optional[Literal["auto", "completa"]] = "auto"
+
+class ParametrosTrabajoEquipos(ParametrosTrabajo):
+    equipo_aliado_ids: List[str] = Field(min_length=1, max_length=EQUIPO_MAX_TANQUES)
+    equipo_enemigo_ids: List[str] = Field(min_length=1, max_length=EQUIPO_MAX_TANQUES)
+    tanque_usuario_index: int = Field(default=0, ge=0)
+    simulaciones: Optional[int] = Field(default=None, ge=50, le=5000)
+
+    @model_validator(mode='after')
+    def indice_usuario_valido(self):
+        if self.tanque_usuario_index >= len(self.equipo_aliado_ids):
+            raise ValueError("El índice del tanque del usuario no es válido.")
+        return self
+
+class ParametrosTrabajoMatrizDuelos(ParametrosTrabajo):
+    vehiculos_ids: List[str] = Field(min_length=2, max_length=EQUIPO_MAX_TANQUES)
+    simulaciones: Optional[int] = Field(default=None, ge=50, le=5000)
+    metodo: Optional[Literal["monte_carlo", "analitico"]] = "monte_carlo"
+
+class ParametrosTrabajoLineup(ParametrosTrabajo):
+    candidatos_ids: List[str] = Field(min_length=1, max_length=LINEUP_MAX_CANDIDATOS)
+    equipo_aliado_ids: List[str] = Field(default=[], max_length=EQUIPO_MAX_TANQUES - 1)  # + el candidato
+    equipo_enemigo_ids: List[str] = Field(min_length=1, max_length=EQUIPO_MAX_TANQUES)
+    simulaciones: Optional[int] = Field(default=None, ge=50, le=5000)
+
+PARAMETROS_TRABAJO: Dict[str, type[ParametrosTrabajo]] = {
+    "duelo": ParametrosTrabajoDuelo,
+    "equipos": ParametrosTrabajoEquipos,
+    "matriz_duelos": ParametrosTrabajoMatrizDuelos,
+    "lineup": ParametrosTrabajoLineup,
+}
+
+class ActivarModeloRequest(BaseModel):
+    version: Optional[str] = None  # None = recargar la versión activa del registro
+
+# Esquema de respuesta de Gemini para completar los datos de un tanque en una sola llamada
+class EstimacionMunicionIA(BaseModel):
+    id: int  # índice de la munición en el prompt
+    masa_total: float  # kg
+    velocidad_bala: float  # m/s
+    masa_explosivo: float  # g
+
+class EstimacionTanqueIA(BaseModel):
+    slope_factor: Optional[float] = None
+    municiones: List[EstimacionMunicionIA] = []
@@ -0,0 +1,153 @@
+"""
+Resultados de simulación pendientes de narrar y caché de narrativas de Gemini.
+
+/simulacion/duelo y /simulacion/equipos guardan su resultado en la colección
+"resultados_simulacion" bajo un result_id, hash de (tipo, situación, contexto de
+los tanques, resultado_sim canonicalizado), y /narrativa/{result_id} lo narra
+más tarde. Caducan a los RESULTADO_TTL_S segundos.
+
+La narrativa es función pura de (result_id, modelo), así que se guarda ya
+renderizada a HTML bajo esa clave: una petición repetida se ahorra la llamada al
+modelo y markdown.markdown. Dos niveles:
+    - LRU en memoria del proceso (NARRATIVA_CACHE_MAX entradas)
+    - colección "narrativas" de MongoDB, compartida entre réplicas, con índice TTL
+
+Ambos caducan a los NARRATIVA_CACHE_TTL_S segundos.
+"""
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from database import get_db
+from combat_simulator import _CacheLRU
+
+RESULTADOS_COLECCION = "resultados_simulacion"
+RESULTADO_TTL_S = int(os.getenv("RESULTADO_TTL_S", str(24 * 3600)))
+NARRATIVAS_COLECCION = "narrativas"
+NARRATIVA_CACHE_TTL_S = int(os.getenv("NARRATIVA_CACHE_TTL_S", str(7 * 24 * 3600)))
+NARRATIVA_CACHE_MAX = int(os.getenv("NARRATIVA_CACHE_MAX", "256"))
+
+_cache_narrativas = _CacheLRU(NARRATIVA_CACHE_MAX)
+_aciertos_mongo = 0
+
+
+def _canonicalizar(dato: Any) -> Any:
+    """Redondea floats para que ruido numérico irrelevante no cambie la clave."""
+    if isinstance(dato, float):
+        return round(dato, 2)
+    if isinstance(dato, dict):
+        return {str(k): _canonicalizar(v) for k, v in dato.items()}
+    if isinstance(dato, (list, tuple)):
+        return [_canonicalizar(v) for v in dato]
+    return dato
+
+
+def huella_resultado(
+    tipo: str,
+    situacion: str,
+    resultado_sim: Dict[str, Any],
+    contexto: Optional[List[Any]] = None,
+) -> str:
+    """result_id: todo lo que entra en el prompt de la narrativa salvo el modelo."""
+    entrada = {
+        "tipo": tipo,
+        "situacion": situacion.strip(),
+        "contexto": contexto or [],
+        "resultado": resultado_sim,
+    }
+    serializado = json.dumps(_canonicalizar(entrada), sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(serializado.encode("utf-8")).hexdigest()
+
+
+def clave_narrativa(result_id: str, modelo: str) -> str:
+    return f"{result_id}:{modelo}"
+
+
+def asegurar_indices_narrativas() -> None:
+    get_db()[RESULTADOS_COLECCION].create_index("expira_en", expireAfterSeconds=0)
+    get_db()[NARRATIVAS_COLECCION].create_index("expira_en", expireAfterSeconds=0)
+
+
+def guardar_resultado(
+    tipo: str,
+    situacion: str,
+    resultado_sim: Dict[str, Any],
+    contexto: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    Guarda el resultado para narrarlo después y lo devuelve como documento (con result_id).
+    Si Mongo falla el documento se devuelve igual: la narrativa en la misma petición sigue funcionando.
+    """
+    result_id = huella_resultado(tipo, situacion, resultado_sim, contexto)
+    documento = {
+        "tipo": tipo,
+        "situacion": situacion,
+        "resultado": resultado_sim,
+        "contexto": contexto,
+        "expira_en": datetime.now(timezone.utc) + timedelta(seconds=RESULTADO_TTL_S),
+    }
+    try:
+        get_db()[RESULTADOS_COLECCION].replace_one({"_id": result_id}, documento, upsert=True)
+    except Exception as e:
+        print(f"Advertencia: no se pudo guardar el resultado de la simulación: {e}")
+    return {"_id": result_id, **documento}
+
+
+def obtener_resultado(result_id: str) -> Optional[Dict[str, Any]]:
+    return get_db()[RESULTADOS_COLECCION].find_one({
+        "_id": result_id,
+        "expira_en": {"$gt": datetime.now(timezone.utc)},
+    })
+
+
+def obtener_narrativa(clave: str) -> Optional[Dict[str, Any]]:
+    global _aciertos_mongo
+    entrada = _cache_narrativas.get(clave)
+    if entrada is not None:
+        expira, narrativa = entrada
+        if expira > time.time():
+            return narrativa
+
+    try:
+        documento = get_db()[NARRATIVAS_COLECCION].find_one({
+            "_id": clave,
+            # el monitor TTL de Mongo borra con hasta ~60 s de retraso
+            "expira_en": {"$gt": datetime.now(timezone.utc)},
+        })
+    except Exception as e:
+        print(f"Advertencia: no se pudo leer la caché de narrativas: {e}")
+        return None
+    if not documento:
+        return None
+
+    _aciertos_mongo += 1
+    expira_en = documento["expira_en"]
+    if expira_en.tzinfo is None:
+        expira_en = expira_en.replace(tzinfo=timezone.utc)
+    _cache_narrativas.put(clave, (expira_en.timestamp(), documento["narrativa"]))
+    return documento["narrativa"]
+
+
+def guardar_narrativa(clave: str, narrativa: Dict[str, Any], modelo: str) -> None:
+    expira_en = datetime.now(timezone.utc) + timedelta(seconds=NARRATIVA_CACHE_TTL_S)
+    _cache_narrativas.put(clave, (expira_en.timestamp(), narrativa))
+    try:
+        get_db()[NARRATIVAS_COLECCION].replace_one(
+            {"_id": clave},
+            {"narrativa": narrativa, "modelo": modelo, "expira_en": expira_en},
+            upsert=True,
+        )
+    except Exception as e:
+        print(f"Advertencia: no se pudo guardar la narrativa en caché: {e}")
+
+
+def metricas_narrativas() -> Dict[str, Any]:
+    return {
+        **_cache_narrativas.estadisticas(),
+        "aciertos_mongo": _aciertos_mongo,
+        "ttl_s": NARRATIVA_CACHE_TTL_S,
+    }
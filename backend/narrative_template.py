@@ -0,0 +1,135 @@
+"""
+Narrativa de plantilla para cuando Gemini no está configurado, no llega a tiempo o el
+cortocircuito está abierto.
+
+Se construye solo con lo que ya calculó la simulación (resumen_tecnico, los duelos
+del usuario contra cada enemigo y las listas de clasificación), sin llamadas de
+red, así que cuesta microsegundos y acota la latencia de los endpoints con IA.
+Es determinista: el mismo resultado produce siempre el mismo texto. Devuelve la
+misma forma que la narrativa de Gemini, ya renderizada a HTML.
+"""
+
+import threading
+from typing import Any, Dict, List
+
+import markdown
+
+_lock_metricas = threading.Lock()
+_metricas = {"plazo": 0, "circuito": 0, "error": 0, "sin_clave": 0, "sin_catalogo": 0}
+
+
+def registrar_plantilla(motivo: str) -> None:
+    """motivo: plazo (Gemini no respondió a tiempo), circuito (abierto), error o sin_clave (sin GEMINI_API_KEY)."""
+    with _lock_metricas:
+        _metricas[motivo] += 1
+
+
+def metricas_plantillas() -> Dict[str, int]:
+    with _lock_metricas:
+        return {**_metricas, "total": sum(_metricas.values())}
+
+
+def _lista_clasificacion(titulo: str, elementos: List[Dict[str, Any]]) -> List[str]:
+    if not elementos:
+        return []
+    lineas = [f"### {titulo}", ""]
+    lineas += [f"- **{e['nombre']}** ({e['nacion']}): {e['razon']}" for e in elementos]
+    return lineas + [""]
+
+
+def _linea_vehiculo(detalle: Dict[str, Any]) -> str:
+    municion = detalle.get("municion_optima") or {}
+    return (
+        f"- **{detalle.get('nombre')}** ({detalle.get('nacion')}): "
+        f"{municion.get('nombre', 'N/A')} ({municion.get('tipo', 'N/A')}, "
+        f"{municion.get('penetracion_mm', 0):.0f} mm de penetración), "
+        f"blindaje efectivo {detalle.get('blindaje_efectivo_mm', 0):.0f} mm, "
+        f"un disparo cada {detalle.get('intervalo_disparo_s', 0):.1f} s, "
+        f"{detalle.get('velocidad_kmh') or 'N/A'} km/h"
+    )
+
+
+def _frase_probabilidad(resultado_sim: Dict[str, Any]) -> str:
+    """El solver analítico da la probabilidad exacta; Monte Carlo la frecuencia sobre sus iteraciones."""
+    if resultado_sim.get("metodo_simulacion") == "analitico":
+        return f"gana con una probabilidad del {resultado_sim['prob_victoria_ganador_pct']:.1f}% según el solver analítico"
+    return (
+        f"gana el {resultado_sim['prob_victoria_ganador_pct']:.1f}% de las "
+        f"{resultado_sim['simulaciones_monte_carlo']} simulaciones"
+    )
+
+
+def plantilla_duelo(resultado_sim: Dict[str, Any]) -> Dict[str, Any]:
+    v1, v2 = resultado_sim["vehiculo_1"], resultado_sim["vehiculo_2"]
+    ganador = resultado_sim["ganador"]
+    lineas = [
+        "## Análisis del duelo",
+        "",
+        resultado_sim["resumen_tecnico"],
+        "",
+        f"**{ganador}** {_frase_probabilidad(resultado_sim)} a {resultado_sim['distancia_m']} m, "
+        f"con un tiempo medio hasta la victoria de {resultado_sim['tiempo_medio_victoria_s']:.1f} s.",
+        "",
+        "### Vehículos",
+        "",
+        _linea_vehiculo(v1),
+        _linea_vehiculo(v2),
+    ]
+    perdedor = v2 if v1.get("nombre") == ganador else v1
+    vencedor = v1 if perdedor is v2 else v2
+    return {
+        "analisis": markdown.markdown("\n".join(lineas)),
+        "puntos_clave": [
+            f"Ganador calculado: {ganador} ({resultado_sim['prob_victoria_ganador_pct']:.1f}%)",
+            f"Munición óptima de {vencedor.get('nombre')}: "
+            f"{(vencedor.get('municion_optima') or {}).get('nombre', 'N/A')}",
+            f"Blindaje efectivo: {vencedor.get('blindaje_efectivo_mm', 0):.0f} mm frente a "
+            f"{perdedor.get('blindaje_efectivo_mm', 0):.0f} mm",
+        ],
+    }
+
+
+def plantilla_equipos(resultado_sim: Dict[str, Any], usuario: Dict[str, Any]) -> Dict[str, Any]:
+    lineas = [
+        "## Desarrollo de la batalla",
+        "",
+        resultado_sim["resumen_batalla"],
+        "",
+    ]
+
+    # Los enemigos repetidos comparten el mismo duelo: uno por tipo
+    duelos, vistos = [], set()
+    for duelo in resultado_sim.get("duelos_usuario_vs_enemigos") or []:
+        if duelo and duelo["enemigo"] not in vistos:
+            vistos.add(duelo["enemigo"])
+            duelos.append(duelo)
+    if duelos:
+        lineas += [f"### {usuario.get('nombre')} contra cada enemigo", ""]
+        for duelo in sorted(duelos, key=lambda d: -d["prob_usuario_gana"]):
+            penetracion = (
+                "se penetran mutuamente" if duelo["puede_usuario_penetrar"] and duelo["puede_enemigo_penetrar"]
+                else "solo penetra el usuario" if duelo["puede_usuario_penetrar"]
+                else "solo penetra el enemigo" if duelo["puede_enemigo_penetrar"]
+                else "ninguno penetra con garantías"
+            )
+            cantidad = f" ×{duelo['cantidad']}" if duelo.get("cantidad", 1) > 1 else ""
+            lineas.append(
+                f"- **{duelo['enemigo']}**{cantidad} ({duelo['nacion']}): "
+                f"{duelo['prob_usuario_gana'] * 100:.0f}% a favor con {duelo['municion_usuario']}; "
+                f"{penetracion}"
+            )
+        lineas.append("")
+
+    lineas += _lista_clasificacion("Enemigos prioritarios", resultado_sim.get("enemigos_prioritarios"))
+    lineas += _lista_clasificacion("Enemigos a evitar", resultado_sim.get("enemigos_a_evitar"))
+    lineas += _lista_clasificacion("Más dañinos", resultado_sim.get("mas_daninos"))
+    lineas += _lista_clasificacion("Mejores compañeros", resultado_sim.get("mejores_companeros"))
+    return {"resultado_general": markdown.markdown("\n".join(lineas))}
+
+
+def narrativa_plantilla(documento: Dict[str, Any]) -> Dict[str, Any]:
+    """Narrativa de un resultado guardado en narrative_cache, sin IA."""
+    if documento["tipo"] == "duelo":
+        return plantilla_duelo(documento["resultado"])
+    (usuario,) = documento["contexto"]
+    return plantilla_equipos(documento["resultado"], usuario)
@@ -8,6 +8,8 @@ from auth import obtener_usuario_activo_actual
 from user_models import UsuarioEnDB
 from pending_changes_models import CambioPendiente, RespuestaRevision
 from database import get_db
+from document_diff import aplicar_diff
+from tank_catalog import marcar_catalogo_modificado
 
 router = APIRouter(prefix="/cambios-pendientes", tags=["Cambios Pendientes"])
 
@@ -200,11 +202,11 @@ async def revisar_cambio(
                 tanques_collection.insert_one(cambio["datos_nuevos"])
                 
             elif cambio["tipo_operacion"] == "actualizar":
-                # Actualizar tanque existente
-                tanques_collection.update_one(
-                    {"_id": ObjectId(cambio["tanque_id"])},
-                    {"$set": cambio["datos_nuevos"]}
-                )
+                # Actualizar tanque existente (solo los campos que cambian)
+                filtro = {"_id": ObjectId(cambio["tanque_id"])}
+                tanque_actual = tanques_collection.find_one(filtro)
+                if tanque_actual:
+                    aplicar_diff(tanques_collection, filtro, tanque_actual, cambio["datos_nuevos"])
                 
             elif cambio["tipo_operacion"] == "eliminar":
                 # Eliminar tanque
@@ -212,6 +214,7 @@ async def revisar_cambio(
                     {"_id": ObjectId(cambio["tanque_id"])}
                 )
             
+            marcar_catalogo_modificado()
             nuevo_estado = "aprobado"
             mensaje = "Cambio aprobado y aplicado exitosamente"
             
@@ -0,0 +1,52 @@
+# simulation_jobs_routes.py
+import asyncio
+
+from fastapi import APIRouter, HTTPException
+from bson import ObjectId
+from pydantic import ValidationError
+
+from models import TrabajoSimulacionRequest
+from simulation_worker import EJECUTORES, crear_trabajo, obtener_trabajo
+
+router = APIRouter(prefix="/trabajos", tags=["Trabajos de simulación"])
+
+
+# ====================================================================
+# 1. ENCOLAR TRABAJO (lo ejecuta cualquier simulation_worker.py)
+# ====================================================================
+
+@router.post("/", status_code=202)
+async def encolar_trabajo(request: TrabajoSimulacionRequest):
+    """
+    Encola una simulación pesada (duelo, equipos, matriz_duelos o lineup) para que
+    la ejecute un worker. Consulta el resultado con GET /trabajos/{id}.
+    """
+    if request.tipo not in EJECUTORES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Tipo de trabajo desconocido. Opciones: {', '.join(EJECUTORES)}"
+        )
+    try:
+        trabajo_id = await asyncio.to_thread(
+            crear_trabajo, request.tipo, request.parametros, request.prioridad
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    return {"id": trabajo_id, "estado": "pendiente"}
+
+
+# ====================================================================
+# 2. CONSULTAR TRABAJO
+# ====================================================================
+
+@router.get("/{trabajo_id}")
+async def consultar_trabajo(trabajo_id: str):
+    if not ObjectId.is_valid(trabajo_id):
+        raise HTTPException(status_code=400, detail="ID de MongoDB inválido")
+
+    trabajo = await asyncio.to_thread(obtener_trabajo, trabajo_id)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+
+    trabajo["_id"] = str(trabajo["_id"])
+    return trabajo
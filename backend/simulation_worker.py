@@ -0,0 +1,319 @@
+"""
+WORKER DE SIMULACIONES
+======================
+Proceso independiente que reclama trabajos de simulación de la colección
+'jobs' de MongoDB, los ejecuta con el motor de combate y escribe el resultado.
+Se pueden lanzar tantos workers como se quiera (en varias máquinas o con
+`docker compose up --scale worker=N`): cada trabajo se reclama de forma atómica
+con find_one_and_update y queda en "lease" mientras el worker envía latidos.
+Si un worker muere, su lease caduca y otro worker retoma el trabajo.
+
+Ciclo de vida de un trabajo:
+    pendiente -> en_curso -> completado
+                          -> pendiente (fallo con reintentos) -> ... -> error
+
+Uso:
+    python simulation_worker.py
+"""
+
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+from database import cargar_tanques, get_jobs_collection
+from models import PARAMETROS_TRABAJO
+from combat_simulator import (
+    MC_DUELO_ITERACIONES,
+    MC_EQUIPO_ITERACIONES,
+    MC_PAREJA_ITERACIONES,
+    optimizar_lineup,
+    resultado_duelo_a_dict,
+    resultado_equipos_a_dict,
+    resultado_lineup_a_dict,
+    simular_duelo_escalonado,
+    simular_duelo_monte_carlo,
+    simular_equipos_monte_carlo,
+)
+
+WORKER_LEASE_S = float(os.getenv("WORKER_LEASE_S", "60"))
+WORKER_POLL_S = float(os.getenv("WORKER_POLL_S", "2"))
+WORKER_MAX_INTENTOS = int(os.getenv("WORKER_MAX_INTENTOS", "3"))
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+ESTADOS_TRABAJO = ("pendiente", "en_curso", "completado", "error")
+
+
+def _ahora() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# ====================================================================
+# COLA: operaciones sobre la colección 'jobs'
+# ====================================================================
+
+def crear_indices(jobs=None) -> None:
+    jobs = jobs if jobs is not None else get_jobs_collection()
+    jobs.create_index([("estado", ASCENDING), ("prioridad", DESCENDING), ("creado_en", ASCENDING)])
+    jobs.create_index([("estado", ASCENDING), ("lease_hasta", ASCENDING)])
+
+
+def crear_trabajo(tipo: str, parametros: Dict[str, Any], prioridad: int = 0, jobs=None) -> str:
+    """
+    Valida los parámetros con el modelo de su tipo (pydantic.ValidationError, que es un
+    ValueError, si no cumplen los límites), encola el trabajo y devuelve su id.
+    """
+    if tipo not in EJECUTORES:
+        raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+    parametros = PARAMETROS_TRABAJO[tipo].model_validate(parametros).model_dump()
+    jobs = jobs if jobs is not None else get_jobs_collection()
+    resultado = jobs.insert_one({
+        "tipo": tipo,
+        "parametros": parametros,
+        "prioridad": prioridad,
+        "estado": "pendiente",
+        "intentos": 0,
+        "creado_en": _ahora(),
+        "worker": None,
+        "lease_hasta": None,
+        "resultado": None,
+        "error": None,
+    })
+    return str(resultado.inserted_id)
+
+
+def reclamar_trabajo(worker_id: str = WORKER_ID, jobs=None) -> Optional[Dict[str, Any]]:
+    """
+    Reclama de forma atómica el siguiente trabajo pendiente (o uno cuyo lease haya caducado).
+    Devuelve el documento ya marcado como 'en_curso' para este worker, o None.
+    """
+    jobs = jobs if jobs is not None else get_jobs_collection()
+    ahora = _ahora()
+    return jobs.find_one_and_update(
+        {
+            "$or": [
+                {"estado": "pendiente"},
+                {"estado": "en_curso", "lease_hasta": {"$lt": ahora}},
+            ],
+            "intentos": {"$lt": WORKER_MAX_INTENTOS},
+        },
+        {
+            "$set": {
+                "estado": "en_curso",
+                "worker": worker_id,
+                "iniciado_en": ahora,
+                "latido_en": ahora,
+                "lease_hasta": ahora + timedelta(seconds=WORKER_LEASE_S),
+            },
+            "$inc": {"intentos": 1},
+        },
+        sort=[("prioridad", DESCENDING), ("creado_en", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def renovar_lease(trabajo_id: ObjectId, worker_id: str = WORKER_ID, jobs=None) -> bool:
+    """Latido: extiende el lease. False si el trabajo ya no pertenece a este worker."""
+    jobs = jobs if jobs is not None else get_jobs_collection()
+    ahora = _ahora()
+    resultado = jobs.update_one(
+        {"_id": trabajo_id, "worker": worker_id, "estado": "en_curso"},
+        {"$set": {"latido_en": ahora, "lease_hasta": ahora + timedelta(seconds=WORKER_LEASE_S)}},
+    )
+    return resultado.modified_count == 1
+
+
+def completar_trabajo(trabajo_id: ObjectId, resultado: Any, worker_id: str = WORKER_ID, jobs=None) -> bool:
+    """Escribe el resultado solo si el worker sigue teniendo el lease."""
+    jobs = jobs if jobs is not None else get_jobs_collection()
+    actualizado = jobs.update_one(
+        {"_id": trabajo_id, "worker": worker_id, "estado": "en_curso"},
+        {"$set": {
+            "estado": "completado",
+            "resultado": resultado,
+            "error": None,
+            "completado_en": _ahora(),
+            "lease_hasta": None,
+        }},
+    )
+    return actualizado.modified_count == 1
+
+
+def fallar_trabajo(
+    trabajo: Dict[str, Any],
+    error: str,
+    definitivo: bool = False,
+    worker_id: str = WORKER_ID,
+    jobs=None,
+) -> None:
+    """Devuelve el trabajo a la cola o lo marca como 'error' si agotó los intentos (o no tiene arreglo)."""
+    jobs = jobs if jobs is not None else get_jobs_collection()
+    definitivo = definitivo or trabajo.get("intentos", 0) >= WORKER_MAX_INTENTOS
+    jobs.update_one(
+        {"_id": trabajo["_id"], "worker": worker_id, "estado": "en_curso"},
+        {"$set": {
+            "estado": "error" if definitivo else "pendiente",
+            "error": error,
+            "lease_hasta": None,
+            "worker": worker_id if definitivo else None,
+        }},
+    )
+
+
+def cerrar_trabajos_abandonados(jobs=None) -> int:
+    """Marca como 'error' los trabajos con lease caducado que ya agotaron sus intentos."""
+    jobs = jobs if jobs is not None else get_jobs_collection()
+    resultado = jobs.update_many(
+        {"estado": "en_curso", "lease_hasta": {"$lt": _ahora()}, "intentos": {"$gte": WORKER_MAX_INTENTOS}},
+        {"$set": {"estado": "error", "error": "Lease caducado tras agotar los intentos", "lease_hasta": None}},
+    )
+    return resultado.modified_count
+
+
+def obtener_trabajo(trabajo_id: str, jobs=None) -> Optional[Dict[str, Any]]:
+    jobs = jobs if jobs is not None else get_jobs_collection()
+    return jobs.find_one({"_id": ObjectId(trabajo_id)})
+
+
+# ====================================================================
+# EJECUTORES: un tipo de trabajo -> función del motor de combate
+# ====================================================================
+
+def _ejecutar_duelo(p: Dict[str, Any]) -> Dict[str, Any]:
+    v1, v2 = cargar_tanques([p["vehiculo1_id"], p["vehiculo2_id"]])
+    resultado = simular_duelo_escalonado(
+        v1, v2, p["situacion"],
+        n_simulaciones=p.get("simulaciones") or MC_DUELO_ITERACIONES,
+        fidelidad=p.get("fidelidad") or "auto",
+    )
+    return resultado_duelo_a_dict(resultado)
+
+
+def _ejecutar_equipos(p: Dict[str, Any]) -> Dict[str, Any]:
+    aliados = cargar_tanques(p["equipo_aliado_ids"])
+    enemigos = cargar_tanques(p["equipo_enemigo_ids"])
+    resultado = simular_equipos_monte_carlo(
+        aliados, enemigos, p.get("tanque_usuario_index", 0), p["situacion"],
+        n_simulaciones=p.get("simulaciones") or MC_EQUIPO_ITERACIONES,
+    )
+    return resultado_equipos_a_dict(resultado)
+
+
+def _ejecutar_matriz_duelos(p: Dict[str, Any]) -> Dict[str, Any]:
+    """Probabilidad de victoria de cada vehículo (fila) contra cada otro (columna)."""
+    tanques = cargar_tanques(p["vehiculos_ids"])
+    n = p.get("simulaciones") or MC_PAREJA_ITERACIONES
+    metodo = p.get("metodo") or "monte_carlo"
+    matriz = [[None] * len(tanques) for _ in tanques]
+    for i in range(len(tanques)):
+        for j in range(i + 1, len(tanques)):
+            resultado = simular_duelo_monte_carlo(tanques[i], tanques[j], p["situacion"], n, metodo=metodo)
+            matriz[i][j] = round(resultado.prob_victoria_v1, 4)
+            matriz[j][i] = round(resultado.prob_victoria_v2, 4)
+    return {
+        "vehiculos": [t.get("nombre") for t in tanques],
+        "situacion": p["situacion"],
+        "metodo_simulacion": metodo,
+        "prob_victoria": matriz,
+    }
+
+
+def _ejecutar_lineup(p: Dict[str, Any]) -> Dict[str, Any]:
+    candidatos = cargar_tanques(p["candidatos_ids"])
+    aliados = cargar_tanques(p.get("equipo_aliado_ids") or [])
+    enemigos = cargar_tanques(p["equipo_enemigo_ids"])
+    distancia, ordenados = optimizar_lineup(
+        candidatos, aliados, enemigos, p["situacion"],
+        n_simulaciones=p.get("simulaciones") or MC_EQUIPO_ITERACIONES,
+    )
+    return resultado_lineup_a_dict(distancia, ordenados)
+
+
+EJECUTORES: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "duelo": _ejecutar_duelo,
+    "equipos": _ejecutar_equipos,
+    "matriz_duelos": _ejecutar_matriz_duelos,
+    "lineup": _ejecutar_lineup,
+}
+
+
+# ====================================================================
+# BUCLE DEL WORKER
+# ====================================================================
+
+def _latidos(trabajo_id: ObjectId, parar: threading.Event, perdido: threading.Event) -> None:
+    while not parar.wait(WORKER_LEASE_S / 3):
+        if not renovar_lease(trabajo_id):
+            perdido.set()
+            return
+
+
+def procesar_trabajo(trabajo: Dict[str, Any]) -> None:
+    parar = threading.Event()
+    perdido = threading.Event()
+    latidos = threading.Thread(target=_latidos, args=(trabajo["_id"], parar, perdido), daemon=True)
+    latidos.start()
+    inicio = time.time()
+    try:
+        resultado = EJECUTORES[trabajo["tipo"]](trabajo.get("parametros") or {})
+        parar.set()
+        latidos.join()
+        if perdido.is_set() or not completar_trabajo(trabajo["_id"], resultado):
+            print(f"⚠️ Lease perdido para {trabajo['_id']}; otro worker lo retomará")
+        else:
+            print(f"✅ {trabajo['tipo']} {trabajo['_id']} completado en {time.time() - inicio:.1f}s")
+    except (ValueError, KeyError) as e:
+        # Parámetros inválidos: reintentar no cambiaría nada
+        parar.set()
+        latidos.join()
+        print(f"❌ Parámetros inválidos en {trabajo['tipo']} {trabajo['_id']}: {e!r}")
+        fallar_trabajo(trabajo, f"Parámetros inválidos: {e!r}", definitivo=True)
+    except Exception as e:
+        parar.set()
+        latidos.join()
+        print(f"❌ Error en {trabajo['tipo']} {trabajo['_id']}: {e}")
+        traceback.print_exc()
+        fallar_trabajo(trabajo, str(e))
+
+
+def main() -> None:
+    print("=" * 60)
+    print(f"🛠️ WORKER DE SIMULACIONES {WORKER_ID}")
+    print("=" * 60)
+
+    detener = threading.Event()
+
+    def manejar_señal(sig, frame):
+        print("\n⚠️ Señal de terminación recibida. Terminando el trabajo en curso...")
+        detener.set()
+
+    signal.signal(signal.SIGINT, manejar_señal)
+    signal.signal(signal.SIGTERM, manejar_señal)
+
+    crear_indices()
+    while not detener.is_set():
+        trabajo = reclamar_trabajo()
+        if trabajo is None:
+            cerrar_trabajos_abandonados()
+            detener.wait(WORKER_POLL_S)
+            continue
+        if trabajo.get("tipo") not in EJECUTORES:
+            fallar_trabajo(trabajo, f"Tipo de trabajo desconocido: {trabajo.get('tipo')}", definitivo=True)
+            continue
+        print(f"▶️ {trabajo['tipo']} {trabajo['_id']} (intento {trabajo['intentos']})")
+        procesar_trabajo(trabajo)
+
+    print("✅ Worker detenido")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Catálogo de tanques en memoria para los endpoints de lectura.
+
+GET /tanques/, /stats, /top y la búsqueda por nombre del bot recorrían la
+colección entera (~1.200 documentos), la ordenaban y convertían los Decimal128
+en cada petición. Ahora se sirven de una instantánea inmutable del proceso:
+tanques ya convertidos y ordenados, índices por id, nación y nombre, y el JSON
+de GET /tanques/ ya serializado.
+
+La instantánea lleva la versión del catálogo, un contador en MongoDB (colección
+"catalogos", documento "version_tanques") que incrementa cada escritura sobre los
+tanques con marcar_catalogo_modificado(), también desde los procesos offline. Al
+leer:
+    - si este proceso ha escrito, se recarga antes de responder
+    - si no, cada CATALOGO_TANQUES_COMPROBAR_S segundos se lee el contador y,
+      si ha cambiado (otra réplica o actualizar_datos.py), se recarga
+
+La recarga construye una instantánea nueva y la sustituye de una vez; quien
+ya tenía la anterior la sigue usando entera. Los tanques de la instantánea son
+compartidos: no se modifican (copy.deepcopy si hace falta).
+"""
+
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from pymongo import ReturnDocument
+
+from database import convertir_decimal128_recursivo, get_db, get_tanks_collection
+
+CATALOGO_TANQUES_COMPROBAR_S = float(os.getenv("CATALOGO_TANQUES_COMPROBAR_S", "5"))
+CATALOGOS_COLECCION = "catalogos"
+VERSION_ID = "version_tanques"
+
+
+@dataclass(frozen=True)
+class CatalogoTanques:
+    version: int
+    tanques: Tuple[Dict[str, Any], ...]  # orden de GET /tanques/: rating_realista, nación
+    json_tanques: bytes = field(repr=False)
+    por_id: Dict[str, Dict[str, Any]] = field(repr=False)
+    por_nacion: Dict[str, Tuple[Dict[str, Any], ...]] = field(repr=False)
+    por_nombre: Dict[str, Dict[str, Any]] = field(repr=False)  # nombre en minúsculas
+    cargado: float
+
+    @property
+    def etag(self) -> str:
+        return f'"tanques-{self.version}"'
+
+    def buscar_por_nombre(self, nombre: str) -> Optional[Dict[str, Any]]:
+        """Coincidencia exacta sin mayúsculas; si no hay, el primero que contenga el texto."""
+        nombre = nombre.strip().lower()
+        if nombre in self.por_nombre:
+            return self.por_nombre[nombre]
+        for clave, tanque in self.por_nombre.items():
+            if nombre in clave:
+                return tanque
+        return None
+
+
+_catalogo: Optional[CatalogoTanques] = None
+_obsoleto = False
+_ultima_comprobacion = 0.0
+_lock_recarga = asyncio.Lock()
+_metricas = {"recargas": 0, "comprobaciones": 0}
+
+
+def leer_version() -> int:
+    documento = get_db()[CATALOGOS_COLECCION].find_one({"_id": VERSION_ID})
+    return documento["version"] if documento else 0
+
+
+def marcar_catalogo_modificado() -> int:
+    """Llamar después de cada escritura sobre la colección de tanques. Devuelve la nueva versión."""
+    global _obsoleto
+    documento = get_db()[CATALOGOS_COLECCION].find_one_and_update(
+        {"_id": VERSION_ID},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    # Después del $inc, para que la recarga de este proceso ya lea la versión nueva
+    _obsoleto = True
+    return documento["version"]
+
+
+def cargar_catalogo() -> CatalogoTanques:
+    # La versión se lee antes del recorrido: una escritura a mitad de carga la deja
+    # vieja y la próxima comprobación vuelve a cargar
+    version = leer_version()
+    tanques = []
+    for documento in get_tanks_collection().find().sort([("rating_realista", 1), ("nacion", 1)]):
+        documento["_id"] = str(documento["_id"])
+        tanques.append(convertir_decimal128_recursivo(documento))
+
+    por_nacion: Dict[str, list] = {}
+    por_nombre: Dict[str, Dict[str, Any]] = {}
+    for tanque in tanques:
+        por_nacion.setdefault(tanque.get("nacion"), []).append(tanque)
+        if isinstance(tanque.get("nombre"), str):
+            por_nombre.setdefault(tanque["nombre"].lower(), tanque)
+
+    # Mismo JSON que generaría JSONResponse, serializado una sola vez por versión
+    json_tanques = json.dumps(
+        jsonable_encoder(tanques), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"),
+    ).encode("utf-8")
+    return CatalogoTanques(
+        version=version,
+        tanques=tuple(tanques),
+        json_tanques=json_tanques,
+        por_id={t["_id"]: t for t in tanques},
+        por_nacion={nacion: tuple(lista) for nacion, lista in por_nacion.items()},
+        por_nombre=por_nombre,
+        cargado=time.time(),
+    )
+
+
+async def _hay_que_recargar() -> bool:
+    global _ultima_comprobacion
+    if _catalogo is None or _obsoleto:
+        return True
+    if time.monotonic() - _ultima_comprobacion < CATALOGO_TANQUES_COMPROBAR_S:
+        return False
+    _ultima_comprobacion = time.monotonic()
+    _metricas["comprobaciones"] += 1
+    return await asyncio.to_thread(leer_version) != _catalogo.version
+
+
+async def obtener_catalogo_tanques() -> CatalogoTanques:
+    """Instantánea vigente; las peticiones simultáneas que la encuentran obsoleta esperan a la misma recarga."""
+    global _catalogo, _obsoleto, _ultima_comprobacion
+    if not await _hay_que_recargar():
+        return _catalogo
+    async with _lock_recarga:
+        if _catalogo is None or _obsoleto or (await asyncio.to_thread(leer_version)) != _catalogo.version:
+            _obsoleto = False
+            _catalogo = await asyncio.to_thread(cargar_catalogo)
+            _metricas["recargas"] += 1
+        _ultima_comprobacion = time.monotonic()
+    return _catalogo
+
+
+def metricas_catalogo() -> Dict[str, Any]:
+    catalogo = _catalogo
+    return {
+        "version": catalogo.version if catalogo else None,
+        "total": len(catalogo.tanques) if catalogo else 0,
+        "cargado": catalogo.cargado if catalogo else None,
+        **_metricas,
+    }
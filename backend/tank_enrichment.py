@@ -0,0 +1,303 @@
+"""
+Enriquecimiento de tanques con Gemini: slope factor y datos de munición faltantes.
+
+Se ejecuta fuera de las peticiones de usuario, como CLI o como paso final de
+actualizar_datos.py. Recorre los tanques a los que les falta `slope_factor_ia`
+o algún dato de munición, los manda al modelo en lotes (con la concurrencia y la
+tasa limitadas de gemini_client), escribe los resultados con bulk_write y guarda
+un checkpoint tras cada lote para poder reanudar una pasada interrumpida.
+
+Uso:
+    python tank_enrichment.py
+    python tank_enrichment.py --lote 50 --limite 200
+    python tank_enrichment.py --desde-cero
+"""
+
+import argparse
+import asyncio
+import copy
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from google.genai import types as genai_types
+
+import gemini_client
+from gemini_client import MODELO_IA_POR_DEFECTO, generar_contenido_gemini, parsear_json_gemini
+from database import convertir_decimal128_recursivo, get_db, get_tanks_collection
+from combat_simulator import huella_tanque
+from document_diff import calcular_diff, registrar_escritura
+from tank_catalog import marcar_catalogo_modificado
+from models import EstimacionMunicionIA, EstimacionTanqueIA
+
+MODELO_ENRIQUECIMIENTO = os.getenv("ENRIQUECIMIENTO_MODELO", MODELO_IA_POR_DEFECTO)
+ENRIQUECIMIENTO_LOTE = int(os.getenv("ENRIQUECIMIENTO_LOTE", "20"))
+GEMINI_REINTENTOS_ENRIQUECIMIENTO = int(os.getenv("GEMINI_REINTENTOS_ENRIQUECIMIENTO", "1"))
+GEMINI_CONCURRENCIA_ENRIQUECIMIENTO = int(os.getenv("GEMINI_CONCURRENCIA_ENRIQUECIMIENTO", "4"))
+SLOPE_FACTOR_RANGO = (0.8, 2.0)
+CAMPOS_ENRIQUECIDOS = ["slope_factor_ia", "armamento", "setup_1", "setup_2"]
+
+CHECKPOINTS_COLECCION = "checkpoints"
+CHECKPOINT_ID = "enriquecimiento_tanques"
+
+
+def faltan_datos_municion(municion: dict) -> bool:
+    if not municion.get("masa_total") or not municion.get("velocidad_bala"):
+        return True
+    # Una munición sólida tiene 0 g de explosivo: si ya lo estimó la IA, no se vuelve a preguntar
+    return not municion.get("masa_explosivo") and not municion.get("datos_generados_por_ia")
+
+
+def municiones_incompletas(tanque: dict) -> List[tuple]:
+    """(nombre_arma, munición) de todas las municiones del tanque a las que les faltan datos."""
+    pendientes = []
+    for armamento_key in ["armamento", "setup_1", "setup_2"]:
+        if armamento_key in tanque and isinstance(tanque[armamento_key], dict):
+            for nombre_arma, datos_arma in tanque[armamento_key].items():
+                for municion in datos_arma.get("municiones", []):
+                    if faltan_datos_municion(municion):
+                        pendientes.append((nombre_arma, municion))
+    return pendientes
+
+
+def tanque_enriquecido(tanque: dict) -> bool:
+    return "slope_factor_ia" in tanque and not municiones_incompletas(tanque)
+
+
+async def _estimar_datos_tanque_gemini(
+    tanque: dict,
+    pendientes: List[tuple],
+    pedir_slope: bool,
+    modelo: str,
+) -> EstimacionTanqueIA:
+    """
+    Un solo prompt con todas las municiones incompletas del tanque (y el slope factor si falta).
+    La respuesta se valida munición a munición: las entradas inválidas se descartan y el
+    llamador puede volver a preguntar solo por esas.
+    """
+    lineas_municion = "\n".join(
+        f"- id {i}: '{municion.get('nombre')}' (tipo: {municion.get('tipo')}) del cañón '{nombre_arma}'"
+        for i, (nombre_arma, municion) in enumerate(pendientes)
+    )
+    bloque_slope = """
+SLOPE FACTOR:
+El simulador necesita un 'slope factor' (factor de efectividad del blindaje inclinado). El valor por defecto es 1.35.
+Un tanque con blindaje muy inclinado (ej. T-34, Panther) puede tener 1.5 - 1.8, uno con blindaje plano (ej. Tiger I) puede tener 1.0 - 1.2.
+Devuelve tu estimación en "slope_factor".
+""" if pedir_slope else "\nNo estimes el slope factor: devuelve \"slope_factor\": null.\n"
+    bloque_municion = f"""
+MUNICIONES CON DATOS FALTANTES:
+{lineas_municion}
+Para cada una devuelve en "municiones" un objeto con su "id", "masa_total" (kg), "velocidad_bala" (m/s) y
+"masa_explosivo" (gramos, 0 si es un proyectil sólido).
+""" if pendientes else "\nNo hay municiones que estimar: devuelve \"municiones\": [].\n"
+    prompt = f"""
+Eres un experto balístico y de blindaje de War Thunder. Estima los datos que faltan del tanque
+'{tanque.get('nombre')}' ({tanque.get('nacion')}).
+{bloque_slope}{bloque_municion}
+Si no sabes un valor, haz tu mejor estimación realista basada en municiones y vehículos similares de la vida real o del juego.
+"""
+    config = genai_types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=EstimacionTanqueIA,
+    )
+    datos = parsear_json_gemini(await generar_contenido_gemini(prompt, modelo, config=config))
+
+    estimacion = EstimacionTanqueIA()
+    slope = datos.get("slope_factor")
+    if pedir_slope and isinstance(slope, (int, float)) and SLOPE_FACTOR_RANGO[0] <= slope <= SLOPE_FACTOR_RANGO[1]:
+        estimacion.slope_factor = float(slope)
+    for entrada in datos.get("municiones") or []:
+        try:
+            municion = EstimacionMunicionIA(**entrada)
+        except (TypeError, ValueError):
+            continue
+        if not (0 <= municion.id < len(pendientes)):
+            continue
+        if municion.masa_total <= 0 or municion.velocidad_bala <= 0 or municion.masa_explosivo < 0:
+            continue
+        estimacion.municiones.append(municion)
+    return estimacion
+
+
+async def enriquecer_tanque(tanque: dict, modelo: str) -> bool:
+    """Completa el tanque en memoria. Devuelve True si ha cambiado algo."""
+    if not gemini_client.client_ai:
+        return False
+
+    modificado = False
+    pendientes = municiones_incompletas(tanque)
+    pedir_slope = "slope_factor_ia" not in tanque
+
+    for _ in range(1 + GEMINI_REINTENTOS_ENRIQUECIMIENTO):
+        if not pendientes and not pedir_slope:
+            break
+        try:
+            estimacion = await _estimar_datos_tanque_gemini(tanque, pendientes, pedir_slope, modelo)
+        except Exception as e:
+            print(f"Error estimando datos del tanque con IA: {e}")
+            break
+
+        if estimacion.slope_factor is not None:
+            tanque["slope_factor_ia"] = estimacion.slope_factor
+            pedir_slope = False
+            modificado = True
+        for dato in estimacion.municiones:
+            _, municion = pendientes[dato.id]
+            if not municion.get("masa_total"):
+                municion["masa_total"] = float(dato.masa_total)
+            if not municion.get("velocidad_bala"):
+                municion["velocidad_bala"] = int(dato.velocidad_bala)
+            if not municion.get("masa_explosivo"):
+                municion["masa_explosivo"] = float(dato.masa_explosivo)
+            municion["datos_generados_por_ia"] = True
+            modificado = True
+        # Solo se reintentan las municiones que siguen incompletas
+        pendientes = [p for p in pendientes if faltan_datos_municion(p[1])]
+
+    return modificado
+
+
+async def enriquecer_tanques(tanques: List[dict], modelo: str) -> Tuple[List[dict], List[Tuple[dict, dict]]]:
+    """
+    Enriquece varios tanques a la vez, con como mucho GEMINI_CONCURRENCIA_ENRIQUECIMIENTO
+    en vuelo. Los tanques idénticos (misma huella) se procesan una sola vez y los que ya
+    están enriquecidos no llaman a la IA.
+
+    Devuelve (tanques en el orden de entrada, pares (antes, después) de los tanques únicos
+    que han cambiado, para escribir solo la diferencia).
+    """
+    semaforo = asyncio.Semaphore(GEMINI_CONCURRENCIA_ENRIQUECIMIENTO)
+
+    async def procesar(tanque: dict) -> bool:
+        async with semaforo:
+            return await enriquecer_tanque(tanque, modelo)
+
+    huellas = [huella_tanque(t) for t in tanques]
+    pendientes: Dict[str, dict] = {}
+    for huella, tanque in zip(huellas, tanques):
+        if huella not in pendientes and not tanque_enriquecido(tanque):
+            pendientes[huella] = tanque
+    originales = {huella: copy.deepcopy(t) for huella, t in pendientes.items()}
+    cambios = await asyncio.gather(*(procesar(t) for t in pendientes.values()))
+    modificados = [
+        (originales[huella], tanque)
+        for (huella, tanque), cambio in zip(pendientes.items(), cambios) if cambio
+    ]
+    resultado = [pendientes.get(huella, tanque) for huella, tanque in zip(huellas, tanques)]
+    return resultado, modificados
+
+
+def guardar_enriquecidos(modificados: List[Tuple[dict, dict]]) -> int:
+    """Escribe en una sola bulk_write solo los campos que ha completado la IA en cada tanque (con _id)."""
+    operaciones = []
+    for original, tanque in modificados:
+        id_tanque = tanque.get("_id")
+        if isinstance(id_tanque, str) and ObjectId.is_valid(id_tanque):
+            id_tanque = ObjectId(id_tanque)
+        if not id_tanque:
+            continue
+        diff = calcular_diff(original, {campo: tanque[campo] for campo in CAMPOS_ENRIQUECIDOS if campo in tanque})
+        registrar_escritura(diff)
+        if not diff.vacio:
+            operaciones.append(UpdateOne({"_id": id_tanque}, diff.operacion()))
+    if not operaciones:
+        return 0
+    modificados_bd = get_tanks_collection().bulk_write(operaciones, ordered=False).modified_count
+    if modificados_bd:
+        marcar_catalogo_modificado()
+    return modificados_bd
+
+
+def _leer_checkpoint() -> Optional[Dict[str, Any]]:
+    return get_db()[CHECKPOINTS_COLECCION].find_one({"_id": CHECKPOINT_ID})
+
+
+def _guardar_checkpoint(ultimo_id: Any, informe: Dict[str, Any]) -> None:
+    get_db()[CHECKPOINTS_COLECCION].replace_one(
+        {"_id": CHECKPOINT_ID},
+        {"ultimo_id": ultimo_id, "informe": informe, "fecha": datetime.now(timezone.utc)},
+        upsert=True,
+    )
+
+
+async def enriquecer_pendientes(
+    modelo: str = MODELO_ENRIQUECIMIENTO,
+    lote: int = ENRIQUECIMIENTO_LOTE,
+    limite: Optional[int] = None,
+    reanudar: bool = True,
+) -> Dict[str, Any]:
+    """
+    Una pasada completa sobre la colección de tanques, en orden de _id. Con reanudar=True
+    continúa desde el checkpoint de una pasada anterior que no terminó. El checkpoint solo
+    avanza hasta el último tanque enriquecido antes del primer fallo (error de Gemini o
+    circuito abierto), de modo que al reanudar se vuelve a intentar desde ese tanque.
+    """
+    if not gemini_client.client_ai:
+        print("⚠️ GEMINI_API_KEY no configurada: se omite el enriquecimiento con IA.")
+        return {"omitido": True}
+
+    inicio = time.time()
+    checkpoint = _leer_checkpoint() if reanudar else None
+    ultimo_id = checkpoint["ultimo_id"] if checkpoint else None
+    filtro = {"_id": {"$gt": ultimo_id}} if ultimo_id is not None else {}
+    informe = {
+        "revisados": 0,
+        "pendientes": 0,
+        "enriquecidos": 0,
+        "escritos": 0,
+        "lotes": 0,
+        "reanudado": bool(checkpoint),
+    }
+
+    pendientes = []
+    for documento in get_tanks_collection().find(filtro).sort("_id", 1):
+        informe["revisados"] += 1
+        tanque = convertir_decimal128_recursivo(documento)
+        if not tanque_enriquecido(tanque):
+            pendientes.append(tanque)
+    if limite is not None:
+        pendientes = pendientes[:limite]
+    informe["pendientes"] = len(pendientes)
+
+    hueco = False
+    for i in range(0, len(pendientes), lote):
+        bloque = pendientes[i:i + lote]
+        resultado, modificados = await enriquecer_tanques(bloque, modelo)
+        informe["enriquecidos"] += len(modificados)
+        informe["escritos"] += await asyncio.to_thread(guardar_enriquecidos, modificados)
+        informe["lotes"] += 1
+        for tanque, enriquecido in zip(bloque, resultado):
+            # Un duplicado sustituido por otro tanque del lote no se ha escrito con su _id
+            if hueco or enriquecido is not tanque or not tanque_enriquecido(tanque):
+                hueco = True
+                break
+            ultimo_id = tanque["_id"]
+        await asyncio.to_thread(_guardar_checkpoint, ultimo_id, informe)
+        print(f"Lote {informe['lotes']}: {len(modificados)}/{len(bloque)} tanques enriquecidos")
+
+    if not hueco and (limite is None or informe["pendientes"] < limite):
+        # Pasada completa: la siguiente empieza desde el principio
+        await asyncio.to_thread(get_db()[CHECKPOINTS_COLECCION].delete_one, {"_id": CHECKPOINT_ID})
+
+    informe["segundos"] = round(time.time() - inicio, 2)
+    return informe
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Completa con Gemini el slope factor y la munición de los tanques.")
+    parser.add_argument("--modelo", default=MODELO_ENRIQUECIMIENTO)
+    parser.add_argument("--lote", type=int, default=ENRIQUECIMIENTO_LOTE, help="tanques por bulk_write/checkpoint")
+    parser.add_argument("--limite", type=int, default=None, help="máximo de tanques a enriquecer en esta pasada")
+    parser.add_argument("--desde-cero", action="store_true", help="ignora el checkpoint de una pasada anterior")
+    args = parser.parse_args()
+
+    informe = asyncio.run(enriquecer_pendientes(args.modelo, args.lote, args.limite, reanudar=not args.desde_cero))
+    print(f"Enriquecimiento completado: {informe}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import os
+import sys
+from pathlib import Path
+
+import mongomock
+import pymongo
+
+# Los módulos del backend se importan por nombre (como hace uvicorn main:app)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# database.py se conecta (y hace ping) al importarse: los tests usan mongomock en su lugar
+os.environ["MONGODB_URI"] = "mongodb://localhost:27017"
+os.environ["DATABASE_NAME"] = "war_thunder_tests"
+pymongo.MongoClient = mongomock.MongoClient
@@ -0,0 +1,80 @@
+"""Los endpoints de simulación no deben bloquear el bucle de eventos de la API."""
+
+import asyncio
+import random
+import sys
+import time
+
+import httpx
+import pytest
+
+import main
+from combat_simulator import CombatSimulatorEngine
+from database import get_tanks_collection
+from tank_catalog import marcar_catalogo_modificado
+
+# Latencia máxima aceptable de GET / mientras las simulaciones pesadas están en curso. Los
+# hilos de simulación compiten por el GIL con el bucle (el test baja el intervalo de cambio a
+# 1 ms para acotar ese ruido); equipos, lineup o sensibilidad ejecutados en el propio bucle
+# lo bloquearían entre 0.3 y 1 s.
+LATENCIA_MAX_S = 0.2
+SONDEO_S = 0.02
+
+
+@pytest.fixture(scope="module")
+def tanques():
+    aleatorio = random.getstate()
+    random.seed(40)
+    try:
+        tanques = [dict(CombatSimulatorEngine._tanque_sintetico(), nombre=f"Bucle {i}") for i in range(10)]
+    finally:
+        random.setstate(aleatorio)
+    coleccion = get_tanks_collection()
+    ids = coleccion.insert_many([dict(t) for t in tanques]).inserted_ids
+    marcar_catalogo_modificado()
+    yield [dict(t, _id=str(i)) for t, i in zip(tanques, ids)]
+    coleccion.delete_many({"_id": {"$in": ids}})
+    marcar_catalogo_modificado()
+
+
+def _peticiones_pesadas(t):
+    """Una petición de cada endpoint pesado; cada una ocupa su hilo entre 0.1 y ~0.8 s."""
+    return [
+        ("/simulacion/duelo", {"vehiculo1_id": t[0]["_id"], "vehiculo2_id": t[1]["_id"], "situacion": "500m", "fidelidad": "completa"}),
+        ("/simulacion/equipos", {"equipo_aliado": (t + t)[:16], "equipo_enemigo": (t + t)[4:20], "tanque_usuario_index": 0, "situacion": "800m"}),
+        ("/equipos/optimizar-lineup", {"candidatos": t[:6], "equipo_aliado": t[6:8], "equipo_enemigo": t[4:], "situacion": "500m", "simulaciones": 5000}),
+        ("/duelos/sensibilidad", {"vehiculo1_id": t[2]["_id"], "vehiculo2_id": t[3]["_id"], "situacion": "1km", "simulaciones": 5000}),
+        ("/duelos/estimacion-rapida", {"vehiculo1_id": t[4]["_id"], "vehiculo2_id": t[5]["_id"]}),
+    ]
+
+
+async def _medir(tanques):
+    """Sondea GET / mientras corren las simulaciones; devuelve las respuestas, los huecos entre sondeos y la duración."""
+    transporte = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://test") as cliente:
+        inicio = anterior = time.perf_counter()
+        pesadas = asyncio.gather(*(cliente.post(ruta, json=cuerpo) for ruta, cuerpo in _peticiones_pesadas(tanques)))
+        huecos = []
+        while not pesadas.done():
+            await asyncio.sleep(SONDEO_S)
+            respuesta = await cliente.get("/")
+            assert respuesta.status_code == 200
+            # Incluye la espera del sleep: si el bucle está bloqueado, el hueco crece aunque GET / sea instantáneo
+            ahora = time.perf_counter()
+            huecos.append(ahora - anterior - SONDEO_S)
+            anterior = ahora
+        return await pesadas, huecos, time.perf_counter() - inicio
+
+
+def test_endpoint_ligero_responde_durante_simulaciones(tanques):
+    intervalo = sys.getswitchinterval()
+    sys.setswitchinterval(0.001)
+    try:
+        respuestas, huecos, duracion = asyncio.run(_medir(tanques))
+    finally:
+        sys.setswitchinterval(intervalo)
+
+    assert [r.status_code for r in respuestas] == [200] * len(respuestas), [r.text for r in respuestas]
+    # La prueba solo vale si las simulaciones tardaron bastante más que el límite
+    assert duracion > 2 * LATENCIA_MAX_S
+    assert max(huecos) < LATENCIA_MAX_S, f"GET / tardó {max(huecos):.3f}s con simulaciones en curso"
@@ -0,0 +1,133 @@
+"""El solver analítico de duelos debe coincidir con Monte Carlo dentro del ruido de muestreo."""
+
+import json
+import os
+import random
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import combat_simulator
+from combat_simulator import (
+    MC_DUELO_ITERACIONES,
+    CombatSimulatorEngine,
+    GeneradorBloques,
+    analizar_sensibilidad_duelo,
+    comparar_solvers_duelo,
+    simular_duelo_monte_carlo,
+)
+
+# Con MC_DUELO_ITERACIONES = 2000 el error típico de Monte Carlo es como mucho ~0.011
+TOLERANCIA_PAREJA = 0.05
+TOLERANCIA_MEDIA = 0.02
+DISTANCIAS = ["100m", "500m", "1000m", "1500m"]
+
+
+def _parejas(n: int, semilla: int):
+    aleatorio = random.getstate()
+    random.seed(semilla)
+    try:
+        parejas = []
+        for i in range(n):
+            a = dict(CombatSimulatorEngine._tanque_sintetico(), nombre=f"A{i}")
+            b = dict(CombatSimulatorEngine._tanque_sintetico(), nombre=f"B{i}")
+            parejas.append((a, b, random.choice(DISTANCIAS)))
+        return parejas
+    finally:
+        random.setstate(aleatorio)
+
+
+PAREJAS = _parejas(12, semilla=2027)
+
+
+@pytest.mark.parametrize("tanque1,tanque2,situacion", PAREJAS, ids=[f"{a['nombre']}-{s}" for a, _, s in PAREJAS])
+def test_probabilidad_analitica_coincide_con_monte_carlo(tanque1, tanque2, situacion):
+    comparacion = comparar_solvers_duelo(tanque1, tanque2, situacion)
+    assert comparacion["diferencia_prob_v1"] <= TOLERANCIA_PAREJA, comparacion
+
+
+def test_sin_sesgo_sistematico():
+    diferencias = [comparar_solvers_duelo(a, b, s)["diferencia_prob_v1"] for a, b, s in PAREJAS]
+    assert sum(diferencias) / len(diferencias) <= TOLERANCIA_MEDIA
+    assert MC_DUELO_ITERACIONES >= 1000  # las tolerancias asumen al menos este número de iteraciones
+
+
+@pytest.mark.parametrize("tanque1,tanque2,situacion", PAREJAS[:4], ids=[f"{a['nombre']}-{s}" for a, _, s in PAREJAS[:4]])
+def test_distribucion_ttk_analitica(tanque1, tanque2, situacion):
+    montecarlo = simular_duelo_monte_carlo(tanque1, tanque2, situacion, metodo="monte_carlo").estadisticas_ttk
+    analitico = simular_duelo_monte_carlo(tanque1, tanque2, situacion, metodo="analitico").estadisticas_ttk
+    assert analitico is not None
+    assert sum(analitico.conteos) == analitico.n == MC_DUELO_ITERACIONES
+    # Media y desviación dentro de ~4 errores típicos de la media de Monte Carlo
+    tolerancia = 4 * montecarlo.desviacion / montecarlo.n ** 0.5 + 0.05
+    assert abs(analitico.media - montecarlo.media) <= tolerancia
+    assert abs(analitico.desviacion - montecarlo.desviacion) <= 0.1 * montecarlo.desviacion + 0.05
+
+
+def test_monte_carlo_reproducible_entre_procesos():
+    """La semilla no puede depender de hash() de str, que cambia con PYTHONHASHSEED."""
+    tanque1, tanque2, situacion = PAREJAS[0]
+    codigo = (
+        "import json, sys; from combat_simulator import simular_duelo_monte_carlo as s; "
+        "a, b, sit = json.load(sys.stdin); print(repr(s(a, b, sit, 500).prob_victoria_v1))"
+    )
+    entrada = json.dumps([tanque1, tanque2, situacion])
+    resultados = {
+        subprocess.run(
+            [sys.executable, "-c", codigo], input=entrada, capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent.parent, env={**os.environ, "PYTHONHASHSEED": semilla},
+        ).stdout.strip().splitlines()[-1]
+        for semilla in ("1", "2")
+    }
+    assert len(resultados) == 1, resultados
+
+
+@pytest.mark.parametrize("tanque1,tanque2,situacion", PAREJAS[:4], ids=[f"{a['nombre']}-{s}" for a, _, s in PAREJAS[:4]])
+def test_traza_no_cambia_el_resultado(tanque1, tanque2, situacion):
+    """El bucle trazado salta los ticks vacíos igual que el normal y consume el RNG en el mismo orden."""
+    normal = simular_duelo_monte_carlo(tanque1, tanque2, situacion, 200)
+    trazado = simular_duelo_monte_carlo(tanque1, tanque2, situacion, 200, trazas=20)
+    assert len(trazado.traza) == 20
+    assert trazado.prob_victoria_v1 == normal.prob_victoria_v1
+    assert trazado.estadisticas_ttk.conteos == normal.estadisticas_ttk.conteos
+    assert trazado.estadisticas_disparos_v1.conteos == normal.estadisticas_disparos_v1.conteos
+
+
+def test_duelo_espejo_cuenta_victorias_por_lado():
+    """Con el mismo nombre en ambos lados, las victorias no pueden contarse por nombre."""
+    tanque = PAREJAS[0][0]
+    resultado = simular_duelo_monte_carlo(tanque, dict(tanque), "500m")
+    assert 0.4 < resultado.prob_victoria_v1 < 0.6
+    assert abs(resultado.prob_victoria_v1 + resultado.prob_victoria_v2 - 1.0) < 1e-9
+
+    sensibilidad = analizar_sensibilidad_duelo(tanque, dict(tanque), "500m", ["recarga"], n_simulaciones=1000)
+    recarga = sensibilidad["sensibilidad"]["recarga"]
+    assert 0.4 < sensibilidad["prob_victoria_base"] < 0.6
+    assert recarga["prob_victoria_mas_delta"] != recarga["prob_victoria_menos_delta"]
+
+
+def test_generador_bloques_reproducible_por_semilla_y_subflujo():
+    a, b = GeneradorBloques(7), GeneradorBloques(7)
+    # Más números que el primer bloque, para cruzar el cambio de bloque
+    assert [a.random() for _ in range(300)] == [b.random() for _ in range(300)]
+
+    a.iteracion(3)
+    inicio_3 = [a.random() for _ in range(10)]
+    a.iteracion(4)
+    assert [a.random() for _ in range(10)] != inicio_3
+    b.iteracion(3)
+    assert [b.random() for _ in range(10)] == inicio_3
+
+
+def test_variante_sin_traza_no_registra_nada():
+    """El bucle normal sale de la misma fuente que el trazado, sin las llamadas a registro."""
+    for funcion in (combat_simulator._simular_disparo, combat_simulator._simular_duelo_unico):
+        assert "registro" not in funcion.__code__.co_varnames
+        assert not any(nombre.endswith("_traza") for nombre in funcion.__code__.co_names)
+
+    tanque1, tanque2, situacion = PAREJAS[1]
+    trazado = simular_duelo_monte_carlo(tanque1, tanque2, situacion, 50, trazas=5)
+    disparos = [e for it in trazado.traza for e in it["eventos"] if e["tipo"] == "disparo"]
+    assert disparos and all({"tirada", "prob_penetrar", "penetra", "dano", "hp_a", "hp_b"} <= e.keys() for e in disparos)
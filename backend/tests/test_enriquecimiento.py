@@ -0,0 +1,52 @@
+"""El checkpoint de la pasada offline no puede saltarse tanques cuyo enriquecimiento falló."""
+
+import asyncio
+
+import pytest
+
+import gemini_client
+import tank_enrichment
+from database import get_db, get_tanks_collection
+
+
+@pytest.fixture
+def tanques(monkeypatch):
+    monkeypatch.setattr(gemini_client, "client_ai", object())
+    fallan = {"Enriquecimiento 1"}
+
+    async def enriquecer(tanque, modelo):
+        if tanque["nombre"] in fallan:
+            return False
+        tanque["slope_factor_ia"] = 1.3
+        return True
+
+    def guardar(modificados):
+        # mongomock no acepta el UpdateOne de pymongo en bulk_write: se escribe uno a uno
+        for _, tanque in modificados:
+            get_tanks_collection().update_one({"_id": tanque["_id"]}, {"$set": {"slope_factor_ia": tanque["slope_factor_ia"]}})
+        return len(modificados)
+
+    monkeypatch.setattr(tank_enrichment, "enriquecer_tanque", enriquecer)
+    monkeypatch.setattr(tank_enrichment, "guardar_enriquecidos", guardar)
+    insertados = get_tanks_collection().insert_many(
+        [{"nombre": f"Enriquecimiento {i}", "nacion": "test"} for i in range(4)]
+    ).inserted_ids
+    yield insertados, fallan
+    get_tanks_collection().delete_many({"_id": {"$in": insertados}})
+    get_db()[tank_enrichment.CHECKPOINTS_COLECCION].delete_many({})
+
+
+def test_checkpoint_se_detiene_en_el_primer_fallo(tanques):
+    insertados, fallan = tanques
+    informe = asyncio.run(tank_enrichment.enriquecer_pendientes(lote=2))
+    assert informe["enriquecidos"] == 3
+
+    checkpoint = get_db()[tank_enrichment.CHECKPOINTS_COLECCION].find_one({"_id": tank_enrichment.CHECKPOINT_ID})
+    assert checkpoint["ultimo_id"] == insertados[0]
+
+    # Al reanudar se reintenta el tanque que falló y la pasada termina
+    fallan.clear()
+    informe = asyncio.run(tank_enrichment.enriquecer_pendientes(lote=2))
+    assert informe["reanudado"] and informe["enriquecidos"] == 1
+    assert get_tanks_collection().find_one({"_id": insertados[1]})["slope_factor_ia"] == 1.3
+    assert get_db()[tank_enrichment.CHECKPOINTS_COLECCION].find_one({"_id": tank_enrichment.CHECKPOINT_ID}) is None
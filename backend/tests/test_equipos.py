@@ -0,0 +1,33 @@
+"""Las copias de un mismo tanque cuentan una vez por copia en las clasificaciones de equipos."""
+
+import random
+from collections import Counter
+
+from combat_simulator import CombatSimulatorEngine, resultado_equipos_a_dict, simular_equipos_monte_carlo
+
+
+def _tanques(n: int, semilla: int):
+    aleatorio = random.getstate()
+    random.seed(semilla)
+    try:
+        return [dict(CombatSimulatorEngine._tanque_sintetico(), nombre=f"Equipo {i}") for i in range(n)]
+    finally:
+        random.setstate(aleatorio)
+
+
+def test_copias_repetidas_en_clasificaciones():
+    usuario, companero, otro, enemigo_a, enemigo_b = _tanques(5, 34)
+    resultado = resultado_equipos_a_dict(simular_equipos_monte_carlo(
+        [usuario, companero, companero, otro],
+        [enemigo_a, enemigo_a, enemigo_b, enemigo_b],
+        0,
+        "500m",
+        n_simulaciones=50,
+    ))
+
+    assert Counter(c["nombre"] for c in resultado["mejores_companeros"]) == {"Equipo 1": 2, "Equipo 2": 1}
+    # Dos copias de cada enemigo: los dos más dañinos son las copias del peor
+    assert len({e["nombre"] for e in resultado["mas_daninos"]}) == 1
+    assert len(resultado["mas_daninos"]) == 2
+    for lista in ("enemigos_prioritarios", "enemigos_a_evitar", "no_representan_amenaza"):
+        assert all(n == 2 for n in Counter(e["nombre"] for e in resultado[lista]).values())
@@ -0,0 +1,127 @@
+"""Plazo, limitador y cortocircuito de generar_contenido_gemini, con un cliente falso."""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from google.genai import errors as genai_errors
+
+import gemini_catalog
+import gemini_client
+import main
+
+
+class ClienteFalso:
+    """Imita client_ai.aio.models.generate_content: tarda `demora` s y luego lanza `error` o responde."""
+
+    def __init__(self, demora: float = 0.0, error: Exception = None):
+        self.demora = demora
+        self.error = error
+        self.llamadas = 0
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self._generar))
+
+    async def _generar(self, model, contents, config=None):
+        self.llamadas += 1
+        await asyncio.sleep(self.demora)
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(text=f"respuesta de {model}")
+
+
+@pytest.fixture
+def circuito(monkeypatch):
+    circuito = gemini_client.Cortocircuito(umbral=2, enfriamiento_s=60)
+    monkeypatch.setattr(gemini_client, "circuito_gemini", circuito)
+    monkeypatch.setattr(gemini_client, "limitador_gemini", gemini_client.LimitadorTasa(0))
+    return circuito
+
+
+def _llamar(cliente, monkeypatch, timeout_s=1.0):
+    monkeypatch.setattr(gemini_client, "client_ai", cliente)
+    return asyncio.run(gemini_client.generar_contenido_gemini("prompt", "gemini-prueba", timeout_s=timeout_s))
+
+
+@pytest.mark.parametrize("error", [genai_errors.ServerError(503, {}), genai_errors.ClientError(429, {})])
+def test_5xx_y_429_abren_el_circuito(circuito, monkeypatch, error):
+    for _ in range(2):
+        with pytest.raises(genai_errors.APIError):
+            _llamar(ClienteFalso(error=error), monkeypatch)
+    assert circuito.estado == "abierto"
+    with pytest.raises(gemini_client.CircuitoAbierto):
+        _llamar(ClienteFalso(), monkeypatch)
+
+
+def test_timeout_de_gemini_cuenta_como_fallo(circuito, monkeypatch):
+    with pytest.raises(asyncio.TimeoutError):
+        _llamar(ClienteFalso(demora=1.0), monkeypatch, timeout_s=0.6)
+    assert circuito.fallos_seguidos == 1
+
+
+def test_4xx_del_usuario_no_cuenta(circuito, monkeypatch):
+    for _ in range(3):
+        with pytest.raises(genai_errors.ClientError):
+            _llamar(ClienteFalso(error=genai_errors.ClientError(404, {})), monkeypatch)
+    assert circuito.fallos_seguidos == 0 and circuito.estado == "cerrado"
+
+
+def test_cola_del_limitador_cuenta_en_el_plazo_y_no_en_el_circuito(circuito, monkeypatch):
+    # Un turno cada 5 s: la segunda llamada no cabe en su plazo de 1 s y no llega a Gemini
+    monkeypatch.setattr(gemini_client, "limitador_gemini", gemini_client.LimitadorTasa(0.2))
+    cliente = ClienteFalso()
+    assert _llamar(cliente, monkeypatch) == "respuesta de gemini-prueba"
+
+    inicio = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        _llamar(cliente, monkeypatch, timeout_s=1.0)
+    assert time.monotonic() - inicio < 0.1
+    assert cliente.llamadas == 1
+    assert circuito.fallos_seguidos == 0
+
+
+def test_modelo_fuera_del_catalogo_se_rechaza(monkeypatch):
+    cliente = ClienteFalso()
+    monkeypatch.setattr(gemini_client, "client_ai", cliente)
+
+    async def catalogo():
+        return [{"id": "gemini-prueba", "nombre": "Prueba", "descripcion": ""}]
+
+    monkeypatch.setattr(main, "obtener_catalogo", catalogo)
+    monkeypatch.setattr(main, "obtener_resultado", lambda result_id: {"_id": result_id, "tipo": "duelo"})
+
+    respuesta = TestClient(main.app).get("/narrativa/abc", params={"modelo": "no-existe"})
+    assert respuesta.status_code == 400
+    assert cliente.llamadas == 0
+
+
+def test_fallo_del_catalogo_no_se_reintenta_en_cada_peticion(monkeypatch):
+    descargas = []
+
+    def descargar_falla():
+        descargas.append(time.monotonic())
+        raise ConnectionError("sin red")
+
+    monkeypatch.setattr(gemini_catalog, "_catalogo", None)
+    monkeypatch.setattr(gemini_catalog, "_refresco", None)
+    monkeypatch.setattr(gemini_catalog, "_leer_persistido", lambda: None)
+    monkeypatch.setattr(gemini_catalog, "_descargar_modelos", descargar_falla)
+
+    async def pedir_varias_veces():
+        return [await gemini_catalog.obtener_catalogo() for _ in range(3)]
+
+    assert asyncio.run(pedir_varias_veces()) == [[], [], []]
+    assert len(descargas) == 1
+    assert gemini_catalog._catalogo["fallido"] is True
+
+    # Pasado el plazo negativo se vuelve a intentar, en segundo plano
+    monkeypatch.setattr(gemini_catalog, "_refresco", None)
+    monkeypatch.setattr(gemini_catalog, "_catalogo", {**gemini_catalog._catalogo, "actualizado": 0.0})
+
+    async def pedir_y_esperar_refresco():
+        modelos = await gemini_catalog.obtener_catalogo()
+        await gemini_catalog._refresco
+        return modelos
+
+    assert asyncio.run(pedir_y_esperar_refresco()) == []
+    assert len(descargas) == 2
@@ -0,0 +1,115 @@
+"""Sin GEMINI_API_KEY la narrativa sale de la plantilla en lugar de fallar."""
+
+import asyncio
+import random
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import gemini_client
+import main
+from combat_simulator import CombatSimulatorEngine
+from database import get_tanks_collection
+from tank_catalog import marcar_catalogo_modificado
+
+
+@pytest.fixture
+def ids(monkeypatch):
+    monkeypatch.setattr(gemini_client, "client_ai", None)
+    aleatorio = random.getstate()
+    random.seed(45)
+    try:
+        tanques = [dict(CombatSimulatorEngine._tanque_sintetico(), nombre=f"Narrativa {i}") for i in range(2)]
+    finally:
+        random.setstate(aleatorio)
+    insertados = get_tanks_collection().insert_many(tanques).inserted_ids
+    marcar_catalogo_modificado()
+    yield [str(i) for i in insertados]
+    get_tanks_collection().delete_many({"_id": {"$in": insertados}})
+    marcar_catalogo_modificado()
+
+
+def test_narrativa_sin_clave_usa_plantilla(ids):
+    cliente = TestClient(main.app)
+    duelo = cliente.post("/simulacion/duelo", json={"vehiculo1_id": ids[0], "vehiculo2_id": ids[1], "situacion": "500m"})
+    assert duelo.status_code == 200, duelo.text
+
+    respuesta = cliente.get(f"/narrativa/{duelo.json()['result_id']}")
+    assert respuesta.status_code == 200, respuesta.text
+    narrativa = respuesta.json()
+    assert narrativa["narrativa_plantilla"] is True
+    assert duelo.json()["ganador"] in narrativa["analisis"]
+    assert len(narrativa["puntos_clave"]) == 3
+
+
+def test_combate_ia_sin_clave_usa_plantilla(ids):
+    respuesta = TestClient(main.app).post(
+        "/combate-ia/", json={"vehiculo1_id": ids[0], "vehiculo2_id": ids[1], "situacion": "1km"},
+    )
+    assert respuesta.status_code == 200, respuesta.text
+    assert respuesta.json()["narrativa_plantilla"] is True
+
+
+def test_narrativa_no_consulta_mongo_en_el_bucle(ids, monkeypatch):
+    """Las lecturas de resultados y narrativas son pymongo síncrono: deben ir a un hilo."""
+    fuera_del_bucle = []
+
+    def envolver(funcion):
+        def envuelta(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                fuera_del_bucle.append(True)
+            else:
+                fuera_del_bucle.append(False)
+            return funcion(*args, **kwargs)
+        return envuelta
+
+    for nombre in ("obtener_resultado", "obtener_narrativa"):
+        monkeypatch.setattr(main, nombre, envolver(getattr(main, nombre)))
+    cliente = TestClient(main.app)
+    duelo = cliente.post("/simulacion/duelo", json={"vehiculo1_id": ids[0], "vehiculo2_id": ids[1], "situacion": "700m"})
+    respuesta = cliente.get(f"/narrativa/{duelo.json()['result_id']}")
+    assert respuesta.status_code == 200, respuesta.text
+    assert fuera_del_bucle == [True, True]
+
+
+def test_enriquecimiento_en_peticion_respeta_el_plazo(ids, monkeypatch):
+    async def enriquecer_lento(tanques, modelo):
+        await asyncio.sleep(5)
+        return tanques, []
+
+    monkeypatch.setattr(main, "ENRIQUECIMIENTO_EN_PETICION", True)
+    monkeypatch.setattr(main, "enriquecer_tanques", enriquecer_lento)
+    monkeypatch.setattr(main, "PETICION_IA_PLAZO_S", 0.2)
+    inicio = time.monotonic()
+    respuesta = TestClient(main.app).post(
+        "/combate-ia/", json={"vehiculo1_id": ids[0], "vehiculo2_id": ids[1], "situacion": "300m"},
+    )
+    assert respuesta.status_code == 200, respuesta.text
+    assert respuesta.json()["narrativa_plantilla"] is True
+    assert time.monotonic() - inicio < 2
+
+
+def test_prompt_sin_traza_ni_histogramas(ids, monkeypatch):
+    prompts = []
+
+    async def generar(prompt, modelo, timeout_s=None):
+        prompts.append(prompt)
+        return '{"analisis": "ok", "puntos_clave": []}'
+
+    monkeypatch.setattr(main, "generar_contenido_gemini", generar)
+    cliente = TestClient(main.app)
+    duelo = cliente.post(
+        "/simulacion/duelo",
+        json={"vehiculo1_id": ids[0], "vehiculo2_id": ids[1], "situacion": "900m", "trazas": 3},
+    )
+    assert duelo.status_code == 200, duelo.text
+    documento = main.obtener_resultado(duelo.json()["result_id"])
+    assert "trace" in documento["resultado"]
+    asyncio.run(main._generar_analisis_duelo_gemini(*documento["contexto"], "900m", documento["resultado"], "modelo"))
+
+    (prompt,) = prompts
+    assert '"trace"' not in prompt and '"histograma"' not in prompt
+    assert '"p50"' in prompt
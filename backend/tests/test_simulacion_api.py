@@ -0,0 +1,130 @@
+"""Forma de las respuestas y errores de cliente de los endpoints de simulación."""
+
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+import combat_simulator
+import gemini_client
+import main
+from combat_simulator import CombatSimulatorEngine
+from database import get_tanks_collection
+from gemini_client import MODELO_IA_POR_DEFECTO
+from models import CombateIARequest, SimulacionEquiposIARequest
+from narrative_cache import obtener_resultado
+from tank_catalog import marcar_catalogo_modificado
+
+
+@pytest.fixture(scope="module")
+def tanques():
+    aleatorio = random.getstate()
+    random.seed(29)
+    try:
+        tanques = [dict(CombatSimulatorEngine._tanque_sintetico(), nombre=f"API {i}") for i in range(6)]
+    finally:
+        random.setstate(aleatorio)
+    ids = get_tanks_collection().insert_many([dict(t) for t in tanques]).inserted_ids
+    marcar_catalogo_modificado()
+    yield [dict(t, _id=str(i)) for t, i in zip(tanques, ids)]
+    get_tanks_collection().delete_many({"_id": {"$in": ids}})
+    marcar_catalogo_modificado()
+
+
+@pytest.fixture
+def cliente():
+    return TestClient(main.app)
+
+
+def test_lineup_con_datos_invalidos_es_error_del_cliente(cliente, tanques):
+    respuesta = cliente.post("/equipos/optimizar-lineup", json={
+        "candidatos": [{"nombre": "Roto", "blindaje_chasis": "mucho"}],
+        "equipo_enemigo": tanques[:2],
+        "situacion": "500m",
+    })
+    assert respuesta.status_code == 400, respuesta.text
+
+
+def test_perfiles_del_catalogo_se_cachean_por_id_y_version(cliente, tanques, monkeypatch):
+    monkeypatch.setattr(combat_simulator, "huella_tanque", lambda tanque: pytest.fail("huella del tanque recalculada"))
+    respuesta = cliente.post("/duelos/sensibilidad", json={
+        "vehiculo1_id": tanques[2]["_id"], "vehiculo2_id": tanques[3]["_id"], "situacion": "800m", "simulaciones": 100,
+    })
+    assert respuesta.status_code == 200, respuesta.text
+    claves = [clave[0] for clave in combat_simulator._cache_perfiles._datos]
+    assert any(isinstance(c, tuple) and c[0] == tanques[2]["_id"] for c in claves)
+
+
+def _assert_distribucion(distribucion, n):
+    assert distribucion is not None
+    assert distribucion["n"] == n
+    assert sum(distribucion["histograma"]["conteos"]) == n
+    assert {"media", "desviacion", "p50", "p90"} <= distribucion.keys()
+
+
+def test_combate_ia_expone_distribuciones(cliente, tanques, monkeypatch):
+    monkeypatch.setattr(gemini_client, "client_ai", None)
+    respuesta = cliente.post("/combate-ia/", json={
+        "vehiculo1_id": tanques[0]["_id"], "vehiculo2_id": tanques[1]["_id"], "situacion": "500m", "fidelidad": "completa",
+    })
+    assert respuesta.status_code == 200, respuesta.text
+    cuerpo = respuesta.json()
+    n = cuerpo["distribucion_ttk"]["n"]
+    for campo in ("distribucion_ttk", "distribucion_disparos_v1", "distribucion_disparos_v2"):
+        _assert_distribucion(cuerpo[campo], n)
+
+
+def test_equipos_ia_expone_distribuciones(cliente, tanques, monkeypatch):
+    monkeypatch.setattr(gemini_client, "client_ai", None)
+    respuesta = cliente.post("/simulacion-equipos-ia/", json={
+        "equipo_aliado": tanques[:3], "equipo_enemigo": tanques[3:], "tanque_usuario_index": 0, "situacion": "800m",
+    })
+    assert respuesta.status_code == 200, respuesta.text
+    cuerpo = respuesta.json()
+    n = cuerpo["distribucion_duracion"]["n"]
+    _assert_distribucion(cuerpo["distribucion_duracion"], n)
+    _assert_distribucion(cuerpo["distribucion_disparos"], n)
+
+
+def test_duelo_decisivo_en_ia_no_habla_de_simulaciones(cliente, tanques, monkeypatch):
+    monkeypatch.setattr(gemini_client, "client_ai", None)
+    respuesta = cliente.post("/combate-ia/", json={
+        "vehiculo1_id": tanques[5]["_id"], "vehiculo2_id": tanques[0]["_id"], "situacion": "500m",
+    })
+    assert respuesta.status_code == 200, respuesta.text
+    cuerpo = respuesta.json()
+    assert cuerpo["metodo_simulacion"] == "analitico"
+    assert cuerpo["narrativa_plantilla"] is True
+    assert "simulaciones" not in cuerpo["analisis"]
+    assert "solver analítico" in cuerpo["analisis"]
+
+    assert obtener_resultado(cuerpo["result_id"])["resultado"]["simulaciones_monte_carlo"] is None
+
+
+def test_sin_catalogo_de_modelos_se_narra_con_plantilla(cliente, tanques, monkeypatch):
+    llamadas = []
+
+    async def generar(*args, **kwargs):
+        llamadas.append(args)
+        raise AssertionError("no debe llamarse a Gemini con un modelo sin comprobar")
+
+    async def catalogo_vacio():
+        return []
+
+    monkeypatch.setattr(gemini_client, "client_ai", object())
+    monkeypatch.setattr(main, "obtener_catalogo", catalogo_vacio)
+    monkeypatch.setattr(main, "generar_contenido_gemini", generar)
+    respuesta = cliente.post("/combate-ia/", json={
+        "vehiculo1_id": tanques[1]["_id"], "vehiculo2_id": tanques[2]["_id"], "situacion": "600m",
+        "modelo": "gemini-no-comprobado",
+    })
+    assert respuesta.status_code == 200, respuesta.text
+    assert respuesta.json()["narrativa_plantilla"] is True
+    assert llamadas == []
+
+
+def test_modelo_por_defecto_de_las_peticiones_ia():
+    assert CombateIARequest(vehiculo1_id="a", vehiculo2_id="b", situacion="500m").modelo == MODELO_IA_POR_DEFECTO
+    assert SimulacionEquiposIARequest(
+        equipo_aliado=[], equipo_enemigo=[], tanque_usuario_index=0, situacion="500m",
+    ).modelo == MODELO_IA_POR_DEFECTO
@@ -0,0 +1,108 @@
+"""Cola de trabajos: validación al encolar, caducidad del lease y reintentos."""
+
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+import pytest
+from bson import ObjectId
+from pydantic import ValidationError
+
+import simulation_worker as worker
+from combat_simulator import EQUIPO_MAX_TANQUES
+
+
+def _id() -> str:
+    return str(ObjectId())
+
+
+@pytest.fixture
+def jobs():
+    return mongomock.MongoClient().db.jobs
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    """Reloj del worker controlado por el test: reloj["ahora"] += timedelta(...) para avanzar."""
+    estado = {"ahora": datetime(2026, 1, 1, tzinfo=timezone.utc)}
+    monkeypatch.setattr(worker, "_ahora", lambda: estado["ahora"])
+    return estado
+
+
+def _duelo(jobs) -> str:
+    return worker.crear_trabajo("duelo", {"vehiculo1_id": _id(), "vehiculo2_id": _id(), "situacion": "500m"}, jobs=jobs)
+
+
+@pytest.mark.parametrize("tipo,parametros", [
+    ("duelo", {"vehiculo1_id": _id(), "vehiculo2_id": _id(), "situacion": "500m", "simulaciones": 50_000}),
+    ("duelo", {"vehiculo1_id": "no-es-un-id", "vehiculo2_id": _id(), "situacion": "500m"}),
+    ("equipos", {"equipo_aliado_ids": [_id()] * (EQUIPO_MAX_TANQUES + 1), "equipo_enemigo_ids": [_id()], "situacion": "500m"}),
+    ("equipos", {"equipo_aliado_ids": [_id()], "equipo_enemigo_ids": [_id()], "tanque_usuario_index": 1, "situacion": "500m"}),
+    ("matriz_duelos", {"vehiculos_ids": [_id()], "situacion": "500m"}),
+    ("lineup", {"candidatos_ids": [_id()], "equipo_enemigo_ids": [], "situacion": "500m"}),
+    ("lineup", {"candidatos_ids": [_id()], "equipo_enemigo_ids": [_id()]}),
+])
+def test_parametros_invalidos_no_se_encolan(jobs, tipo, parametros):
+    with pytest.raises(ValidationError):
+        worker.crear_trabajo(tipo, parametros, jobs=jobs)
+    assert jobs.count_documents({}) == 0
+
+
+def test_parametros_validos_se_guardan_normalizados(jobs):
+    trabajo_id = worker.crear_trabajo(
+        "equipos", {"equipo_aliado_ids": [_id()], "equipo_enemigo_ids": [_id(), _id()], "situacion": "1km"}, jobs=jobs,
+    )
+    parametros = worker.obtener_trabajo(trabajo_id, jobs=jobs)["parametros"]
+    assert parametros["tanque_usuario_index"] == 0
+    assert len(parametros["equipo_enemigo_ids"]) == 2
+
+
+def test_lease_caducado_lo_retoma_otro_worker(jobs, reloj):
+    trabajo_id = _duelo(jobs)
+    trabajo = worker.reclamar_trabajo("w1", jobs=jobs)
+    assert str(trabajo["_id"]) == trabajo_id and trabajo["intentos"] == 1
+
+    # Con el lease vigente nadie más lo reclama y el latido lo extiende
+    reloj["ahora"] += timedelta(seconds=worker.WORKER_LEASE_S / 2)
+    assert worker.reclamar_trabajo("w2", jobs=jobs) is None
+    assert worker.renovar_lease(trabajo["_id"], "w1", jobs=jobs)
+
+    # w1 deja de latir: al caducar el lease lo retoma w2 y w1 ya no puede completarlo
+    reloj["ahora"] += timedelta(seconds=worker.WORKER_LEASE_S + 1)
+    retomado = worker.reclamar_trabajo("w2", jobs=jobs)
+    assert retomado["_id"] == trabajo["_id"] and retomado["worker"] == "w2" and retomado["intentos"] == 2
+    assert not worker.renovar_lease(trabajo["_id"], "w1", jobs=jobs)
+    assert not worker.completar_trabajo(trabajo["_id"], {"ok": True}, "w1", jobs=jobs)
+    assert worker.completar_trabajo(trabajo["_id"], {"ok": True}, "w2", jobs=jobs)
+    assert worker.obtener_trabajo(trabajo_id, jobs=jobs)["estado"] == "completado"
+
+
+def test_fallos_se_reintentan_hasta_agotar_intentos(jobs, reloj):
+    trabajo_id = _duelo(jobs)
+    for intento in range(1, worker.WORKER_MAX_INTENTOS + 1):
+        trabajo = worker.reclamar_trabajo("w1", jobs=jobs)
+        assert trabajo["intentos"] == intento
+        worker.fallar_trabajo(trabajo, "fallo transitorio", worker_id="w1", jobs=jobs)
+        estado = worker.obtener_trabajo(trabajo_id, jobs=jobs)["estado"]
+        assert estado == ("error" if intento == worker.WORKER_MAX_INTENTOS else "pendiente")
+    assert worker.reclamar_trabajo("w1", jobs=jobs) is None
+
+
+def test_fallo_definitivo_no_se_reintenta(jobs, reloj):
+    trabajo_id = _duelo(jobs)
+    trabajo = worker.reclamar_trabajo("w1", jobs=jobs)
+    worker.fallar_trabajo(trabajo, "Parámetros inválidos", definitivo=True, worker_id="w1", jobs=jobs)
+    assert worker.obtener_trabajo(trabajo_id, jobs=jobs)["estado"] == "error"
+    assert worker.reclamar_trabajo("w1", jobs=jobs) is None
+
+
+def test_lease_caducado_sin_intentos_se_cierra(jobs, reloj):
+    trabajo_id = _duelo(jobs)
+    for _ in range(worker.WORKER_MAX_INTENTOS):
+        assert worker.reclamar_trabajo("w1", jobs=jobs) is not None
+        reloj["ahora"] += timedelta(seconds=worker.WORKER_LEASE_S + 1)
+
+    # Agotados los intentos ya no se reclama; cerrar_trabajos_abandonados lo marca como error
+    assert worker.reclamar_trabajo("w2", jobs=jobs) is None
+    assert worker.cerrar_trabajos_abandonados(jobs=jobs) == 1
+    documento = worker.obtener_trabajo(trabajo_id, jobs=jobs)
+    assert documento["estado"] == "error" and documento["lease_hasta"] is None
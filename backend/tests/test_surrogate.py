@@ -0,0 +1,69 @@
+"""Puerta de precisión, respaldo Monte Carlo y versión con hash de pesos del modelo sustituto."""
+
+import json
+import random
+
+import numpy as np
+import pytest
+
+import combat_surrogate
+from combat_simulator import CombatSimulatorEngine
+
+
+@pytest.fixture
+def tanques():
+    aleatorio = random.getstate()
+    random.seed(32)
+    try:
+        return [dict(CombatSimulatorEngine._tanque_sintetico(), nombre=f"Surrogate {i}") for i in range(8)]
+    finally:
+        random.setstate(aleatorio)
+
+
+@pytest.fixture
+def pesos(tmp_path, monkeypatch, tanques):
+    """Entrena un sustituto diminuto y apunta el módulo a él; devuelve un escritor del informe de calibración."""
+    ruta = tmp_path / "surrogate.npz"
+    f1, f2, distancia, objetivo = combat_surrogate.generar_dataset(tanques, 40, 0, "analitico")
+    modelo = combat_surrogate.entrenar(f1, f2, distancia, objetivo, epocas=50)
+    np.savez(
+        ruta, w1=modelo.w1, b1=modelo.b1, w2=modelo.w2, media=modelo.media,
+        desviacion=modelo.desviacion, minimo=modelo.minimo, maximo=modelo.maximo,
+    )
+    calibracion = tmp_path / "surrogate_calibracion.json"
+    monkeypatch.setattr(combat_surrogate, "SURROGATE_PATH", ruta)
+    monkeypatch.setattr(combat_surrogate, "CALIBRACION_PATH", calibracion)
+    monkeypatch.setattr(combat_surrogate, "SURROGATE_ACTIVADO", True)
+    monkeypatch.setattr(combat_surrogate, "_surrogate", None)
+    monkeypatch.setattr(combat_surrogate, "_surrogate_cargado", False)
+    monkeypatch.setattr(combat_surrogate, "_cache_estimaciones", combat_surrogate._CacheLRU(16))
+
+    def escribir_informe(fuente, error):
+        calibracion.write_text(json.dumps({"fuente": fuente, "error_absoluto_medio": error}), encoding="utf-8")
+
+    return escribir_informe
+
+
+def test_pesos_sinteticos_no_pasan_la_puerta(pesos, tanques):
+    pesos("sintetico", 0.01)
+    estimacion = combat_surrogate.estimacion_rapida_duelo(tanques[0], tanques[1], "500m")
+    assert combat_surrogate.get_surrogate() is None
+    assert estimacion["fuente"] == "monte_carlo"
+    assert "surrogate" not in estimacion["version_modelo"]
+
+
+def test_pesos_poco_precisos_no_pasan_la_puerta(pesos):
+    pesos("mongo", combat_surrogate.SURROGATE_ERROR_MAX + 0.06)
+    assert combat_surrogate.get_surrogate() is None
+
+
+def test_version_y_cache_incluyen_hash_de_pesos(pesos, tanques):
+    pesos("mongo", 0.01)
+    estimacion = combat_surrogate.estimacion_rapida_duelo(tanques[0], tanques[1], "500m")
+    modelo = combat_surrogate.get_surrogate()
+    assert modelo is not None and len(modelo.hash_pesos) == 12
+    assert estimacion["version_modelo"].endswith(f"+surrogate-{modelo.hash_pesos}")
+    assert estimacion["fuente"] == "surrogado"
+    assert combat_surrogate.estimacion_rapida_duelo(tanques[0], tanques[1], "500m") == estimacion
+    assert combat_surrogate._cache_estimaciones.aciertos == 1
+    assert all(clave[-1] == estimacion["version_modelo"] for clave in combat_surrogate._cache_estimaciones._datos)
@@ -33,7 +33,7 @@ export class CombatEquiposIAComponent implements OnInit {
 
   // Modelos de IA
   modelos: IAModelo[] = [];
-  modeloSeleccionado: string = 'gemini-3.1-flash-lite';
+  modeloSeleccionado: string = 'gemini-3.5-flash-lite';
 
   modoOscuro: boolean = false;
 